@@ -1,8 +1,15 @@
 from __future__ import print_function
+from collections import OrderedDict
 from itertools import chain
+import csv
+import hashlib
+import heapq
 import json
 import os
+import sys
+import time
 import vtk, qt, ctk, slicer, logging
+from vtk.util import numpy_support
 import numpy
 from slicer.ScriptedLoadableModule import *
 import SimpleITK as sitk
@@ -10,6 +17,16 @@ import SimpleITK as sitk
 import sitkUtils
 import traceback
 
+# Helper classes, also available from this module
+from SlicerRadiomicsLib import (SlicerRadiomicsBatchRunner, SlicerRadiomicsJob, SlicerRadiomicsWorkerClient,
+                                SlicerRadiomicsResultCache, SlicerRadiomicsResultSink, SlicerRadiomicsCSVSink,
+                                SlicerRadiomicsParquetSink)
+
+__all__ = ['SlicerRadiomics', 'SlicerRadiomicsWidget', 'SlicerRadiomicsLogic', 'SlicerRadiomicsTest',
+           'SlicerRadiomicsBatchRunner', 'SlicerRadiomicsJob', 'SlicerRadiomicsWorkerClient',
+           'SlicerRadiomicsResultCache', 'SlicerRadiomicsResultSink', 'SlicerRadiomicsCSVSink',
+           'SlicerRadiomicsParquetSink']
+
 
 #
 # SlicerRadiomics
@@ -32,6 +49,9 @@ class SlicerRadiomics(ScriptedLoadableModule):
     This is a scripted loadable module bundled in the SlicerRadomics extension.
     It gives access to the radiomics feature calculation classes implemented in pyradiomics library.
     See more details at http://pyradiomics.readthedocs.io/.
+    Options that speed up extractions with many ROIs (extraction of all ROIs in a single run, export of segments per
+    layer, shared volume files, a persistent extraction worker, cropping, cached results) are disabled by default and
+    can be enabled in the Output section.
     """
     self.parent.acknowledgementText = """
     This work was partially supported by NIH/NCI ITCR program grant U24 CA194354.
@@ -47,27 +67,10 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
   https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
   """
   def __init__(self, parent=None):
-
+    # PyRadiomics and its dependencies are only imported (and installed if missing) when an extraction is started,
+    # see SlicerRadiomicsLogic.checkDependencies
     ScriptedLoadableModuleWidget.__init__(self, parent)
 
-    try:
-      import dateutil
-    except ModuleNotFoundError as e:
-      slicer.util.pip_install('python-dateutil')
-      import dateutil
-
-    try:
-      import pywt
-    except ModuleNotFoundError as e:
-      slicer.util.pip_install('pywavelets')
-      import pywt
-
-    try:
-      from radiomics import getFeatureClasses
-    except ModuleNotFoundError as e:
-      print("FATAL ERROR: Failed to load radiomics module!")
-
-
   def setup(self):
     ScriptedLoadableModuleWidget.setup(self)
 
@@ -99,6 +102,15 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
     self.applyButton.enabled = False
     self.layout.addWidget(self.applyButton)
 
+    #
+    # Cancel Button
+    #
+    self.cancelButton = qt.QPushButton('Cancel')
+    self.cancelButton.toolTip = 'Cancel the running extraction.'
+    self.cancelButton.enabled = False
+    self.layout.addWidget(self.cancelButton)
+    self.logic = None  # Logic of the running extraction
+
     #
     # Connections
     #
@@ -117,6 +129,7 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
 
     # General Section
     self.applyButton.connect('clicked(bool)', self.onApplyButton)
+    self.cancelButton.connect('clicked(bool)', self.onCancelButton)
 
     # Add vertical spacer
     self.layout.addStretch(1)
@@ -209,9 +222,8 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
     self.featuresButtonGroup = qt.QButtonGroup(self.featuresLayout)
     self.featuresButtonGroup.exclusive = False
 
-    # Get the feature classes dynamically
-    from radiomics import getFeatureClasses
-    self.features = list(getFeatureClasses().keys())
+    # Get the feature classes without importing PyRadiomics
+    self.features = SlicerRadiomicsLogic.getFeatureClassNames()
     # Create a checkbox for each feature
     featureButtons = {}
     for feature in self.features:
@@ -252,6 +264,13 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
                                       'size (mm).'
     filteringFormLayout.addRow('Resampled voxel size', self.resampledVoxelSize)
 
+    # Resample once, defaults to false
+    self.resampleOnceCheckBox = qt.QCheckBox()
+    self.resampleOnceCheckBox.checked = 0
+    self.resampleOnceCheckBox.toolTip = 'If checked, the image is resampled once for all ROIs, instead of around ' \
+                                        'each ROI. This is faster, but results differ from resampling per ROI.'
+    filteringFormLayout.addRow('Resample once', self.resampleOnceCheckBox)
+
     # LoG kernel sizes. default to 5 (?)
     self.logKernelSizes = qt.QLineEdit()
     self.logKernelSizes.toolTip = 'Laplacian of Gaussian filter kernel sizes (mm), separated by comma. ' \
@@ -321,6 +340,70 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
                                    '(instead of INFO and higher)'
     outputFormLayout.addRow('Verbose Output', self.verboseCheckBox)
 
+    # Number of extractions running in parallel, defaults to 1
+    self.maxWorkersSpinBox = qt.QSpinBox()
+    self.maxWorkersSpinBox.minimum = 1
+    self.maxWorkersSpinBox.maximum = max(1, qt.QThread.idealThreadCount())
+    self.maxWorkersSpinBox.value = 1
+    self.maxWorkersSpinBox.toolTip = 'Maximum number of feature extractions (CLI runs) executing at the same time'
+    outputFormLayout.addRow('Parallel extractions', self.maxWorkersSpinBox)
+
+    # Extract all ROIs of a labelmap in a single run, defaults to false
+    self.batchModeCheckBox = qt.QCheckBox()
+    self.batchModeCheckBox.checked = 0
+    self.batchModeCheckBox.toolTip = 'If checked, all ROIs in a labelmap are extracted in a single CLI run, so image ' \
+                                     'and mask are only loaded once'
+    outputFormLayout.addRow('Single run per labelmap', self.batchModeCheckBox)
+
+    # Export segments per labelmap layer, defaults to false
+    self.exportSegmentsByLayerCheckBox = qt.QCheckBox()
+    self.exportSegmentsByLayerCheckBox.checked = 0
+    self.exportSegmentsByLayerCheckBox.toolTip = 'If checked, non-overlapping segments are exported to a single ' \
+                                                 'labelmap (ROIs are ordered by layer)'
+    outputFormLayout.addRow('Export segments by layer', self.exportSegmentsByLayerCheckBox)
+
+    # Share volume files between runs, defaults to false
+    self.shareVolumeFilesCheckBox = qt.QCheckBox()
+    self.shareVolumeFilesCheckBox.checked = 0
+    self.shareVolumeFilesCheckBox.toolTip = 'If checked (and a single run per labelmap is used), image and mask are ' \
+                                            'written to disk once and reused until they are modified'
+    outputFormLayout.addRow('Share volume files', self.shareVolumeFilesCheckBox)
+
+    # Use a persistent extraction worker, defaults to false
+    self.useWorkerCheckBox = qt.QCheckBox()
+    self.useWorkerCheckBox.checked = 0
+    self.useWorkerCheckBox.toolTip = 'If checked, extractions are sent to a worker process that keeps running until ' \
+                                     'Slicer exits, instead of starting a new CLI process for every run'
+    outputFormLayout.addRow('Use extraction worker', self.useWorkerCheckBox)
+
+    # Crop to ROI
+    self.cropToROICheckBox = qt.QCheckBox()
+    self.cropToROICheckBox.checked = 0
+    self.cropToROICheckBox.toolTip = 'Only pass the region around each ROI to the extraction. Cropping is skipped ' \
+                                     'when it would change the results (e.g. filters applied to the full image).'
+    outputFormLayout.addRow('Crop to ROI', self.cropToROICheckBox)
+
+    # Use cached results, defaults to false
+    self.useResultCacheCheckBox = qt.QCheckBox()
+    self.useResultCacheCheckBox.checked = 0
+    self.useResultCacheCheckBox.toolTip = 'If checked, results of ROIs that were extracted before (same image, ROI ' \
+                                          'and customization) are taken from the result cache instead of recalculated'
+    outputFormLayout.addRow('Use cached results', self.useResultCacheCheckBox)
+
+    # Only extract new or modified ROIs, defaults to false
+    self.incrementalCheckBox = qt.QCheckBox()
+    self.incrementalCheckBox.checked = 0
+    self.incrementalCheckBox.toolTip = 'If checked and the output table holds the results of a previous extraction, ' \
+                                       'only ROIs that are new or have been modified since are extracted'
+    outputFormLayout.addRow('Only extract modified ROIs', self.incrementalCheckBox)
+
+    # Typed output, defaults to false
+    self.typedOutputCheckBox = qt.QCheckBox()
+    self.typedOutputCheckBox.checked = 0
+    self.typedOutputCheckBox.toolTip = 'If checked, feature values are stored as numbers and diagnostics are stored ' \
+                                       'in a separate table (this reduces the size of the output table)'
+    outputFormLayout.addRow('Typed output', self.typedOutputCheckBox)
+
     # Output Table
     self.outputTableSelector = slicer.qMRMLNodeComboBox()
     self.outputTableSelector.nodeTypes = ['vtkMRMLTableNode']
@@ -372,21 +455,39 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
       featureButton.checked = False
 
   def onApplyButton(self):
+    if not SlicerRadiomicsLogic.checkDependencies():
+      slicer.util.errorDisplay('Failed to load the radiomics module, see the log for details.')
+      return
+
     if not self.outputTableSelector.currentNode():
       tableNode = slicer.vtkMRMLTableNode()
       slicer.mrmlScene.AddNode(tableNode)
       self.outputTableSelector.setCurrentNode(tableNode)
 
     logic = SlicerRadiomicsLogic()
-
-    # Lock GUI
+    logic.maxWorkers = self.maxWorkersSpinBox.value
+    logic.batchMode = self.batchModeCheckBox.checked
+    logic.exportSegmentsByLayer = self.exportSegmentsByLayerCheckBox.checked
+    logic.shareVolumeFiles = self.shareVolumeFilesCheckBox.checked
+    logic.useWorker = self.useWorkerCheckBox.checked
+    logic.cropToROI = self.cropToROICheckBox.checked
+    logic.useResultCache = self.useResultCacheCheckBox.checked
+    logic.incremental = self.incrementalCheckBox.checked
+    logic.typedOutput = self.typedOutputCheckBox.checked
+    logic.resampleOnce = self.resampleOnceCheckBox.checked
+    logic.progressCallback = self.onProgress
+    logic.preparationCallback = self.onPreparationProgress
+    self.logic = logic
+
+    # Lock GUI, the extraction runs asynchronously so the GUI is updated while it is running
     self.applyButton.text = 'Working...'
     self.applyButton.setEnabled(False)
-    slicer.app.processEvents()
+    self.cancelButton.setEnabled(True)
 
     imageNode = self.inputVolumeSelector.currentNode()
     maskNode = self.inputMaskSelector.currentNode()
 
+    started = False
     if self.manualCustomizationRadioButton.checked:
       # Set up customization
       featureClasses = self.getCheckedFeatureClasses()
@@ -404,6 +505,7 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
         except:
           self.logger.error('Failed to parse LoG sigma value from string \"' + logKernelSizesValue + '\"')
           traceback.print_exc()
+          self.onFinished()
           return
 
       resampledVoxelSizeValue = self.resampledVoxelSize.text
@@ -414,6 +516,7 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
           self.logger.error('Failed to parse resampled voxel spacing from string \"' + resampledVoxelSizeValue + '\"')
           settings['resampledPixelSpacing'] = None
           traceback.print_exc()
+          self.onFinished()
           return
 
       if self.waveletCheckBox.checked:
@@ -421,13 +524,13 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
 
       # Compute features
       try:
-        logic.runCLI(imageNode,
-                     maskNode,
-                     self.outputTableSelector.currentNode(),
-                     featureClasses,
-                     settings,
-                     enabledImageTypes,
-                     self.onFinished)
+        started = logic.runCLI(imageNode,
+                               maskNode,
+                               self.outputTableSelector.currentNode(),
+                               featureClasses,
+                               settings,
+                               enabledImageTypes,
+                               self.onFinished)
       except:
         self.logger.error("Feature calculation failed.")
         traceback.print_exc()
@@ -436,17 +539,33 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
       # Compute Features
       try:
         parameterFile = self.parameterFilePathLineEdit.currentPath
-        logic.runCLIWithParameterFile(imageNode,
-                                      maskNode,
-                                      self.outputTableSelector.currentNode(),
-                                      parameterFile,
-                                      self.onFinished)
+        started = logic.runCLIWithParameterFile(imageNode,
+                                                maskNode,
+                                                self.outputTableSelector.currentNode(),
+                                                parameterFile,
+                                                self.onFinished)
       except:
         self.logger.error("Feature calculation failed.")
         traceback.print_exc()
 
+    if not started:
+      # Extraction not started (e.g. invalid parameter file), onFinished is not invoked by the logic
+      self.onFinished()
+      return
+
     logic.showTable(self.outputTableSelector.currentNode())
 
+  def onCancelButton(self):
+    if self.logic is not None:
+      self.logic.cancel()
+
+  def onPreparationProgress(self, progress):
+    self.applyButton.text = 'Preparing... (%d%%)' % (100 * progress)
+
+  def onProgress(self, roiIndex, roiCount, roiName, imageType, featureClass):
+    self.applyButton.text = 'Working... (%d/%d)' % (roiIndex, roiCount)
+    self.applyButton.toolTip = ', '.join([str(part) for part in (roiName, imageType, featureClass) if part is not None])
+
   def onFinished(self):
     # Column containing the applied settings usually has a very long value,
     # causing the width of that column to be very large
@@ -460,6 +579,9 @@ class SlicerRadiomicsWidget(ScriptedLoadableModuleWidget):
     # Unlock GUI
     self.applyButton.setEnabled(True)
     self.applyButton.text = 'Apply'
+    self.applyButton.toolTip = 'Run the algorithm.'
+    self.cancelButton.setEnabled(False)
+    self.logic = None
 
 
 #
@@ -476,6 +598,38 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
   https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
   """
 
+  # Files written for the CLI and extraction worker, shared by all logic instances (node ID -> (modification stamp,
+  # path)), and the number of running tasks using each file (path -> count, see _getVolumeFile)
+  _volumeFiles = {}
+  _volumeFileUsers = {}
+
+  # Label indices of labelmap nodes, shared by all logic instances (node ID -> dict, see getLabelIndex)
+  _labelIndexCache = {}
+  _sceneObserverTag = None
+
+  # Content hashes of volume nodes, shared by all logic instances (node ID -> (stamp, hash), see _getVolumeHash)
+  _volumeHashes = {}
+
+  # Result cache used by default, shared by all logic instances (see getDefaultResultCache)
+  _defaultResultCache = None
+
+  # Settings copied from the logic to the logic instance running each queued job (see submit)
+  _jobSettings = ('runSync', 'batchMode', 'maxWorkers', 'exportSegmentsByLayer', 'useWorker', 'shareVolumeFiles',
+                  'chunked', 'chunkMargin', 'cropToROI', 'resampleOnce', 'useResultCache', 'resultCache', 'incremental',
+                  'typedOutput', 'summaryFeatures', 'memoryBudget', 'progressCallback', 'preparationCallback')
+
+  # Memory used by an extraction process before any images are loaded (Python, SimpleITK, PyRadiomics), in bytes
+  _processMemory = 300 * 1024 * 1024
+
+  # Stages of the extraction of which the time is recorded (see timings) and their column names in the timing table
+  timingStages = OrderedDict([
+    ('export', 'Export'),  # Generating the labelmaps of the ROIs and preparing image and mask (resampling, cropping)
+    ('io', 'I/O'),  # Writing and reading image, mask and results
+    ('filtering', 'Filtering'),  # Pre-processing of the image and computing the filtered images
+    ('calculation', 'Calculation'),  # Computing the matrices and features
+    ('ingestion', 'Ingestion')  # Storing the results in the output table and output sinks
+  ])
+
   def __init__(self):
     self.featureValues = {}
 
@@ -483,27 +637,52 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
 
     self.logger.debug('Slicer Radiomics logic initialized')
 
-    self.cliNode = None  # Reference to the CLI Node that executes the extraction
+    self.cliNode = None  # Reference to the CLI Node that was started last
     self.outTable = None  # Output table which will hold calculated features
 
-    # Variables to hold observers and status for asynchronous processing
-    self._onStatusObserverTag = None
-    self._cli_running = False
-
     # Variables to hold the input image/label nodes and the parameter file for customization
     self._labelGenerators = None
     self._parameterFile = None
-    self._labelName = None
-    self._cli_output = None  # Temporary table to hold the results of the CLI script
 
-    # If manual customization is used, a temporary parameter file will be generated.
-    # However, this must also be deleted upon completion
-    self._delete_parameterFile = False
+    # Variables to hold the state of the CLI runs that are currently executing.
+    # Each running task is a dict holding the CLI node, the temporary output table, the ROIs extracted in that run and
+    # the index of the task (i.e. the order in which it was generated)
+    self._runningTasks = []
+    self._idleSlots = []  # (cliNode, outputTable) tuples that can be reused by the next task
+    self._taskCount = 0
+
+    # Results of finished tasks, stored by task index until all previous tasks are finished as well.
+    # This ensures the order of the columns in the output table does not depend on which task finished first
+    self._pendingResults = {}
+    self._nextResultIndex = 0
+
+    # Temporary nodes created by the label generators and the cropping, these are removed once no longer in use
+    self._temporaryNodes = {}
+    self._currentLabelNode = None  # Label node of the last task generated, can still be used by the next task
 
     # Variable to hold the calculated feature names
     # This is set on the first time results are returned and used to fill the table for subsequent results
     self._featureNames = {}
 
+    # If true, the output table holds numeric columns (vtkDoubleArray) with the feature values and the key columns
+    # ('Image type', 'Feature Class' and 'Feature Name') are dictionary-encoded (integer codes, the names are stored in
+    # the 'SlicerRadiomics.Categories' attribute of the table). Diagnostics are stored in a separate metadata table
+    # (text layout), referenced by the output table ('SlicerRadiomics.Metadata'). If no metadata table is set, it is
+    # created. If false, all values are stored as text in the output table.
+    self.typedOutput = False
+    self.metadataTable = None
+    self._categories = None  # Category names of the key columns (name -> code), in typed layout
+    self._metadataFeatureNames = {}
+
+    # Outputs (SlicerRadiomicsResultSink) to which the results are streamed in long format as each extraction
+    # completes, in addition to the output table. Sinks are opened at the start and closed at the end of each
+    # extraction. If output sinks are set, the output table is optional.
+    self.outputSinks = []
+
+    # If not None, only the features in this list (feature keys, e.g. 'original_firstorder_Mean') are stored in the
+    # output table. Combined with output sinks, this keeps a small summary of the results in the scene.
+    self.summaryFeatures = None
+
     # If set, this function will be called upon completion of extraction
     # Once per call to runCLI or runCLIWithParameterFile
     self.callback = None
@@ -511,17 +690,326 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
     # Set this to true to run synchronously (blocks UI thread until CLI is done)
     self.runSync = False
 
-  # Label generators to generate single ROI labels from either labelmapNode or segmentationNode input
+    # When running asynchronously, the mask is prepared (see _getPreparationSteps) and the tasks are started in small
+    # steps driven by a timer, so the event loop keeps running in between. If set, this function is called with the
+    # fraction (0 to 1) of the preparation that is done after each step.
+    self.preparationCallback = None
+    self._preparationSteps = None
+    self._stepTimer = None
+
+    # If true, all ROIs in a labelmap are extracted in a single CLI run (image and mask are only loaded once).
+    # Otherwise, a separate CLI run is started for each ROI. Disabled by default, so each ROI is extracted by a separate
+    # CLI run writing its results to a table, as before.
+    self.batchMode = False
+
+    # Maximum number of CLI runs executing at the same time. Only applies when running asynchronously.
+    self.maxWorkers = 1
+
+    # If true, the segments of a segmentation node are exported per binary labelmap layer, i.e. all non-overlapping
+    # segments in a single multi-label labelmap that is only written and read once. Segments are ordered by layer.
+    # Otherwise, each segment is exported to a separate labelmap. Disabled by default, as this changes the order of the
+    # output columns.
+    self.exportSegmentsByLayer = False
+
+    # If true, image and mask are handed to the CLI in batch mode as files written by the logic (see _getVolumeFile),
+    # which are written once and reused by all CLI runs and extraction workers until the node is modified. Otherwise,
+    # the nodes are passed to the CLI, which writes them to a temporary file for every run. Disabled by default, as an
+    # uncompressed copy of each volume is kept on disk until the node is modified or removed.
+    self.shareVolumeFiles = False
+
+    # If true, the CLI (or extraction worker) does not load image and mask as a whole. Instead, the mask file is read
+    # one slab at a time to find the bounding box of each ROI, and each ROI is extracted from the region of its bounding
+    # box (extended by the margin needed by the extraction, see _getCropMargin) read from the volume files. This bounds
+    # the memory used by the extraction by the largest ROI, for volumes that do not fit in memory more than once. Only
+    # applies in batch mode, if image and mask have the same geometry. If the customization does not allow a margin
+    # (e.g. filters applied to the full image), ``chunkMargin`` voxels are used, in which case feature values may
+    # differ from an extraction on the full image.
+    self.chunked = False
+    self.chunkMargin = 16
+
+    # If true, extractions are sent to a persistent extraction worker process (see SlicerRadiomicsWorkerClient), which
+    # prevents the start-up cost of a new CLI process for every run. If the worker is not available or stops
+    # unexpectedly, the CLI is used instead. Disabled by default, as the worker keeps running (and holds on to its
+    # memory) until Slicer exits.
+    self.useWorker = False
+
+    # Timer polling the extraction thread of an in-process extraction (see extractInProcess) and the state shared with
+    # that thread
+    self._inProcessTimer = None
+    self._inProcessState = None
+
+    # If true, image and mask are cropped to the bounding box of the ROI(s) (plus the margin needed by the extraction)
+    # before they are passed to the extraction. Cropping is only applied if the results are not affected by it.
+    self.cropToROI = False
+
+    # If true and the customization specifies resampling (resampledPixelSpacing), the image is resampled once per
+    # extraction on a grid covering the full image, and the mask of each ROI is resampled on the same grid (nearest
+    # neighbour). PyRadiomics then extracts without resampling. Note that results differ from resampling per ROI
+    # (default): the grid is aligned to the image instead of to the bounding box of the ROI, directions in which an
+    # ROI spans a single slice are resampled as well, and filters are applied to the full resampled image.
+    self.resampleOnce = False
+    self._resampling = None  # (spacing, size, origin, direction) of the grid the image is resampled on
+    self._resampledImageNodes = {}  # imageNode ID -> imageNode resampled on that grid
+    self._resampledLabelNodes = {}  # labelNode ID -> labelNode resampled on the grid of the resampled image
+
+    # If set, this function is called with (roiIndex, roiCount, roiName, imageType, featureClass) when the extraction of
+    # a ROI starts and each time it proceeds to the next image type or feature class. roiIndex is the (1-based) position
+    # of the ROI in the mask, imageType and featureClass are None until the extraction of these has started. Image type
+    # and feature class are only reported in batch mode.
+    self.progressCallback = None
+    self._roiCount = 0
+    self._roiOffset = 0  # Number of ROIs in the tasks generated so far
+
+    # Image and ROI of each ROI name generated in the current extraction, as labelName -> (image name, ROI name). When
+    # features are extracted from multiple images, ROI names are prefixed by the name of the image (see
+    # _getImageLabelGenerator).
+    self._roiImages = {}
+
+    # Time (in seconds) spent in each stage (see timingStages) of the extraction of each ROI in the last extraction,
+    # as an OrderedDict mapping each ROI name to an OrderedDict of stage -> seconds. Time spent on multiple ROIs at once
+    # (e.g. writing the mask shared by the ROIs of a task) is divided evenly over these ROIs. ROIs for which available
+    # results were used are not included. See also getTimingTable.
+    self.timings = OrderedDict()
+
+    # Peak memory (resident set size, in bytes) of the extraction process (CLI or extraction worker) that extracted each
+    # ROI in the last extraction, as an OrderedDict mapping each ROI name to the peak of its task (None if not available
+    # on this platform). ROIs for which available results were used are not included.
+    self.peakMemory = OrderedDict()
+    # Start and end time (time.perf_counter, in seconds) and peak memory of each task of the last extraction, as a list
+    # of (start, end, peak memory) tuples, which shows the memory used by tasks running at the same time.
+    self.taskPeakMemory = []
+
+    # If set, maximum memory (in bytes) used by the extraction processes running at the same time. A new task is only
+    # started while the estimated memory of all running tasks (see _getTaskMemoryEstimate) fits in this budget, so
+    # fewer than ``maxWorkers`` tasks may run at the same time. One task is always started, even if its estimate exceeds
+    # the budget.
+    self.memoryBudget = None
+    self._memoryEstimate = None  # Estimated peak memory of a task, before any task has finished
+    self._measuredMemory = None  # Largest peak memory measured for a finished task
+
+    # If true, results are stored in (and taken from) ``resultCache``, so only ROIs for which no results are available
+    # for the same image, ROI and customization are extracted. Disabled by default, as the content of image and ROIs is
+    # hashed to look up the results.
+    self.useResultCache = False
+    self.resultCache = self.getDefaultResultCache()
+
+    # If true and the output table holds the results of a previous extraction, only ROIs that are new or have been
+    # modified since (or for which the image or customization changed) are extracted. The results of the other ROIs
+    # are taken from the table and columns of ROIs that no longer exist are removed. Disabled by default, as the
+    # content of image and ROIs is hashed to find the ROIs that were modified.
+    self.incremental = False
+    self._previousResults = {}  # ROI key -> features, results found in the output table at the start of the extraction
+    self._tableROIKeys = OrderedDict()  # labelName -> ROI key of the columns added to the output table
+
+    # Queue of jobs submitted to this logic (see submit), as a heap of (-priority, submission number, job) tuples, and
+    # the job that is running
+    self._jobQueue = []
+    self._jobCount = 0
+    self._runningJob = None
+    self._startingJobs = False
+
+    # Feature extractor instantiated from the parameter file of the current extraction (see _getExtractor) and the
+    # hash of its customization (see _getParameterHash). Only used to inspect the customization.
+    self._extractor = None
+    self._parameterHash = None
+
+  # Dependencies of the extraction, checked (and imported) only when an extraction is started
   @staticmethod
-  def _getLabelGeneratorFromLabelMap(labelNode, imageNode):
-    combinedLabelImage = sitk.ReadImage(sitkUtils.GetSlicerITKReadWriteAddress(labelNode))
-    combinedLabelArray = sitk.GetArrayFromImage(combinedLabelImage)
-    labels = numpy.unique(combinedLabelArray)
+  def checkDependencies():
+    """
+    Check that PyRadiomics and the packages it needs are installed, installing missing packages using pip. Packages
+    are located without importing them. Once all are found, this is remembered in the application settings for this
+    Slicer installation, so the check is only done again if Slicer is updated or moved.
 
-    for label in labels:
-      if label == 0:
-        continue
-      yield '%s_label_%d' % (labelNode.GetName(), label), labelNode, int(label), imageNode
+    :returns: True if all dependencies are available
+    """
+    import importlib.util
+
+    settings = qt.QSettings()
+    installation = '%s %s' % (slicer.app.applicationVersion, slicer.app.slicerHome)
+    if settings.value('SlicerRadiomics/DependenciesChecked') == installation:
+      return True
+
+    for moduleName, packageName in [('dateutil', 'python-dateutil'), ('pywt', 'pywavelets')]:
+      if importlib.util.find_spec(moduleName) is None:
+        slicer.util.pip_install(packageName)
+    if importlib.util.find_spec('radiomics') is None:
+      logging.getLogger('radiomics.slicer').error('Failed to load radiomics module!')
+      return False
+
+    settings.setValue('SlicerRadiomics/DependenciesChecked', installation)
+    return True
+
+  @staticmethod
+  def getFeatureClassNames():
+    """
+    Get the names of the feature classes of PyRadiomics without importing it. These are the classes of the installed
+    PyRadiomics if these were stored in the application settings by a previous extraction (see
+    ``_storeFeatureClassNames``), otherwise they are read from the manifest shipped with this module.
+    """
+    featureClasses = qt.QSettings().value('SlicerRadiomics/FeatureClasses')
+    if featureClasses:
+      return json.loads(featureClasses)['featureClasses']
+
+    manifestPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Resources', 'FeatureClasses.json')
+    with open(manifestPath, 'r') as manifestFP:
+      return json.load(manifestFP)['featureClasses']
+
+  @staticmethod
+  def _storeFeatureClassNames():
+    """
+    Store the names of the feature classes of the installed PyRadiomics in the application settings, if changed. Only
+    called when PyRadiomics is imported anyway.
+    """
+    import radiomics
+
+    featureClasses = json.dumps({'version': radiomics.__version__,
+                                 'featureClasses': list(radiomics.getFeatureClasses().keys())})
+    settings = qt.QSettings()
+    if settings.value('SlicerRadiomics/FeatureClasses') != featureClasses:
+      settings.setValue('SlicerRadiomics/FeatureClasses', featureClasses)
+
+  # Label generators to generate ROI labels from either labelmapNode or segmentationNode input
+  # Each item generated is a tuple of (labelNode, imageNode, rois), where rois is a list of (labelName, label value)
+  # tuples. All ROIs in one item are extracted in a single CLI run.
+  def _getLabelGeneratorFromLabelMap(self, labelNode, imageNode):
+    labels = self.getLabelIndex(labelNode).keys()
+
+    rois = [('%s_label_%d' % (labelNode.GetName(), label), label) for label in labels]
+
+    if self.batchMode and not self.cropToROI:
+      # Extract all labels in as few runs as possible, but use all available workers
+      for roiGroup in self._splitROIs(rois):
+        yield labelNode, imageNode, roiGroup
+    else:
+      for roi in rois:
+        yield labelNode, imageNode, [roi]
+
+  def getLabelIndex(self, labelNode):
+    """
+    Get the index of the ROIs in a labelmap node. The index is computed in a single pass over the voxel data and cached
+    until the node is modified.
+
+    :returns: OrderedDict mapping each label value (ascending, excluding 0) to a dict with the number of voxels
+      ('count') and the bounding box ('boundingBox', (i, j, k) start index followed by (i, j, k) size) of that label.
+    """
+    labelIndex = self._getCachedLabelIndex(labelNode)
+    if labelIndex is None:
+      self.logger.debug('Computing label index for %s', labelNode.GetName())
+      imageDataMTime = labelNode.GetImageData().GetMTime()
+      labelIndex = self._computeLabelIndex(slicer.util.arrayFromVolume(labelNode))
+      self._storeLabelIndex(labelNode, labelIndex, imageDataMTime)
+    return labelIndex
+
+  @staticmethod
+  def _getCachedLabelIndex(labelNode):
+    nodeID = labelNode.GetID()
+    cached = SlicerRadiomicsLogic._labelIndexCache.get(nodeID)
+    if cached is not None:
+      if cached['node'] is labelNode and cached['imageDataMTime'] == labelNode.GetImageData().GetMTime():
+        return cached['index']
+      SlicerRadiomicsLogic._invalidateLabelIndex(nodeID)
+    return None
+
+  @staticmethod
+  def _storeLabelIndex(labelNode, labelIndex, imageDataMTime):
+    """
+    Cache the label index of ``labelNode``, computed from the voxel data as it was at ``imageDataMTime``.
+    """
+    nodeID = labelNode.GetID()
+    SlicerRadiomicsLogic._invalidateLabelIndex(nodeID)
+    SlicerRadiomicsLogic._observeScene()
+
+    # Invalidate the cached index once the node is modified
+    callback = lambda caller, event, nodeID=nodeID: SlicerRadiomicsLogic._invalidateLabelIndex(nodeID)
+    observerTags = [labelNode.AddObserver(vtk.vtkCommand.ModifiedEvent, callback),
+                    labelNode.AddObserver(slicer.vtkMRMLVolumeNode.ImageDataModifiedEvent, callback)]
+    SlicerRadiomicsLogic._labelIndexCache[nodeID] = {
+      'node': labelNode,
+      'imageDataMTime': imageDataMTime,
+      'observerTags': observerTags,
+      'index': labelIndex
+    }
+
+  @staticmethod
+  def _invalidateLabelIndex(nodeID):
+    cached = SlicerRadiomicsLogic._labelIndexCache.pop(nodeID, None)
+    if cached is not None:
+      for observerTag in cached['observerTags']:
+        cached['node'].RemoveObserver(observerTag)
+
+  @staticmethod
+  def _observeScene():
+    """
+    Release the data cached for nodes (label indices and volume files) once they are removed from the scene, and
+    remove all volume files when Slicer exits.
+    """
+    if SlicerRadiomicsLogic._sceneObserverTag is None:
+      SlicerRadiomicsLogic._sceneObserverTag = slicer.mrmlScene.AddObserver(slicer.mrmlScene.NodeRemovedEvent,
+                                                                            SlicerRadiomicsLogic._onNodeRemoved)
+      slicer.app.connect('aboutToQuit()', SlicerRadiomicsLogic._removeAllVolumeFiles)
+
+  @staticmethod
+  @vtk.calldata_type(vtk.VTK_OBJECT)
+  def _onNodeRemoved(caller, event, node):
+    # Release the index (and the reference to the node) and the volume file once a node is removed from the scene
+    SlicerRadiomicsLogic._invalidateLabelIndex(node.GetID())
+    SlicerRadiomicsLogic._removeVolumeFile(node.GetID())
+
+  @staticmethod
+  def _computeLabelIndex(labelArray, slabSize=32):
+    """
+    Compute the voxel count and bounding box of each label in ``labelArray`` (numpy array, indexed k, j, i).
+    The array is processed in slabs of ``slabSize`` slices, so only one slab at a time is copied into a SimpleITK image.
+    """
+    for progress, labelIndex in SlicerRadiomicsLogic._iterLabelIndex(labelArray, slabSize):
+      pass
+    return labelIndex
+
+  @staticmethod
+  def _iterLabelIndex(labelArray, slabSize=32):
+    """
+    Compute the label index (see ``_computeLabelIndex``) one slab at a time. After each slab, a tuple of (fraction of
+    the slices done, None) is yielded, the last tuple yielded holds the label index instead of None.
+    """
+    labelStatistics = sitk.LabelShapeStatisticsImageFilter()
+    labelStatistics.SetBackgroundValue(0)
+    labelStatistics.ComputePerimeterOff()
+    labelStatistics.ComputeFeretDiameterOff()
+    labelStatistics.ComputeOrientedBoundingBoxOff()
+
+    counts = {}
+    lowerBounds = {}
+    upperBounds = {}
+    for slabStart in range(0, labelArray.shape[0], slabSize):
+      slab = labelArray[slabStart:slabStart + slabSize]
+      if not numpy.issubdtype(slab.dtype, numpy.integer):
+        slab = slab.astype(numpy.int32)
+      labelStatistics.Execute(sitk.GetImageFromArray(slab))
+
+      for label in labelStatistics.GetLabels():
+        boundingBox = labelStatistics.GetBoundingBox(label)
+        lower = numpy.array(boundingBox[:3]) + (0, 0, slabStart)
+        upper = lower + boundingBox[3:]
+        if label in counts:
+          counts[label] += labelStatistics.GetNumberOfPixels(label)
+          lowerBounds[label] = numpy.minimum(lowerBounds[label], lower)
+          upperBounds[label] = numpy.maximum(upperBounds[label], upper)
+        else:
+          counts[label] = labelStatistics.GetNumberOfPixels(label)
+          lowerBounds[label] = lower
+          upperBounds[label] = upper
+      if slabStart + slabSize < labelArray.shape[0]:
+        yield float(slabStart + slabSize) / labelArray.shape[0], None
+
+    labelIndex = OrderedDict()
+    for label in sorted(counts.keys()):
+      labelIndex[int(label)] = {
+        'count': int(counts[label]),
+        'boundingBox': tuple(int(i) for i in lowerBounds[label]) +
+                       tuple(int(i) for i in upperBounds[label] - lowerBounds[label])
+      }
+    yield 1., labelIndex
 
   def _getLabelGeneratorFromSegmentationNode(self, segmentationNode, imageNode):
     import vtkSegmentationCorePython as vtkSegmentationCore
@@ -533,13 +1021,14 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
     if not segmentation.ContainsRepresentation(binaryRepresentationDef):
       segmentation.CreateRepresentation(binaryRepresentationDef)
 
-    segmentLabelmapNode = slicer.vtkMRMLLabelMapVolumeNode()
-    slicer.mrmlScene.AddNode(segmentLabelmapNode)
-
-    for segmentIndex in range(segmentation.GetNumberOfSegments()):
-      segmentID = segmentation.GetNthSegmentID(segmentIndex)
+    for segmentGroup in self._getSegmentGroups(segmentation):
       segmentIDs = vtk.vtkStringArray()
-      segmentIDs.InsertNextValue(segmentID)
+      for segmentID in segmentGroup:
+        segmentIDs.InsertNextValue(segmentID)
+
+      # Each group is exported to its own labelmap, as the previous one may still be in use by a running CLI.
+      # Segments are assigned label values 1..N in the order of segmentIDs.
+      segmentLabelmapNode = self._addTemporaryLabelMapNode()
 
       if not slicer.vtkSlicerSegmentationsModuleLogic.ExportSegmentsToLabelmapNode(segmentationNode, segmentIDs, segmentLabelmapNode, imageNode):
         self.logger.error("Failed to convert label map")
@@ -547,106 +1036,1245 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
       if not segmentLabelmapNode:
         self.logger.warning('no node')
         continue
-      segmentName = segmentation.GetNthSegment(segmentIndex).GetName()
-      yield '%s_segment_%s' % (segmentationNode.GetName(), segmentName), segmentLabelmapNode, 1, imageNode
+      rois = [('%s_segment_%s' % (segmentationNode.GetName(), segmentation.GetSegment(segmentID).GetName()), label)
+              for label, segmentID in enumerate(segmentGroup, start=1)]
 
-    displayNode = segmentLabelmapNode.GetDisplayNode()
-    if displayNode:
-      slicer.mrmlScene.RemoveNode(displayNode)
-    slicer.mrmlScene.RemoveNode(segmentLabelmapNode)
+      if self.batchMode and not self.cropToROI:
+        for roiGroup in self._splitROIs(rois):
+          yield segmentLabelmapNode, imageNode, roiGroup
+      else:
+        for roi in rois:
+          yield segmentLabelmapNode, imageNode, [roi]
 
-  # CLI interface functions for starting, observing progress and processing results
-  def _startCLI(self, firstRun=False):
-    try:
-      # Get the next segmentation ROI
-      labelName, labelNode, label_idx, imageNode = next(self._labelGenerators)
+  def _getSegmentGroups(self, segmentation):
+    """
+    Group the segments that can be exported to a single labelmap, i.e. segments that do not overlap. Segments that
+    share a binary labelmap layer never overlap, so each layer is a group. If shared layers are not available (or
+    ``exportSegmentsByLayer`` is False), each segment is exported separately.
+    """
+    segmentIDs = [segmentation.GetNthSegmentID(segmentIndex)
+                  for segmentIndex in range(segmentation.GetNumberOfSegments())]
+    if not self.exportSegmentsByLayer or not hasattr(segmentation, 'GetLayerIndex'):
+      return [[segmentID] for segmentID in segmentIDs]
+
+    groups = OrderedDict()
+    for segmentID in segmentIDs:
+      layerIndex = segmentation.GetLayerIndex(segmentID)
+      if layerIndex < 0:  # Not stored in a layer, export separately
+        layerIndex = segmentID
+      groups.setdefault(layerIndex, []).append(segmentID)
+    return list(groups.values())
+
+  def _getLabelGenerator(self, maskNode, imageNode):
+    labelGenerators = []
+    if maskNode.IsA('vtkMRMLVolumeNode'):
+      labelGenerators = chain(labelGenerators, self._getLabelGeneratorFromLabelMap(maskNode, imageNode))
+    elif maskNode.IsA('vtkMRMLSegmentationNode'):
+      labelGenerators = chain(labelGenerators, self._getLabelGeneratorFromSegmentationNode(maskNode, imageNode))
+    else:
+      self.logger.error('Invalid maskNode')
+      return None
+    return labelGenerators
 
-      self.logger.info('Starting RadiomicsCLI for %s', labelName)
+  def _getImageLabelGenerator(self, labelGenerators, imageNodes):
+    """
+    Repeat each item generated by ``labelGenerators`` for every image in ``imageNodes``, so the labelmap of each item
+    is only generated once and extracted from all images. If there are multiple images, ROI names are prefixed by the
+    name of the image, so each (image, ROI) pair gets its own column in the output table.
+    """
+    for labelNode, referenceImageNode, rois in labelGenerators:
+      for imageNode in imageNodes:
+        imageRois = []
+        for labelName, label in rois:
+          imageLabelName = labelName
+          if len(imageNodes) > 1:
+            imageLabelName = '%s_%s' % (imageNode.GetName(), labelName)
+          self._roiImages[imageLabelName] = (imageNode.GetName(), labelName)
+          imageRois.append((imageLabelName, label))
+        yield labelNode, imageNode, imageRois
+
+  def _getROICount(self, maskNode):
+    if maskNode.IsA('vtkMRMLSegmentationNode'):
+      return maskNode.GetSegmentation().GetNumberOfSegments()
+    return len(self.getLabelIndex(maskNode))
+
+  def _splitROIs(self, rois):
+    """
+    Split the list of ROIs into (at most) ``maxWorkers`` groups of consecutive ROIs of (almost) equal size.
+    """
+    if len(rois) == 0:
+      return []
+    groupCount = min(len(rois), max(1, self.maxWorkers)) if not self.runSync else 1
+    groupSize, remainder = divmod(len(rois), groupCount)
+    groups = []
+    start = 0
+    for groupIndex in range(groupCount):
+      end = start + groupSize + (1 if groupIndex < remainder else 0)
+      groups.append(rois[start:end])
+      start = end
+    return groups
+
+  def _addTemporaryLabelMapNode(self):
+    labelNode = slicer.vtkMRMLLabelMapVolumeNode()
+    slicer.mrmlScene.AddNode(labelNode)
+    self._temporaryNodes[labelNode.GetID()] = labelNode
+    return labelNode
+
+  def _removeTemporaryNodes(self, removeAll=False):
+    """
+    Remove the temporary nodes (labelmaps and cropped volumes) that are no longer in use by a running task. Unless
+    ``removeAll`` is True, the labelmap of the last generated task is kept, as it may be used by the next task from the
+    same generator.
+    """
+    nodesInUse = set([task['labelNode'].GetID() for task in self._runningTasks] +
+                     [task['imageNode'].GetID() for task in self._runningTasks])
+    if not removeAll and self._currentLabelNode is not None:
+      nodesInUse.add(self._currentLabelNode.GetID())
+      if self._currentLabelNode.GetID() in self._resampledLabelNodes:
+        nodesInUse.add(self._resampledLabelNodes[self._currentLabelNode.GetID()].GetID())
+    if not removeAll:
+      nodesInUse.update([resampledNode.GetID() for resampledNode in self._resampledImageNodes.values()])
+
+    for nodeID in list(self._temporaryNodes.keys()):
+      if nodeID in nodesInUse:
+        continue
+      temporaryNode = self._temporaryNodes.pop(nodeID)
+      self._removeVolumeFile(nodeID)
+      self._invalidateLabelIndex(nodeID)
+      displayNode = temporaryNode.GetDisplayNode()
+      if displayNode:
+        slicer.mrmlScene.RemoveNode(displayNode)
+      slicer.mrmlScene.RemoveNode(temporaryNode)
+
+    self._resampledLabelNodes = dict([(labelNodeID, resampledNode)
+                                      for labelNodeID, resampledNode in self._resampledLabelNodes.items()
+                                      if resampledNode.GetID() in self._temporaryNodes])
+
+  def _getExtractor(self):
+    """
+    Get a feature extractor customized by the current parameter file. This is used to obtain the customization
+    (validated and completed with the PyRadiomics defaults), it is instantiated once per extraction.
+    """
+    if self._extractor is None:
+      from radiomics import featureextractor
+      self._extractor = featureextractor.RadiomicsFeatureExtractor(self._parameterFile)
+      self._extractor.settings['correctMask'] = True  # Also set by the CLI
+      self._storeFeatureClassNames()
+    return self._extractor
+
+  def _getCanonicalParameters(self):
+    """
+    Get the customization of the current extraction as validated and completed with the defaults by PyRadiomics, i.e.
+    a parameter dict that yields the same extraction regardless of how the parameter file was formatted.
+    """
+    extractor = self._getExtractor()
+    return {
+      'setting': extractor.settings,
+      'imageType': extractor.enabledImagetypes,
+      # All features of a class are enabled by either None or an empty list
+      'featureClass': dict([(featureClass, features or [])
+                            for featureClass, features in extractor.enabledFeatures.items()])
+    }
+
+  @staticmethod
+  def _getConfigurationHash(configuration):
+    """
+    Get the hash of a JSON serializable configuration, which does not depend on the order of the keys of its dicts or on
+    how numbers are written (e.g. 25 and 25.0 are equal).
+    """
+    def canonicalize(value):
+      if isinstance(value, dict):
+        return dict([(str(k), canonicalize(v)) for k, v in value.items()])
+      if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+      if isinstance(value, float) and value.is_integer():
+        return int(value)
+      return value
+
+    configuration = json.dumps(canonicalize(configuration), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(configuration.encode('utf-8')).hexdigest()
 
-      self._labelName = labelName
+  @staticmethod
+  def _writeParameterFile(parameters):
+    """
+    Write a parameter dict to a file named by the hash of its contents, so the same customization is only written once
+    and logic instances running at the same time never overwrite each other's file. Files are kept, as they can be in
+    use by other logic instances.
 
-      parameters = {
-        'Image': imageNode.GetID(),
-        'Mask': labelNode.GetID(),
-        'param': self._parameterFile,
-        'out': self._cli_output.GetID(),
-        'label': label_idx
+    :returns: The path of the parameter file
+    """
+    parameterDir = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomics')
+    if not os.path.isdir(parameterDir):
+      os.makedirs(parameterDir)
+    parameterHash = SlicerRadiomicsLogic._getConfigurationHash(parameters)
+    parameterFile = os.path.join(parameterDir, 'RadiomicsLogicParams_%s.json' % parameterHash)
+    if not os.path.isfile(parameterFile):
+      # Written to a temporary file first, so a file with this name is always complete
+      with open(parameterFile + '.%d.tmp' % os.getpid(), mode='w') as parameterFileFP:
+        # Keys are not sorted, as the order of the image types determines the order of the features
+        json.dump(parameters, parameterFileFP, default=str)
+      os.replace(parameterFile + '.%d.tmp' % os.getpid(), parameterFile)
+    return parameterFile
+
+  # Resampling of the image once per extraction (see resampleOnce)
+  def _initResampling(self, imageNodes):
+    """
+    If the customization specifies resampling, resample the images on a grid covering the full (first) image and
+    continue with a parameter file without resampling. All images share the grid, so the resampled masks can be used
+    for all images.
+    """
+    extractor = self._getExtractor()
+    resampledPixelSpacing = extractor.settings.get('resampledPixelSpacing')
+    interpolator = extractor.settings.get('interpolator')
+    if resampledPixelSpacing is None or interpolator is None:
+      return
+
+    image = sitkUtils.PullVolumeFromSlicer(imageNodes[0])
+    if isinstance(interpolator, str):
+      interpolator = getattr(sitk, interpolator)
+
+    # Grid covering the full image, with the origin in the center of the first (resampled) voxel
+    spacing = numpy.array(image.GetSpacing())
+    newSpacing = numpy.where(numpy.array(resampledPixelSpacing) == 0, spacing, resampledPixelSpacing)
+    newSize = numpy.ceil(numpy.array(image.GetSize()) * spacing / newSpacing).astype('int').tolist()
+    newOrigin = image.TransformContinuousIndexToPhysicalPoint(.5 * (newSpacing - spacing) / spacing)
+    self._resampling = (newSpacing.tolist(), newSize, newOrigin, image.GetDirection())
+
+    for imageNode in imageNodes:
+      self.logger.info('Resampling %s to spacing %s and size %s', imageNode.GetName(), newSpacing, newSize)
+      if imageNode is not imageNodes[0]:
+        image = sitkUtils.PullVolumeFromSlicer(imageNode)
+      resampledNode = sitkUtils.PushVolumeToSlicer(self._resample(image, interpolator),
+                                                   name=imageNode.GetName() + '_resampled')
+      self._temporaryNodes[resampledNode.GetID()] = resampledNode
+      self._resampledImageNodes[imageNode.GetID()] = resampledNode
+
+    # Continue with the same (validated) customization, but without resampling
+    extractor.settings = dict([(k, v) for k, v in extractor.settings.items() if k != 'resampledPixelSpacing'])
+    self._parameterFile = self._writeParameterFile(self._getCanonicalParameters())
+
+  def _resample(self, image, interpolator):
+    newSpacing, newSize, newOrigin, direction = self._resampling
+    rif = sitk.ResampleImageFilter()
+    rif.SetOutputSpacing(newSpacing)
+    rif.SetSize(newSize)
+    rif.SetOutputOrigin(newOrigin)
+    rif.SetOutputDirection(direction)
+    rif.SetOutputPixelType(image.GetPixelID())
+    rif.SetInterpolator(interpolator)
+    return rif.Execute(image)
+
+  def _getResampledLabelNode(self, labelNode):
+    """
+    Get ``labelNode`` resampled on the grid of the resampled image.
+    """
+    if labelNode.GetID() not in self._resampledLabelNodes:
+      resampledLabel = self._resample(sitkUtils.PullVolumeFromSlicer(labelNode), sitk.sitkNearestNeighbor)
+      resampledNode = sitkUtils.PushVolumeToSlicer(resampledLabel, name=labelNode.GetName() + '_resampled',
+                                                   className='vtkMRMLLabelMapVolumeNode')
+      self._temporaryNodes[resampledNode.GetID()] = resampledNode
+      self._resampledLabelNodes[labelNode.GetID()] = resampledNode
+    return self._resampledLabelNodes[labelNode.GetID()]
+
+  # Cropping of the image and mask to the bounding box of the ROIs
+
+  @staticmethod
+  def _getCropMargin(settings, enabledImageTypes, spacing):
+    """
+    Get the margin (number of voxels along i, j and k) that is needed around the bounding box of the ROI to obtain the
+    same feature values as an extraction on the full image. Returns None if the feature values depend on image content
+    outside of the bounding box (e.g. filters or normalization applied to the full image), in which case the image
+    must not be cropped.
+    """
+    if settings.get('normalize', False) or settings.get('voxelBased', False):
+      # Normalization uses the statistics of the full image
+      return None
+
+    padDistance = settings.get('padDistance', 5)
+    resampledPixelSpacing = settings.get('resampledPixelSpacing')
+    if resampledPixelSpacing is not None and settings.get('interpolator') is not None:
+      # The image is resampled on a grid spanning the bounding box plus padDistance voxels (in the resampled grid),
+      # filters are applied to this resampled image. Reserve space for the support of the interpolator (B-spline) too.
+      return [int(numpy.ceil(padDistance * (newSpacing if newSpacing > 0 else oldSpacing) / oldSpacing)) + 3
+              for newSpacing, oldSpacing in zip(resampledPixelSpacing, spacing)]
+    if settings.get('preCrop', False):
+      # The image is cropped to the bounding box plus padDistance voxels before filters are applied
+      return [padDistance] * 3
+    if list(enabledImageTypes.keys()) == ['Original']:
+      # Features are calculated on the image cropped to the bounding box
+      return [0, 0, 0]
+    # Filters are applied to the full image
+    return None
+
+  def _getChunkMargin(self, imageNode, labelNode):
+    """
+    Get the margin around the bounding box of each ROI in chunked extraction (see ``chunked``), or None if the task is
+    extracted from the full volumes.
+    """
+    if not (self.chunked and self.batchMode):
+      return None
+    if not self._haveSameGeometry(imageNode, labelNode):
+      self.logger.debug('Chunked extraction skipped, image and mask geometry differ')
+      return None
+
+    extractor = self._getExtractor()
+    margin = self._getCropMargin(extractor.settings, extractor.enabledImagetypes, imageNode.GetSpacing())
+    if margin is None:
+      self.logger.warning('Results depend on image content outside of the ROI, extracting with a margin of %d voxels',
+                          self.chunkMargin)
+      margin = [self.chunkMargin] * 3
+    return margin
+
+  @staticmethod
+  def _haveSameGeometry(volumeNode1, volumeNode2):
+    if volumeNode1.GetImageData().GetDimensions() != volumeNode2.GetImageData().GetDimensions():
+      return False
+    matrix1 = vtk.vtkMatrix4x4()
+    matrix2 = vtk.vtkMatrix4x4()
+    volumeNode1.GetIJKToRASMatrix(matrix1)
+    volumeNode2.GetIJKToRASMatrix(matrix2)
+    return numpy.allclose([matrix1.GetElement(i, j) for i in range(4) for j in range(4)],
+                          [matrix2.GetElement(i, j) for i in range(4) for j in range(4)], atol=1e-6)
+
+  def _cropToROIs(self, imageNode, labelNode, rois):
+    """
+    Crop image and labelmap to the bounding box of ``rois``, extended by the margin needed by the extraction. If
+    cropping is not possible or would change the results, the input nodes are returned.
+    """
+    extractor = self._getExtractor()
+    margin = self._getCropMargin(extractor.settings, extractor.enabledImagetypes, imageNode.GetSpacing())
+    if margin is None:
+      self.logger.debug('Cropping skipped, results depend on image content outside of the ROI')
+      return imageNode, labelNode
+    if not self._haveSameGeometry(imageNode, labelNode):
+      self.logger.debug('Cropping skipped, image and mask geometry differ')
+      return imageNode, labelNode
+
+    labelIndex = self.getLabelIndex(labelNode)
+    boundingBoxes = [labelIndex[label]['boundingBox'] for labelName, label in rois if label in labelIndex]
+    if len(boundingBoxes) == 0:
+      return imageNode, labelNode
+
+    dimensions = numpy.array(imageNode.GetImageData().GetDimensions())
+    lower = numpy.min([boundingBox[:3] for boundingBox in boundingBoxes], axis=0)
+    upper = numpy.max([numpy.add(boundingBox[:3], boundingBox[3:]) for boundingBox in boundingBoxes], axis=0)
+    lower = numpy.maximum(lower - margin, 0)
+    upper = numpy.minimum(upper + margin, dimensions)
+    if numpy.all(lower == 0) and numpy.all(upper == dimensions):
+      return imageNode, labelNode
+
+    self.logger.debug('Cropping to [%s, %s)', lower, upper)
+    return self._cropVolume(imageNode, lower, upper), self._cropVolume(labelNode, lower, upper)
+
+  def _cropVolume(self, volumeNode, lower, upper):
+    """
+    Create a temporary volume node holding the voxels of ``volumeNode`` in the region [lower, upper) (i, j, k).
+    """
+    array = slicer.util.arrayFromVolume(volumeNode)[lower[2]:upper[2], lower[1]:upper[1], lower[0]:upper[0]]
+
+    croppedNode = slicer.mrmlScene.AddNewNodeByClass(volumeNode.GetClassName(), volumeNode.GetName() + '_cropped')
+    ijkToRAS = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRAS)
+    croppedNode.SetIJKToRASMatrix(ijkToRAS)
+    croppedNode.SetOrigin(ijkToRAS.MultiplyPoint([float(i) for i in lower] + [1.0])[:3])
+    slicer.util.updateVolumeFromArray(croppedNode, numpy.ascontiguousarray(array))
+
+    self._temporaryNodes[croppedNode.GetID()] = croppedNode
+    return croppedNode
+
+  # Result cache: keys identifying the result of an ROI by the content of image, ROI and customization
+  @classmethod
+  def getDefaultResultCache(cls):
+    """
+    Get the result cache that is used unless another one is set on the logic (``resultCache``). It is stored in the
+    temporary directory of Slicer and shared by all logic instances.
+    """
+    if cls._defaultResultCache is None:
+      cls._defaultResultCache = SlicerRadiomicsResultCache()
+    return cls._defaultResultCache
+
+  @staticmethod
+  def _getVolumeStamp(volumeNode):
+    """
+    Get a stamp that changes when the voxel data or geometry of ``volumeNode`` is modified.
+    """
+    ijkToRAS = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRAS)
+    return volumeNode.GetImageData().GetMTime(), tuple([ijkToRAS.GetElement(i, j) for i in range(4) for j in range(4)])
+
+  def _getVolumeHash(self, volumeNode):
+    """
+    Get the hash of the voxel data and geometry of ``volumeNode``. The hash is cached until the node is modified.
+    """
+    stamp = self._getVolumeStamp(volumeNode)
+    cached = SlicerRadiomicsLogic._volumeHashes.get(volumeNode.GetID())
+    if cached is not None and cached[0] == stamp:
+      return cached[1]
+
+    array = slicer.util.arrayFromVolume(volumeNode)
+    volumeHash = hashlib.sha1()
+    volumeHash.update(repr((array.dtype.str, array.shape, stamp[1])).encode('utf-8'))
+    volumeHash.update(numpy.ascontiguousarray(array).data)
+    SlicerRadiomicsLogic._volumeHashes[volumeNode.GetID()] = (stamp, volumeHash.hexdigest())
+    return volumeHash.hexdigest()
+
+  def _getROIHash(self, labelNode, label):
+    """
+    Get the hash of the ROI identified by ``label`` in ``labelNode`` (i.e. the voxels with that label, their position
+    and the geometry of the labelmap). Returns None if the label is not present in the labelmap.
+    """
+    labelIndex = self.getLabelIndex(labelNode)
+    if label not in labelIndex:
+      return None
+    i, j, k, si, sj, sk = labelIndex[label]['boundingBox']
+    roiArray = slicer.util.arrayFromVolume(labelNode)[k:k + sk, j:j + sj, i:i + si] == label
+
+    roiHash = hashlib.sha1()
+    roiHash.update(repr((labelNode.GetImageData().GetDimensions(), labelIndex[label]['boundingBox'],
+                         self._getVolumeStamp(labelNode)[1])).encode('utf-8'))
+    roiHash.update(numpy.packbits(roiArray).data)
+    return roiHash.hexdigest()
+
+  def _getParameterHash(self):
+    """
+    Get the hash of the customization of the current extraction, which is used as the key of the configuration in the
+    result cache and in the output table ('SlicerRadiomics.ParameterHash'). The customization is normalized by
+    PyRadiomics (see ``_getCanonicalParameters``), so the hash does not depend on formatting or the order of the
+    parameter file. The PyRadiomics version is included as well, as results may change between versions.
+    """
+    if self._parameterHash is None:
+      import radiomics
+      configuration = {
+        'version': radiomics.__version__,
+        'parameters': self._getCanonicalParameters(),
+        'resampleOnce': self._resampling,
+        'chunkMargin': self.chunkMargin if self.chunked else None
       }
+      self._parameterHash = self._getConfigurationHash(configuration)
+    return self._parameterHash
+
+  def _getResultKeys(self, imageNode, labelNode, rois):
+    """
+    Get the keys identifying the results of ``rois``. ROIs for which no key can be computed are omitted.
+
+    :returns: Tuple of two dicts mapping labelName to a key. The first (ROI keys) identifies the results by the content
+      of image, ROI and customization, regardless of the label value of the ROI (used for incremental re-extraction).
+      The second (result keys) includes the label value as well (used for the result cache).
+    """
+    imageHash = self._getVolumeHash(imageNode)
+    parameterHash = self._getParameterHash()
+    roiKeys = {}
+    resultKeys = {}
+    for labelName, label in rois:
+      roiHash = self._getROIHash(labelNode, label)
+      if roiHash is not None:
+        roiKey = '%s:%s:%s' % (imageHash, roiHash, parameterHash)
+        roiKeys[labelName] = hashlib.sha1(roiKey.encode('utf-8')).hexdigest()
+        resultKey = '%s:%s:%d:%s' % (imageHash, roiHash, label, parameterHash)
+        resultKeys[labelName] = hashlib.sha1(resultKey.encode('utf-8')).hexdigest()
+    return roiKeys, resultKeys
+
+  def _getAvailableResults(self, task):
+    """
+    Look up the results of the ROIs in ``task`` that do not need to be extracted, either because the output table
+    already contains results for the same image, ROI and customization (incremental re-extraction), or because they
+    are stored in the result cache. Found results are stored in ``task['cachedResults']``.
+    """
+    task['roiKeys'], task['resultKeys'] = self._getResultKeys(task['imageNode'], task['labelNode'], task['rois'])
+    if not (self.useResultCache and self.resultCache is not None):
+      task['resultKeys'] = {}
+
+    for labelName, label in task['rois']:
+      if task['roiKeys'].get(labelName) in self._previousResults:
+        task['cachedResults'][labelName] = self._previousResults[task['roiKeys'][labelName]]
+      elif labelName in task['resultKeys']:
+        features = self.resultCache.get(task['resultKeys'][labelName])
+        if features is not None:
+          task['cachedResults'][labelName] = features
+
+  def _getPreviousResults(self, tableNode):
+    """
+    Get the results stored in ``tableNode`` by a previous extraction, for which the ROI keys were recorded (see
+    _onFinished).
+
+    :returns: dict mapping ROI key to the features (list of (featureKey, featureValue) tuples) of that ROI
+    """
+    roiKeys = tableNode.GetAttribute('SlicerRadiomics.ROIKeys')
+    if not roiKeys:
+      return {}
+    try:
+      roiKeys = json.loads(roiKeys)
+    except ValueError:
+      return {}
+
+    tableResults = self._getTableResults(tableNode)
+    metadataTable = tableNode.GetNodeReference('SlicerRadiomics.Metadata')
+    if metadataTable is not None:
+      for labelName, features in self._getTableResults(metadataTable).items():
+        tableResults.setdefault(labelName, []).extend(features)
 
-      RadiomicsCLI = slicer.modules.slicerradiomicscli
-
-      self.logger.debug('Starting...')
-      self.cliNode = slicer.cli.run(RadiomicsCLI, self.cliNode, parameters, wait_for_completion=self.runSync)
-
-      if self.runSync:
-        # process the result.
-        # If running asynchronously, this will function is called from _onStatus (triggered by ModifiedEvent)
-        self._cli_done(self.cliNode.GetStatusString())
-      elif firstRun:
-        # Observer is only needed when running in asynchronous mode
-        # They only need to be added when the CLI is initialized and started for the first time
-        self.logger.debug('Adding observer')
-        self._onStatusObserverTag = self.cliNode.AddObserver('ModifiedEvent', self._onStatus)
-    except StopIteration:
+    return dict([(roiKeys[labelName], features) for labelName, features in tableResults.items()
+                 if labelName in roiKeys])
+
+  @staticmethod
+  def _getTableResults(tableNode):
+    """
+    Read the results stored in an output (or metadata) table, in text or typed layout.
+
+    :returns: dict mapping column name to the features (list of (featureKey, featureValue) tuples) in that column
+    """
+    table = tableNode.GetTable()
+    categories = tableNode.GetAttribute('SlicerRadiomics.Categories')
+    categories = json.loads(categories) if categories else None
+
+    keyParts = []
+    for columnIndex in range(3):
+      column = table.GetColumn(columnIndex)
+      if categories is not None and isinstance(column, vtk.vtkDataArray):
+        # Dictionary-encoded key column
+        names = categories[column.GetName()]
+        keyParts.append([names[code] for code in numpy_support.vtk_to_numpy(column)])
+      else:
+        keyParts.append([column.GetValue(rowIndex) for rowIndex in range(table.GetNumberOfRows())])
+    featureKeys = ['_'.join(parts) for parts in zip(*keyParts)]
+
+    tableResults = OrderedDict()
+    for columnIndex in range(3, table.GetNumberOfColumns()):
+      column = table.GetColumn(columnIndex)
+      if isinstance(column, vtk.vtkDataArray):
+        features = [(featureKey, featureValue)
+                    for featureKey, featureValue in zip(featureKeys, numpy_support.vtk_to_numpy(column).tolist())
+                    if not numpy.isnan(featureValue)]
+      else:
+        features = [(featureKey, column.GetValue(rowIndex)) for rowIndex, featureKey in enumerate(featureKeys)
+                    if column.GetValue(rowIndex) != '']
+      tableResults[column.GetName()] = features
+    return tableResults
+
+  # CLI interface functions for starting, observing progress and processing results
+  def _startCLI(self):
+    """
+    Start CLI runs for the next tasks until ``maxWorkers`` runs are executing, or all tasks have been started.
+    When running synchronously, each task is processed completely before the next one is started. When running
+    asynchronously, the remaining preparation steps are done and the tasks are started one per timer step.
+    """
+    if self.runSync:
+      while self._startNextTask():
+        pass
+      return
+
+    if self._stepTimer is None:
+      self._stepTimer = qt.QTimer()
+      self._stepTimer.setInterval(0)
+      self._stepTimer.connect('timeout()', self._onStepTimer)
+    self._stepTimer.start()
+
+  def _onStepTimer(self):
+    if self._preparationSteps is not None:
+      try:
+        progress = next(self._preparationSteps)
+      except StopIteration:
+        self._preparationSteps = None
+      else:
+        if self.preparationCallback is not None:
+          self.preparationCallback(progress)
+      return
+
+    if not self._startNextTask():
+      self._stepTimer.stop()
+
+  def _startNextTask(self):
+    """
+    Start the next task if fewer than ``maxWorkers`` tasks are running. If all tasks are done, the extraction is
+    finished.
+
+    :returns: True if a task was started (and more tasks can be started), False otherwise
+    """
+    maxWorkers = 1 if self.runSync else max(1, self.maxWorkers)
+    if self._labelGenerators is not None and len(self._runningTasks) < maxWorkers and self._fitsMemoryBudget():
+      startTime = time.perf_counter()
+      try:
+        # Get the next (set of) segmentation ROI(s)
+        labelNode, imageNode, rois = next(self._labelGenerators)
+      except StopIteration:
+        self._labelGenerators = None
+        self._currentLabelNode = None
+      else:
+        self._currentLabelNode = labelNode
+        self._startTask(labelNode, imageNode, rois, time.perf_counter() - startTime)
+        return True
+
+    if self._labelGenerators is None and len(self._runningTasks) == 0:
       # finished extracting features
       self.logger.info("Extraction complete")
       self._onFinished()
+    return False
+
+  def _fitsMemoryBudget(self):
+    """
+    Check whether another task can be started without exceeding ``memoryBudget``. If not, the next task is started
+    once a running task is done.
+    """
+    if self.memoryBudget is None or len(self._runningTasks) == 0:
+      return True
+    return (len(self._runningTasks) + 1) * self._getTaskMemoryEstimate() <= self.memoryBudget
+
+  def _getTaskMemoryEstimate(self):
+    """
+    Get the estimated peak memory (in bytes) of the process extracting a task. Once tasks have finished, the largest
+    peak memory measured for these tasks is used, so the number of tasks running at the same time adapts to the actual
+    memory use.
+    """
+    if self._measuredMemory is not None:
+      return self._measuredMemory
+    return self._memoryEstimate or 0
 
-  def _onStatus(self, caller, event):
+  def _estimateTaskMemory(self, imageNode):
+    """
+    Estimate the peak memory (in bytes) of an extraction process extracting from ``imageNode``, from the size of the
+    image and the number of filtered images derived from it. This is an upper bound for chunked extraction (see
+    ``chunked``), where only the region of each ROI is loaded.
+    """
+    extractor = self._getExtractor()
+    filteredImageCount = 0
+    for imageType, customArgs in extractor.enabledImagetypes.items():
+      kwargs = dict(extractor.settings)
+      kwargs.update(customArgs or {})
+      if imageType == 'LoG':
+        filteredImageCount += len(kwargs.get('sigma', []))
+      elif imageType == 'Wavelet':
+        filteredImageCount += 7 * kwargs.get('level', 1) + 1
+      elif imageType != 'Original':
+        filteredImageCount += 1
+
+    imageData = imageNode.GetImageData()
+    voxelCount = float(numpy.prod(imageData.GetDimensions()))
+    # Image and mask as read from file, and the image cast to floating point plus the filtered image being computed
+    memory = voxelCount * (imageData.GetScalarSize() * imageData.GetNumberOfScalarComponents() + 4 + 2 * 8)
+    # Filtered images kept in memory to be reused for all ROIs (see SlicerRadiomicsCLI.FilteredImageCache, 2 GB at most)
+    memory += min(voxelCount * 8 * filteredImageCount, 2048 * 1024 * 1024)
+    return int(self._processMemory + memory)
+
+  def _getPreparationSteps(self, imageNodes, maskNode):
+    """
+    Prepare the extraction: compute the label index of a labelmap (one slab of slices per step, see getLabelIndex) and
+    resample the images (see resampleOnce). Yields the fraction of the preparation that is done after each step.
+    """
+    if maskNode.IsA('vtkMRMLVolumeNode') and self._getCachedLabelIndex(maskNode) is None:
+      self.logger.debug('Computing label index for %s', maskNode.GetName())
+      imageDataMTime = maskNode.GetImageData().GetMTime()
+      for progress, labelIndex in self._iterLabelIndex(slicer.util.arrayFromVolume(maskNode)):
+        yield .9 * progress
+      self._storeLabelIndex(maskNode, labelIndex, imageDataMTime)
+    self._roiCount = self._getROICount(maskNode) * len(imageNodes)
+
+    if self.resampleOnce:
+      self._initResampling(imageNodes)
+
+    if self.memoryBudget is not None:
+      self._memoryEstimate = max([self._estimateTaskMemory(self._resampledImageNodes.get(imageNode.GetID(), imageNode))
+                                  for imageNode in imageNodes])
+      self.logger.debug('Estimated memory per task: %.0f MB', self._memoryEstimate / 1024. / 1024)
+    yield 1.
+
+  def _isRunning(self):
+    return self.cliNode is not None or self._preparationSteps is not None or self._labelGenerators is not None or \
+        len(self._runningTasks) > 0
+
+  def cancel(self):
+    """
+    Cancel the running extraction. Running CLIs are cancelled (and extraction workers stopped), ROIs that have not been
+    extracted yet are skipped and the temporary nodes and files are removed. Results that were already stored in the
+    output table are kept and the callback of the extraction is invoked as usual. An in-process extraction (see
+    ``extractInProcess``) stops after the ROI that is being extracted.
+    """
+    if self._inProcessState is not None:
+      self._inProcessState['cancelled'] = True
+    if not self._isRunning():
+      return
+
+    self.logger.info('Cancelling extraction')
+    if self._stepTimer is not None:
+      self._stepTimer.stop()
+    self._preparationSteps = None
+    self._labelGenerators = None
+    self._currentLabelNode = None
+
+    for task in self._runningTasks:
+      if task['cliNode'] is not None:
+        if task['observerTag'] is not None:
+          task['cliNode'].RemoveObserver(task['observerTag'])
+          task['observerTag'] = None
+        task['cliNode'].Cancel()
+        self._idleSlots.append((task['cliNode'], task['cliOutput']))  # Temporary output table is removed when done
+      if task['worker'] is not None:
+        task['worker'].cancel()
+      for filePath in [task['outJson'], task['outProgress']]:
+        if filePath is not None and os.path.isfile(filePath):
+          os.remove(filePath)
+      self._releaseVolumeFiles(task)
+    self._runningTasks = []
+    self._pendingResults = {}
+
+    self._onFinished()
+
+  def _startTask(self, labelNode, imageNode, rois, exportTime=0.):
+    """
+    Start the extraction of one task. If enabled and available, the task is sent to a persistent extraction worker,
+    otherwise a CLI run is started. When running synchronously, this function returns when the task is done.
+
+    :param exportTime: Time (in seconds) spent on generating the labelmap of the task
+    """
+    task = {
+      'index': self._taskCount,
+      'imageNode': imageNode,
+      'labelNode': labelNode,
+      'rois': rois,
+      'cliNode': None,
+      'cliOutput': None,
+      'running': False,
+      'observerTag': None,
+      'worker': None,
+      'outJson': None,
+      'allRois': rois,  # All ROIs of this task, 'rois' only holds the ROIs which still need to be extracted
+      'roiKeys': {},
+      'resultKeys': {},
+      'cachedResults': {},
+      'roiOffset': self._roiOffset,  # Number of ROIs in the tasks generated before this one
+      'outProgress': None,
+      'volumeFiles': [],  # Volume files used by the task, released when the task is done (see _getVolumeFile)
+      'progress': None,  # Last progress (label, imageType, featureClass) reported by the CLI or worker
+      'timings': {'export': exportTime, 'io': 0.},  # Time spent on the task as a whole, see _recordTimings
+      'startTime': time.perf_counter(),
+      'peakMemory': None  # Peak memory of the extraction process, reported by the CLI or worker
+    }
+    self._taskCount += 1
+    self._roiOffset += len(rois)
+
+    if self.incremental or (self.useResultCache and self.resultCache is not None):
+      self._getAvailableResults(task)
+      rois = [roi for roi in rois if roi[0] not in task['cachedResults']]
+      task['rois'] = rois
+      if len(rois) == 0:
+        self.logger.info('Using available results for %s',
+                         ', '.join([labelName for labelName, label in task['allRois']]))
+        self._runningTasks.append(task)
+        self._onTaskDone(task, [])
+        return task
+
+    self._reportProgress(task, {'label': rois[0][1], 'imageType': None, 'featureClass': None})
+
+    startTime = time.perf_counter()
+    if imageNode.GetID() in self._resampledImageNodes:
+      task['imageNode'] = self._resampledImageNodes[imageNode.GetID()]
+      task['labelNode'] = self._getResampledLabelNode(labelNode)
+
+    if self.cropToROI:
+      task['imageNode'], task['labelNode'] = self._cropToROIs(task['imageNode'], task['labelNode'], rois)
+    task['timings']['export'] += time.perf_counter() - startTime
+
+    worker = None
+    if self.useWorker:
+      maxWorkers = 1 if self.runSync else max(1, self.maxWorkers)
+      worker = SlicerRadiomicsWorkerClient.getIdleWorker(maxWorkers)
+
+    if worker is not None:
+      self._runTaskWithWorker(task, worker)
+    else:
+      self._runTaskWithCLI(task)
+    return task
+
+  def _runTaskWithCLI(self, task):
+    rois = task['rois']
+    self.logger.info('Starting RadiomicsCLI for %s', ', '.join([labelName for labelName, label in rois]))
+
+    # Reuse a CLI node and temporary output table of a finished task if available
+    if len(self._idleSlots) > 0:
+      cliNode, cliOutput = self._idleSlots.pop(0)
+    else:
+      cliNode = None
+      cliOutput = slicer.vtkMRMLTableNode()
+      slicer.mrmlScene.AddNode(cliOutput)
+    task['cliOutput'] = cliOutput
+
+    parameters = {
+      'Image': task['imageNode'].GetID(),
+      'Mask': task['labelNode'].GetID(),
+      'param': self._parameterFile,
+      'paramValidated': self.batchMode  # Validated by the logic, single ROI mode is handled by PyRadiomics
+    }
+    chunkMargin = self._getChunkMargin(task['imageNode'], task['labelNode'])
+    if self.batchMode and (self.shareVolumeFiles or chunkMargin is not None):
+      startTime = time.perf_counter()
+      parameters['imageFile'] = self._getVolumeFile(task['imageNode'], task)
+      parameters['maskFile'] = self._getVolumeFile(task['labelNode'], task)
+      task['timings']['io'] += time.perf_counter() - startTime
+      # Empty, so the CLI does not write the nodes to file (reused CLI nodes keep the values of the previous run)
+      parameters['Image'] = ''
+      parameters['Mask'] = ''
+    else:
+      parameters['imageFile'] = ''
+      parameters['maskFile'] = ''
+    if self.batchMode:
+      # Extract all ROIs in a single run, results are returned as a JSON file, which is faster to read than a table
+      parameters['labels'] = ','.join([str(label) for labelName, label in rois])
+      resultsDir = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomics')
+      if not os.path.isdir(resultsDir):
+        os.makedirs(resultsDir)
+      task['outJson'] = os.path.join(resultsDir, 'results_%d_%d.json' % (id(self), task['index']))
+      parameters['outJson'] = task['outJson']
+      task['outProgress'] = os.path.join(resultsDir, 'progress_%d_%d.json' % (id(self), task['index']))
+      parameters['outProgress'] = task['outProgress']
+      parameters['chunkMargin'] = ','.join([str(i) for i in chunkMargin]) if chunkMargin is not None else ''
+    else:
+      parameters['label'] = rois[0][1]
+      parameters['out'] = cliOutput.GetID()
+
+    RadiomicsCLI = slicer.modules.slicerradiomicscli
+
+    self.logger.debug('Starting...')
+    self._runningTasks.append(task)
+    if self.runSync:
+      task['cliNode'] = slicer.cli.run(RadiomicsCLI, cliNode, parameters, wait_for_completion=True)
+      self.cliNode = task['cliNode']
+      # process the result.
+      # If running asynchronously, this will function is called from _onStatus (triggered by ModifiedEvent)
+      self._cli_done(task)
+    else:
+      # Create the CLI node without starting it, so the observer is in place before the CLI starts
+      if cliNode is None:
+        cliNode = slicer.cli.createNode(RadiomicsCLI, parameters)
+      task['cliNode'] = cliNode
+      self.cliNode = cliNode
+      self.logger.debug('Adding observer')
+      task['observerTag'] = cliNode.AddObserver('ModifiedEvent',
+                                                lambda caller, event, task=task: self._onStatus(task, caller, event))
+      slicer.cli.run(RadiomicsCLI, cliNode, parameters, wait_for_completion=False)
+
+  def _runTaskWithWorker(self, task, worker):
+    rois = task['rois']
+    self.logger.info('Sending %s to extraction worker', ', '.join([labelName for labelName, label in rois]))
+
+    startTime = time.perf_counter()
+    job = {
+      'image': self._getVolumeFile(task['imageNode'], task),
+      'mask': self._getVolumeFile(task['labelNode'], task),
+      'labels': [label for labelName, label in rois],
+      'param': self._parameterFile,
+      'paramValidated': True,
+      'progress': self.progressCallback is not None,
+      'chunkMargin': self._getChunkMargin(task['imageNode'], task['labelNode'])
+    }
+    task['timings']['io'] += time.perf_counter() - startTime
+    task['worker'] = worker
+    self._runningTasks.append(task)
+    worker.submit(job, lambda reply, task=task: self._worker_done(task, reply),
+                  lambda progress, task=task: self._reportProgress(task, progress))
+    if self.runSync:
+      # Blocks until the reply is received (or the worker died), _worker_done is called before this returns
+      worker.wait()
+
+  def _onStatus(self, task, caller, event):
     if caller.IsA('vtkMRMLCommandLineModuleNode'):
       status = caller.GetStatusString()
-      if self._cli_running:
-        print('.', end='')
+      if task['running']:
         if not caller.IsBusy():
-          self._cli_running = False
-          self._cli_done(status)
+          task['running'] = False
+          self._cli_done(task)
+          # Start the next extraction (when all extractions are done, this will clean up the CLI)
+          self._startCLI()
+        elif task['outProgress'] is not None:
+          # The CLI node is modified when the CLI reports progress, details are read from the progress file
+          progress = self._readProgressFile(task['outProgress'])
+          if progress is not None:
+            self._reportProgress(task, progress['progress'])
       elif status == 'Running':
         # CLI has started
-        self._cli_running = True
+        task['running'] = True
 
-  def _cli_done(self, status):
-    print("Done")
-    errorText = self.cliNode.GetErrorText()
+  def _cli_done(self, task):
+    cliNode = task['cliNode']
+    self.logger.debug('RadiomicsCLI done for %s', ', '.join([labelName for labelName, label in task['rois']]))
+    status = cliNode.GetStatusString()
+    errorText = cliNode.GetErrorText()
     if errorText != '':
       errorText = str(errorText).replace('RadiomicsCLI standard error:\n\n', '')
       print(errorText)
 
+    results = []
+    labelTimings = None
+    startTime = time.perf_counter()
     if status == 'Completed':  # Completed without errors
-      # Read the results out of the temp table and store them in the output table
-      self._processResults()
+      if task['outJson'] is not None:
+        # Read the results out of the JSON file
+        with open(task['outJson'], 'r') as outFP:
+          results = self._readResults(task, json.load(outFP))
+      else:
+        # Read the results out of the temp table
+        results = self._readCLIOutput(task['cliOutput'], task['rois'])
+      if task['outProgress'] is not None:
+        progress = self._readProgressFile(task['outProgress'])
+        if progress is not None:
+          labelTimings = progress['timings']
+          task['peakMemory'] = progress.get('peakMemory')
+    task['timings']['io'] += time.perf_counter() - startTime
+    for filePath in [task['outJson'], task['outProgress']]:
+      if filePath is not None and os.path.isfile(filePath):
+        os.remove(filePath)
+
+    # Release the CLI node and temporary table so they can be used by the next task
+    if task['observerTag'] is not None:
+      cliNode.RemoveObserver(task['observerTag'])
+      task['observerTag'] = None
+    self._idleSlots.append((cliNode, task['cliOutput']))
+
+    self._onTaskDone(task, results, labelTimings)
+
+  def _worker_done(self, task, reply):
+    task['worker'] = None
+
+    if reply is None:
+      # The worker died, run this task (and all subsequent tasks) using the CLI instead
+      self.logger.warning('Extraction worker stopped unexpectedly, falling back to RadiomicsCLI')
+      self.useWorker = False
+      self._runningTasks.remove(task)
+      self._runTaskWithCLI(task)
+      return
 
-    # Start the next extraction (when all extractions are done, this will clean up the CLI)
-    self._startCLI()
+    results = []
+    if reply['status'] == 'ok':
+      results = self._readResults(task, reply['results'])
+      task['peakMemory'] = reply.get('peakMemory')
+    else:
+      self.logger.error('Feature extraction failed: %s', reply.get('message'))
+
+    self._onTaskDone(task, results, reply.get('timings'))
+
+    if not self.runSync:
+      self._startCLI()
+
+  def _onTaskDone(self, task, results, labelTimings=None):
+    self._runningTasks.remove(task)
+    self._releaseVolumeFiles(task)
+    self._removeTemporaryNodes()
+    self._recordTimings(task, labelTimings)
+    self._recordPeakMemory(task)
+
+    if len(task['roiKeys']) > 0:
+      # Store the new results in the result cache and merge them with the results that were already available
+      for labelName, features in results:
+        if labelName in task['resultKeys']:
+          self.resultCache.put(task['resultKeys'][labelName], features)
+      taskResults = dict(task['cachedResults'])
+      taskResults.update(dict(results))
+      results = [(labelName, taskResults[labelName])
+                 for labelName, label in task['allRois'] if labelName in taskResults]
+      for labelName, features in results:
+        if labelName in task['roiKeys']:
+          self._tableROIKeys[labelName] = task['roiKeys'][labelName]
+
+    # Store the results in the output table, in the order in which the tasks were generated
+    self._pendingResults[task['index']] = results
+    while self._nextResultIndex in self._pendingResults:
+      results = self._pendingResults.pop(self._nextResultIndex)
+      startTime = time.perf_counter()
+      self._processResults(results)
+      ingestionTime = time.perf_counter() - startTime
+      for labelName, features in results:
+        if labelName in self.timings:
+          self.timings[labelName]['ingestion'] += ingestionTime / len(results)
+      self._nextResultIndex += 1
+
+  def _reportProgress(self, task, progress):
+    """
+    Pass the progress of a task to ``progressCallback``.
+
+    :param progress: dict holding the 'label' that is extracted, and the current 'imageType' and 'featureClass' (see
+      ``SlicerRadiomicsCLI.ExtractionMonitor``)
+    """
+    progress = (progress['label'], progress['imageType'], progress['featureClass'])
+    if self.progressCallback is None or progress == task['progress']:
+      return
+    task['progress'] = progress
+    label, imageType, featureClass = progress
+    labels = [label for labelName, label in task['allRois']]
+    if label not in labels:
+      return
+    roiIndex = labels.index(label)
+    self.progressCallback(task['roiOffset'] + roiIndex + 1, self._roiCount, task['allRois'][roiIndex][0], imageType,
+                          featureClass)
+
+  @staticmethod
+  def _readProgressFile(progressFilePath):
+    if not os.path.isfile(progressFilePath):
+      return None
+    try:
+      with open(progressFilePath, 'r') as progressFP:
+        return json.load(progressFP)
+    except (IOError, ValueError):
+      return None  # Being replaced by the CLI
+
+  def _recordTimings(self, task, labelTimings=None):
+    """
+    Store the time spent on each ROI extracted by ``task`` in ``timings``. The time spent on the task as a whole is
+    divided evenly over its ROIs.
+
+    :param labelTimings: List of [label, {stage: seconds}] pairs recorded by the CLI or worker (None if not available)
+    """
+    if len(task['rois']) == 0:
+      return
+    labelTimings = dict([(label, stageTimings) for label, stageTimings in (labelTimings or [])])
+    for labelName, label in task['rois']:
+      roiTimings = OrderedDict([(stage, 0.) for stage in self.timingStages])
+      for stage, seconds in task['timings'].items():
+        roiTimings[stage] += seconds / len(task['rois'])
+      for stage, seconds in labelTimings.get(label, {}).items():
+        if stage in roiTimings:
+          roiTimings[stage] += seconds
+      self.timings[labelName] = roiTimings
+
+  def _recordPeakMemory(self, task):
+    """
+    Store the peak memory of the process that extracted ``task`` in ``peakMemory`` and ``taskPeakMemory``, and use it
+    for the estimated memory of the next tasks (see ``memoryBudget``).
+    """
+    for labelName, label in task['rois']:
+      self.peakMemory[labelName] = task['peakMemory']
+    if len(task['rois']) > 0:
+      self.taskPeakMemory.append((task['startTime'], time.perf_counter(), task['peakMemory']))
+    if task['peakMemory'] is not None:
+      self._measuredMemory = max(self._measuredMemory or 0, task['peakMemory'])
+
+  def getTimingTable(self, tableNode=None):
+    """
+    Store ``timings`` in a table with one row per ROI and one column per stage (see ``timingStages``) and the total, in
+    seconds. If ``tableNode`` is None, a new table node is created.
+
+    :returns: The table node holding the timings
+    """
+    if tableNode is None:
+      tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode', 'Radiomics timing')
+
+    tableWasModified = tableNode.StartModify()
+    tableNode.RemoveAllColumns()
+
+    col = vtk.vtkStringArray()
+    col.SetName('ROI')
+    for labelName in self.timings:
+      col.InsertNextValue(labelName)
+    tableNode.AddColumn(col)
+
+    values = numpy.array([list(roiTimings.values()) for roiTimings in self.timings.values()],
+                         dtype='float64').reshape(-1, len(self.timingStages))
+    for columnName, columnValues in zip(list(self.timingStages.values()) + ['Total'],
+                                        list(values.T) + [values.sum(axis=1)]):
+      col = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(columnValues), deep=True, array_type=vtk.VTK_DOUBLE)
+      col.SetName(columnName)
+      tableNode.AddColumn(col)
+
+    tableNode.Modified()
+    tableNode.EndModify(tableWasModified)
+    return tableNode
+
+  def _getVolumeFile(self, volumeNode, task):
+    """
+    Get the path to a file containing the voxel data of ``volumeNode``, for use by ``task``. The file is written once
+    and reused as long as the voxel data and geometry of the node are not modified. The voxel data is written
+    uncompressed as it is stored in memory, with a small MetaImage header holding the geometry (see
+    ``_writeRawVolume``).
+
+    The file is removed when the node is removed from the scene (or modified, in which case a new file is written) and
+    when Slicer exits, but not while it is used by a running task of any logic instance (see ``_releaseVolumeFiles``).
+    """
+    stamp = self._getVolumeStamp(volumeNode)
+
+    cached = SlicerRadiomicsLogic._volumeFiles.get(volumeNode.GetID())
+    if cached is not None and (cached[0] != stamp or not os.path.isfile(cached[1])):
+      self._removeVolumeFile(volumeNode.GetID())
+      cached = None
+
+    if cached is not None:
+      volumePath = cached[1]
+    else:
+      volumeDir = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomics')
+      if not os.path.isdir(volumeDir):
+        os.makedirs(volumeDir)
+      # Named by the complete stamp, so a file still used by a task is never overwritten (e.g. when only the geometry
+      # of the node changed)
+      geometryHash = hashlib.sha1(repr(stamp[1]).encode('utf-8')).hexdigest()[:12]
+      volumePath = os.path.join(volumeDir, '%s_%d_%s.mhd' % (volumeNode.GetID(), stamp[0], geometryHash))
+
+      self.logger.debug('Writing %s to %s', volumeNode.GetName(), volumePath)
+      self._writeRawVolume(volumeNode, volumePath)
+      SlicerRadiomicsLogic._volumeFiles[volumeNode.GetID()] = (stamp, volumePath)
+      self._observeScene()
+
+    if volumePath not in task['volumeFiles']:
+      task['volumeFiles'].append(volumePath)
+      SlicerRadiomicsLogic._volumeFileUsers[volumePath] = SlicerRadiomicsLogic._volumeFileUsers.get(volumePath, 0) + 1
+    return volumePath
+
+  @staticmethod
+  def _releaseVolumeFiles(task):
+    """
+    Release the volume files used by ``task``. Files that are no longer used by any task and no longer hold the
+    current voxel data of a node in the scene are removed.
+    """
+    for volumePath in task['volumeFiles']:
+      users = SlicerRadiomicsLogic._volumeFileUsers.pop(volumePath, 1) - 1
+      if users > 0:
+        SlicerRadiomicsLogic._volumeFileUsers[volumePath] = users
+      else:
+        SlicerRadiomicsLogic._deleteUnusedVolumeFile(volumePath)
+    task['volumeFiles'] = []
+
+  # Element types of MetaImage files for each numpy data type
+  _metaImageTypes = {
+    'int8': 'MET_CHAR',
+    'uint8': 'MET_UCHAR',
+    'int16': 'MET_SHORT',
+    'uint16': 'MET_USHORT',
+    'int32': 'MET_INT',
+    'uint32': 'MET_UINT',
+    'int64': 'MET_LONG_LONG',
+    'uint64': 'MET_ULONG_LONG',
+    'float32': 'MET_FLOAT',
+    'float64': 'MET_DOUBLE'
+  }
+
+  @staticmethod
+  def _writeRawVolume(volumeNode, headerPath):
+    """
+    Write the voxel data of ``volumeNode`` to a raw file (next to ``headerPath``, with extension '.raw') straight from
+    the memory of the node, without converting it to a SimpleITK image or encoding it first. The geometry is written
+    to a MetaImage header at ``headerPath``, converted from RAS (Slicer) to LPS (ITK) coordinates, so the volume can be
+    read by SimpleITK (and any other ITK based reader) in a single read.
+    """
+    array = slicer.util.arrayFromVolume(volumeNode)
+    dataPath = os.path.splitext(headerPath)[0] + '.raw'
+
+    origin = volumeNode.GetOrigin()
+    directions = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASDirectionMatrix(directions)
+
+    header = [
+      ('ObjectType', 'Image'),
+      ('NDims', 3),
+      ('BinaryData', 'True'),
+      ('BinaryDataByteOrderMSB', str(array.dtype.byteorder == '>' or
+                                     (array.dtype.byteorder == '=' and sys.byteorder == 'big'))),
+      ('CompressedData', 'False'),
+      # Column-major, i.e. the direction of each axis (column of the direction matrix) in turn
+      ('TransformMatrix', ' '.join([repr(directions.GetElement(row, column) * (-1 if row < 2 else 1))
+                                    for column in range(3) for row in range(3)])),
+      ('Offset', ' '.join([repr(v) for v in (-origin[0], -origin[1], origin[2])])),
+      ('ElementSpacing', ' '.join([repr(v) for v in volumeNode.GetSpacing()])),
+      ('DimSize', ' '.join([str(v) for v in reversed(array.shape[:3])]))
+    ]
+    if array.ndim > 3:
+      header.append(('ElementNumberOfChannels', array.shape[3]))
+    header += [
+      ('ElementType', SlicerRadiomicsLogic._metaImageTypes[array.dtype.name]),
+      ('ElementDataFile', os.path.basename(dataPath))
+    ]
+
+    numpy.ascontiguousarray(array).tofile(dataPath)
+    with open(headerPath, 'w') as headerFP:
+      for key, value in header:
+        headerFP.write('%s = %s\n' % (key, value))
+
+  @staticmethod
+  def _removeVolumeFile(nodeID):
+    """
+    Forget the volume file of node ``nodeID``. The file is removed once it is no longer used by a running task.
+    """
+    cached = SlicerRadiomicsLogic._volumeFiles.pop(nodeID, None)
+    if cached is not None:
+      SlicerRadiomicsLogic._deleteUnusedVolumeFile(cached[1])
+
+  @staticmethod
+  def _deleteUnusedVolumeFile(volumePath):
+    if SlicerRadiomicsLogic._volumeFileUsers.get(volumePath, 0) > 0:
+      return
+    if volumePath in [cachedPath for stamp, cachedPath in SlicerRadiomicsLogic._volumeFiles.values()]:
+      # Still holds the current voxel data of its node, kept for the next extraction
+      return
+    for filePath in [volumePath, os.path.splitext(volumePath)[0] + '.raw']:
+      if os.path.isfile(filePath):
+        os.remove(filePath)
+
+  @staticmethod
+  def _removeAllVolumeFiles():
+    """
+    Remove all volume files, regardless of whether they are in use (called when Slicer exits).
+    """
+    volumePaths = set([cachedPath for stamp, cachedPath in SlicerRadiomicsLogic._volumeFiles.values()])
+    volumePaths.update(SlicerRadiomicsLogic._volumeFileUsers.keys())
+    SlicerRadiomicsLogic._volumeFiles = {}
+    SlicerRadiomicsLogic._volumeFileUsers = {}
+    for volumePath in volumePaths:
+      SlicerRadiomicsLogic._deleteUnusedVolumeFile(volumePath)
 
   def _onFinished(self):
     self.logger.info('Cleaning up...')
 
-    # Remove the observer if set
-    if self._onStatusObserverTag is not None:
-      slicer.mrmlScene.RemoveObserver(self._onStatusObserverTag)
-      self._onStatusObserverTag = None
+    if self._stepTimer is not None:
+      self._stepTimer.stop()
 
     # Dispose CLI node
     self.cliNode = None
 
     # Clean up!
 
-    # If a temporary parameter file was used, delete it.
-    if self._delete_parameterFile and os.path.isfile(self._parameterFile):
-      os.remove(self._parameterFile)
-    self._delete_parameterFile = False
+    for sink in self.outputSinks:
+      sink.close()
+
+    # Record which ROI produced each column, so a next extraction to the same table can reuse these results
+    if self.outTable is not None:
+      self.outTable.SetAttribute('SlicerRadiomics.ROIKeys', json.dumps(self._tableROIKeys))
+      if self._extractor is not None:
+        self.outTable.SetAttribute('SlicerRadiomics.ParameterHash', self._getParameterHash())
+      # Image from which the features in each column were extracted
+      self.outTable.SetAttribute('SlicerRadiomics.Images', json.dumps(
+        dict([(labelName, roiImage[0]) for labelName, roiImage in self._roiImages.items()])))
+    self._previousResults = {}
+    self._tableROIKeys = OrderedDict()
 
     self._imageNode = None
     self._parameterFile = None
     self._labelGenerators = None
+    self._preparationSteps = None
     self.outTable = None
     self._featureNames = {}
-
-    # Remove the temporary table
-    slicer.mrmlScene.RemoveNode(self._cli_output)
-    self._cli_output = None
-
-    self._labelName = None
+    self.metadataTable = None
+    self._categories = None
+    self._metadataFeatureNames = {}
+
+    # Remove the temporary tables and labelmaps
+    for cliNode, cliOutput in self._idleSlots:
+      slicer.mrmlScene.RemoveNode(cliOutput)
+    self._idleSlots = []
+    self._removeTemporaryNodes(removeAll=True)
+
+    self._taskCount = 0
+    self._roiOffset = 0
+    self._extractor = None
+    self._parameterHash = None
+    self._resampling = None
+    self._resampledImageNodes = {}
+    self._resampledLabelNodes = {}
+    self._roiImages = {}
+    self._pendingResults = {}
+    self._nextResultIndex = 0
+
+    if len(self.timings) > 0:
+      self.logger.info('Time spent per stage: %s', ', '.join(
+        ['%s %.2f s' % (stageName, sum([roiTimings[stage] for roiTimings in self.timings.values()]))
+         for stage, stageName in self.timingStages.items()]))
+    if self._measuredMemory is not None:
+      self.logger.info('Peak memory of the extraction processes: %.0f MB', self._measuredMemory / 1024. / 1024)
+    self._memoryEstimate = None
+    self._measuredMemory = None
 
     self.logger.debug('Cleanup finished')
     # Signal the widget you're done
@@ -659,40 +2287,157 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
   # Output table functions: initializing the output table and filling it with processed results
   def _initOutputTable(self):
     if not self.outTable:
-      self.logger.warning('Output table not set!')
+      if len(self.outputSinks) == 0:
+        self.logger.warning('Output table not set!')
       return
 
     tableWasModified = self.outTable.StartModify()
     self.outTable.RemoveAllColumns()
+    self.outTable.RemoveAttribute('SlicerRadiomics.ROIKeys')
+    self.outTable.RemoveAttribute('SlicerRadiomics.Images')
+    self.outTable.RemoveAttribute('SlicerRadiomics.ParameterHash')
+    self.outTable.RemoveAttribute('SlicerRadiomics.Categories')
 
     self.logger.info('Initializing output table')
 
     # Define table columns
     for k in ['Image type', 'Feature Class', 'Feature Name']:
-      col = self.outTable.AddColumn()
-      col.SetName(k)
+      if self.typedOutput:
+        col = vtk.vtkIntArray()
+        col.SetName(k)
+        self.outTable.AddColumn(col)
+      else:
+        col = self.outTable.AddColumn()
+        col.SetName(k)
+
+    if self.typedOutput:
+      self._categories = [OrderedDict(), OrderedDict(), OrderedDict()]
+      self._initMetadataTable()
+    else:
+      self.outTable.RemoveNodeReferenceIDs('SlicerRadiomics.Metadata')
 
     self.outTable.Modified()
     self.outTable.EndModify(tableWasModified)
 
-  def _processResults(self):
+  def _initMetadataTable(self):
+    """
+    Get (or create) the table holding the diagnostics of a typed output table and reset it.
+    """
+    if self.metadataTable is None:
+      self.metadataTable = self.outTable.GetNodeReference('SlicerRadiomics.Metadata')
+    if self.metadataTable is None:
+      self.metadataTable = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode',
+                                                              self.outTable.GetName() + ' diagnostics')
+    self.outTable.SetNodeReferenceID('SlicerRadiomics.Metadata', self.metadataTable.GetID())
+
+    tableWasModified = self.metadataTable.StartModify()
+    self.metadataTable.RemoveAllColumns()
+    for k in ['Image type', 'Feature Class', 'Feature Name']:
+      col = self.metadataTable.AddColumn()
+      col.SetName(k)
+    self.metadataTable.Modified()
+    self.metadataTable.EndModify(tableWasModified)
+
+  def _readResults(self, task, serializedResults):
+    """
+    Read the results returned by the CLI (JSON output) or the extraction worker.
+
+    :param serializedResults: List of [label, features] pairs, where features is a list of [featureKey, featureValue]
+      pairs (None if the extraction failed)
+    :returns: List of (labelName, features) tuples
+    """
+    roiNames = dict([(label, labelName) for labelName, label in task['rois']])
+    results = []
+    for label, features in serializedResults:
+      if features is None:
+        self.logger.warning('No results found for %s', roiNames[label])
+        continue
+      results.append((roiNames[label], features))
+    return results
+
+  def _readCLIOutput(self, cliOutput, rois):
+    """
+    Read the results of a CLI run out of the temporary table.
+
+    :returns: List of (labelName, features) tuples, where features is a list of (featureKey, featureValue) tuples
+    """
+    columnNames = [cliOutput.GetColumnName(columnIndex) for columnIndex in range(cliOutput.GetNumberOfColumns())]
+
+    results = []
+    if len(columnNames) > 0 and columnNames[0] == 'Feature':
+      # Batch mode: one row per feature, one column per ROI (named by label value)
+      featureKeys = [cliOutput.GetCellText(rowIndex, 0) for rowIndex in range(cliOutput.GetNumberOfRows())]
+      for labelName, label in rois:
+        if str(label) not in columnNames:
+          self.logger.warning('No results found for %s', labelName)
+          continue
+        columnIndex = columnNames.index(str(label))
+        results.append((labelName, [(featureKey, cliOutput.GetCellText(rowIndex, columnIndex))
+                                    for rowIndex, featureKey in enumerate(featureKeys)]))
+    else:
+      # Single ROI mode: one column per feature, values stored in the first row
+      labelName = rois[0][0]
+      results.append((labelName, [(featureKey, cliOutput.GetCellText(0, columnIndex))
+                                  for columnIndex, featureKey in enumerate(columnNames)]))
+    return results
+
+  def _processResults(self, results):
+    """
+    Store the results in the output table, adding one column per ROI. The rows of new features are added for all
+    results at once, after which each column is filled in a single pass and added to the table.
+
+    :param results: List of (labelName, features) tuples as returned by ``_readCLIOutput``
+    """
     self.logger.debug('Processing results...')
+    if len(self.outputSinks) > 0:
+      records = SlicerRadiomicsResultSink.getRecords(results, self._roiImages)
+      for sink in self.outputSinks:
+        sink.writeRecords(records)
+
     if not self.outTable:
-      self.logger.warning('Output table not set!')
-      return
-    if not self._cli_output:
-      self.logger.warning('CLI output table not set!')
+      if len(self.outputSinks) == 0:
+        self.logger.warning('Output table not set!')
       return
 
-    tableWasModified = self.outTable.StartModify()
-    self.logger.debug('adding column')
-    col = self.outTable.AddColumn()
-    col.SetName(self._labelName)
+    if self.summaryFeatures is not None:
+      summaryFeatures = set(self.summaryFeatures)
+      results = [(labelName, [feature for feature in features if feature[0] in summaryFeatures])
+                 for labelName, features in results]
+
+    if self.typedOutput:
+      # Diagnostics are stored in the metadata table
+      self._addResults(self.metadataTable, self._metadataFeatureNames,
+                       [(labelName, [feature for feature in features if feature[0].startswith('diagnostics_')])
+                        for labelName, features in results])
+      results = [(labelName, [feature for feature in features if not feature[0].startswith('diagnostics_')])
+                 for labelName, features in results]
+    self._addResults(self.outTable, self._featureNames, results, self._categories)
+
+  def _addResults(self, tableNode, featureNames, results, categories=None):
+    """
+    Add a column for each ROI in ``results`` to ``tableNode``. ``featureNames`` maps the feature keys to the rows of
+    the table. If ``categories`` is specified, the table is in typed layout (see ``typedOutput``).
+    """
+    tableWasModified = tableNode.StartModify()
 
-    for columnIndex in range(self._cli_output.GetNumberOfColumns()):
-      featureKey = self._cli_output.GetColumnName(columnIndex)
-      featureValue = self._cli_output.GetCellText(0, columnIndex)
+    self._addFeatureRows(tableNode, featureNames,
+                         [featureKey for labelName, features in results for featureKey, featureValue in features],
+                         categories)
+    for labelName, features in results:
+      self._addResultColumn(tableNode, featureNames, labelName, features, categories is not None)
 
+    tableNode.Modified()
+    tableNode.EndModify(tableWasModified)
+
+  def _addFeatureRows(self, tableNode, featureNames, featureKeys, categories=None):
+    """
+    Add a row to the table for each feature in ``featureKeys`` that is not yet in the table. If ``categories`` is
+    specified, the key columns are dictionary-encoded.
+    """
+    newFeatureKeys = OrderedDict()
+    for featureKey in featureKeys:
+      if featureKey in featureNames or featureKey in newFeatureKeys:
+        continue
       key_parts = featureKey.split('_', 3)
       if len(key_parts) < 3:
         # We expect keys Image and Mask to be in there, and are skipped
@@ -700,21 +2445,69 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
         if featureKey != 'Image' and featureKey != 'Mask':
           self.logger.warning('Skipping key %s', featureKey)
         continue
+      newFeatureKeys[featureKey] = key_parts[:3]
 
-      if featureKey not in self._featureNames:
-        self.logger.debug('Adding featurekey %s', featureKey)
-        rowIndex = self.outTable.AddEmptyRow()
-        self.outTable.SetCellText(rowIndex, 0, key_parts[0])
-        self.outTable.SetCellText(rowIndex, 1, key_parts[1])
-        self.outTable.SetCellText(rowIndex, 2, key_parts[2])
-        self._featureNames[featureKey] = rowIndex
+    if len(newFeatureKeys) == 0:
+      return
 
-      self.logger.debug('Setting column value to %s (key %s) at row %i',
-                        featureValue, featureKey, self._featureNames[featureKey])
-      col.SetValue(self._featureNames[featureKey], featureValue)
+    self.logger.debug('Adding %d feature rows', len(newFeatureKeys))
+    table = tableNode.GetTable()
+    firstRowIndex = table.GetNumberOfRows()
+    table.SetNumberOfRows(firstRowIndex + len(newFeatureKeys))
+    for columnIndex in range(3, table.GetNumberOfColumns()):
+      column = table.GetColumn(columnIndex)
+      if isinstance(column, vtk.vtkDataArray):
+        # New values of numeric columns are not initialized, mark them as missing
+        numpy_support.vtk_to_numpy(column)[firstRowIndex:] = numpy.nan
+
+    keyColumns = [table.GetColumn(columnIndex) for columnIndex in range(3)]
+    for rowIndex, (featureKey, key_parts) in enumerate(newFeatureKeys.items(), start=firstRowIndex):
+      for columnIndex, keyPart in enumerate(key_parts):
+        if categories is not None:
+          keyPart = categories[columnIndex].setdefault(keyPart, len(categories[columnIndex]))
+        keyColumns[columnIndex].SetValue(rowIndex, keyPart)
+      featureNames[featureKey] = rowIndex
+
+    if categories is not None:
+      tableNode.SetAttribute('SlicerRadiomics.Categories', json.dumps(
+        dict([(keyColumns[columnIndex].GetName(), list(categories[columnIndex].keys())) for columnIndex in range(3)])))
+
+  def _addResultColumn(self, tableNode, featureNames, labelName, features, typed=False):
+    """
+    Add a column containing the results of one ROI to the table. The rows of the features must have been added (see
+    ``_addFeatureRows``).
 
-    self.outTable.Modified()
-    self.outTable.EndModify(tableWasModified)
+    :param labelName: Name of the ROI, used as column name
+    :param features: List of (featureKey, featureValue) tuples
+    :param typed: If true, a numeric column is added (non-numeric values are stored as NaN), otherwise a text column
+    """
+    if typed:
+      values = numpy.full(tableNode.GetNumberOfRows(), numpy.nan)
+      for featureKey, featureValue in features:
+        rowIndex = featureNames.get(featureKey)
+        if rowIndex is not None:
+          try:
+            values[rowIndex] = float(featureValue)
+          except (TypeError, ValueError):
+            self.logger.warning('Non-numeric value for %s of %s', featureKey, labelName)
+      col = numpy_support.numpy_to_vtk(values, deep=True, array_type=vtk.VTK_DOUBLE)
+      col.SetName(labelName)
+      tableNode.AddColumn(col)
+      return
+
+    values = [''] * tableNode.GetNumberOfRows()
+    for featureKey, featureValue in features:
+      rowIndex = featureNames.get(featureKey)
+      if rowIndex is not None:
+        values[rowIndex] = str(featureValue)
+
+    # Fill the column before adding it to the table, so the table is not updated for every value
+    col = vtk.vtkStringArray()
+    col.SetName(labelName)
+    col.SetNumberOfValues(len(values))
+    for rowIndex, value in enumerate(values):
+      col.SetValue(rowIndex, value)
+    tableNode.AddColumn(col)
 
   # Interaction functions
   def showTable(self, table):
@@ -743,13 +2536,156 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
       return False
     return True
 
+  def extractInProcess(self, imageNode, maskNode, params=None, callback=None, progressCallback=None):
+    """
+    Extract features within the Slicer process, without starting a CLI or writing the volumes to disk. The voxel data
+    of the nodes is copied into SimpleITK images in memory (see ``_getSitkImage``) and passed to PyRadiomics.
+
+    If ``callback`` is specified (and ``runSync`` is False), the extraction runs on a separate thread and this function
+    returns immediately. The voxel data is copied before the extraction thread starts, so the nodes may be modified
+    while it runs.
+
+    :param imageNode: Slicer Volume node representing the image from which features should be extracted
+    :param maskNode: Slicer Labelmap node or segmentation node containing the ROIs
+    :param params: String file path pointing to a parameter file, or a dictionary with the same structure (i.e.
+      containing 'setting', 'featureClass' and/or 'imageType'). If None, the PyRadiomics defaults are used.
+    :param callback: Function which is invoked with the results when the extraction is done
+    :param progressCallback: Function which is invoked with (number of ROIs done, total number of ROIs, ROI name) each
+      time the extraction of a ROI is done
+    :returns: OrderedDict mapping each ROI name to an OrderedDict of the calculated features (numeric values as python
+      floats, diagnostics as strings). None if the extraction runs on a separate thread.
+    """
+    import threading
+    from radiomics import featureextractor
+
+    if self.cliNode is not None or len(self._runningTasks) > 0 or self._inProcessTimer is not None:
+      self.logger.warning('Already running an extraction!')
+      return None
+
+    if params:
+      extractor = featureextractor.RadiomicsFeatureExtractor(params)
+    else:
+      extractor = featureextractor.RadiomicsFeatureExtractor()
+    extractor.settings['correctMask'] = True
+
+    labelGenerators = self._getLabelGenerator(maskNode, imageNode)
+    if labelGenerators is None:
+      return None
+
+    # Prepare all ROIs in the main thread, as MRML nodes must not be accessed from the extraction thread
+    image = self._getSitkImage(imageNode)
+    rois = []
+    masks = {}
+    for labelNode, labelImageNode, labelRois in labelGenerators:
+      if labelNode.GetID() not in masks:  # Multiple items can share a labelmap (e.g. a segmentation layer)
+        masks[labelNode.GetID()] = self._getSitkImage(labelNode)
+      mask = masks[labelNode.GetID()]
+      rois.extend([(labelName, label, mask) for labelName, label in labelRois])
+
+    results = OrderedDict()
+    state = {'done': 0, 'reported': 0, 'roiName': None, 'finished': False, 'cancelled': False}
+    self._inProcessState = state
+
+    def extract():
+      for labelName, label, mask in rois:
+        if state['cancelled']:
+          break
+        try:
+          featureVector = extractor.execute(image, mask, label=label)
+          results[labelName] = OrderedDict([(featureName, self._toPythonValue(featureValue))
+                                            for featureName, featureValue in featureVector.items()])
+        except Exception:
+          self.logger.error('Feature extraction failed for %s', labelName, exc_info=True)
+        state['roiName'] = labelName
+        state['done'] += 1
+      state['finished'] = True
+
+    def reportProgress():
+      if progressCallback is not None and state['reported'] != state['done']:
+        state['reported'] = state['done']
+        progressCallback(state['done'], len(rois), state['roiName'])
+
+    def finish():
+      self._inProcessTimer = None
+      self._inProcessState = None
+      self._removeTemporaryNodes(removeAll=True)
+      if callback is not None:
+        callback(results)
+
+    if self.runSync or callback is None:
+      extract()
+      reportProgress()
+      finish()
+      return results
+
+    extractionThread = threading.Thread(target=extract)
+
+    def poll():
+      reportProgress()
+      if state['finished']:
+        timer.stop()
+        extractionThread.join()
+        finish()
+
+    # Progress is reported on the main thread by polling the state of the extraction thread
+    timer = qt.QTimer()
+    timer.setInterval(100)
+    timer.connect('timeout()', poll)
+    self._inProcessTimer = timer  # Keep a reference to the timer until the extraction is done
+    extractionThread.start()
+    timer.start()
+    return None
+
+  def _getSitkImage(self, volumeNode):
+    """
+    Get a SimpleITK image holding a copy of the voxel data in ``volumeNode``. The SimpleITK Python API cannot wrap an
+    external buffer, so the array is copied once, but nothing is written to disk. Geometry is converted from RAS
+    (Slicer) to LPS (ITK) coordinates.
+    """
+    image = sitk.GetImageFromArray(slicer.util.arrayFromVolume(volumeNode))
+
+    origin = volumeNode.GetOrigin()
+    directions = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASDirectionMatrix(directions)
+
+    image.SetSpacing(volumeNode.GetSpacing())
+    image.SetOrigin((-origin[0], -origin[1], origin[2]))
+    image.SetDirection([directions.GetElement(row, column) * (-1 if row < 2 else 1)
+                        for row in range(3) for column in range(3)])
+    return image
+
+  @staticmethod
+  def _toPythonValue(value):
+    """
+    Convert a value returned by PyRadiomics to a python type. Numeric scalars are returned as python floats, all other
+    values (i.e. diagnostics) are returned as strings.
+    """
+    if isinstance(value, (numpy.ndarray, numpy.generic)) and numpy.size(value) == 1 and \
+       numpy.issubdtype(numpy.asarray(value).dtype, numpy.number):
+      return float(numpy.asarray(value))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+      return float(value)
+    return str(value)
+
+  def runBatch(self, manifestPath, outputPath, parameterFilePath=None, maxWorkers=1):
+    """
+    Extract features for all cases in a CSV manifest, without loading them into the scene. This function blocks until
+    all cases are processed, see ``SlicerRadiomicsBatchRunner.run`` for the format of the manifest and the output.
+
+    :returns: Tuple of the number of cases extracted and the number of failed cases
+    """
+    runner = SlicerRadiomicsBatchRunner(self.useWorker)
+    return runner.run(manifestPath, outputPath, parameterFilePath, maxWorkers)
+
   def runCLI(self, imageNode, maskNode, tableNode, featureClasses, settings, enabledImageTypes, callback=None):
     """
     Run the actual algorithm
+
+    :returns: True if the extraction was started, False otherwise (see ``runCLIWithParameterFile``)
     """
     if self.cliNode is not None:
       self.logger.warning('Already running an extraction!')
-      return
+      return False
 
     self.logger.info('Generating customization file')
     json_configuration = {
@@ -758,53 +2694,143 @@ class SlicerRadiomicsLogic(ScriptedLoadableModuleLogic):
       'imageType': enabledImageTypes
     }
 
-    tempDir = slicer.app.temporaryPath
-    parameterFile = os.path.join(tempDir, 'RadiomicsLogicParams.json')
-    self._delete_parameterFile = True  # Delete this file once we're done
-
-    with open(parameterFile, mode='w') as parameterFileFP:
-      json.dump(json_configuration, parameterFileFP)
-
-    self.runCLIWithParameterFile(imageNode, maskNode, tableNode, parameterFile, callback)
+    parameterFile = self._writeParameterFile(json_configuration)
+    return self.runCLIWithParameterFile(imageNode, maskNode, tableNode, parameterFile, callback)
 
   def runCLIWithParameterFile(self, imageNode, maskNode, tableNode, parameterFilePath, callback=None):
     """
     Run the actual algorithm using the provided customization file and provided image and region of interest(s) (ROIs)
 
-    :param imageNode: Slicer Volume node representing the image from which features should be extracted
+    :param imageNode: Slicer Volume node representing the image from which features should be extracted, or a list of
+    volume nodes to extract features from all of them using the same ROIs. The ROIs are only generated once (a
+    segmentation is exported in the geometry of the first image) and the output table holds one column per image and
+    ROI, named by image name and ROI name.
     :param maskNode: Slicer Labelmap node containing the ROIs as integer encoded volume (voxel value indicates ROI id)
     or a segmentation node containing the segments of the ROIs (will be converted to binary label maps)
-    :param tableNode: Slicer Table node which will hold the calculated results
-    :param parameterFilePath: String file path pointing to the parameter file used to customize the extraction
+    :param tableNode: Slicer Table node which will hold the calculated results (optional if ``outputSinks`` are set)
+    :param parameterFilePath: String file path pointing to the parameter file used to customize the extraction. It is
+    validated once and the validated customization (completed with the defaults) is used for all ROIs.
     :param callback: Function which is invoked when the CLI is done (can be used to unlock the GUI)
+    :returns: True if the extraction was started (when running synchronously, it is done as well), False if it was
+      not started (e.g. invalid parameter file or mask). In that case, ``callback`` is not invoked.
     """
-    if self.cliNode is not None:
+    if self._isRunning():
       self.logger.warning('Already running an extraction!')
-      return
+      return False
 
     self.logger.info('Feature extraction started')
 
-    self._parameterFile = parameterFilePath
+    imageNodes = list(imageNode) if isinstance(imageNode, (list, tuple)) else [imageNode]
+    if len(imageNodes) == 0:
+      self.logger.error('No image specified')
+      return False
 
-    self._labelGenerators = []
-    if maskNode.IsA('vtkMRMLVolumeNode'):
-      self._labelGenerators = chain(self._labelGenerators, self._getLabelGeneratorFromLabelMap(maskNode, imageNode))
-    elif maskNode.IsA('vtkMRMLSegmentationNode'):
-      self._labelGenerators = chain(self._labelGenerators,
-                                    self._getLabelGeneratorFromSegmentationNode(maskNode, imageNode))
-    else:
-      self.logger.error('Invalid maskNode')
-      return
+    # Validate the customization up front, the CLI runs and extraction workers use the validated customization
+    self._parameterFile = parameterFilePath
+    self._extractor = None
+    self._parameterHash = None
+    try:
+      self._parameterFile = self._writeParameterFile(self._getCanonicalParameters())
+    except Exception:
+      self.logger.error('Invalid parameter file %s', parameterFilePath, exc_info=True)
+      self._parameterFile = None
+      self._extractor = None
+      return False
 
-    self._cli_output = slicer.vtkMRMLTableNode()
-    slicer.mrmlScene.AddNode(self._cli_output)
+    labelGenerators = self._getLabelGenerator(maskNode, imageNodes[0])
+    if labelGenerators is None:
+      return False
+    self._labelGenerators = self._getImageLabelGenerator(labelGenerators, imageNodes)
+    self.timings = OrderedDict()
+    self.peakMemory = OrderedDict()
+    self.taskPeakMemory = []
 
     self.outTable = tableNode
+    if self.incremental and tableNode is not None:
+      self._previousResults = self._getPreviousResults(tableNode)
     self._initOutputTable()
 
+    for sink in self.outputSinks:
+      sink.open()
+
     self.callback = callback
 
-    self._startCLI(firstRun=True)
+    # When running asynchronously, the preparation steps are done from the event loop as well (see _startCLI)
+    self._preparationSteps = self._getPreparationSteps(imageNodes, maskNode)
+    if self.runSync:
+      for progress in self._preparationSteps:
+        if self.preparationCallback is not None:
+          self.preparationCallback(progress)
+      self._preparationSteps = None
+
+    self._startCLI()
+    return True
+
+  def submit(self, imageNode, maskNode, tableNode, parameterFilePath, priority=0, callback=None, outputSinks=None):
+    """
+    Queue an extraction (see ``runCLIWithParameterFile`` for the parameters). Queued jobs are run one after another,
+    each by its own logic instance (so jobs do not share state) configured with the settings of this logic (see
+    ``_jobSettings``). Jobs with a higher ``priority`` run first, jobs with equal priority in order of submission. The
+    next job is started as soon as the previous one is done.
+
+    :param callback: Function which is invoked with the job when it is done, cancelled or failed to start
+    :param outputSinks: Output sinks of this job (see ``outputSinks``)
+    :returns: SlicerRadiomicsJob, which can be used to wait for or cancel the job
+    """
+    job = SlicerRadiomicsJob(self, imageNode, maskNode, tableNode, parameterFilePath, priority, callback, outputSinks)
+    self._jobCount += 1
+    heapq.heappush(self._jobQueue, (-priority, self._jobCount, job))
+    self._startNextJob()
+    return job
+
+  def _startNextJob(self):
+    if self._startingJobs:
+      # Called from the callback of a job that finished while it was being started (e.g. when running synchronously),
+      # the next job is started by the loop below
+      return
+    self._startingJobs = True
+    try:
+      while self._runningJob is None and len(self._jobQueue) > 0:
+        job = heapq.heappop(self._jobQueue)[2]
+        job.logic = SlicerRadiomicsLogic()
+        for setting in self._jobSettings:
+          setattr(job.logic, setting, getattr(self, setting))
+        job.logic.outputSinks = job.outputSinks
+        job.status = SlicerRadiomicsJob.Running
+        self._runningJob = job
+
+        started = job.logic.runCLIWithParameterFile(job.imageNode, job.maskNode, job.tableNode, job.parameterFilePath,
+                                                    lambda job=job: self._onJobDone(job))
+        if not started:
+          # Extraction not started (e.g. invalid mask), the callback will not be invoked
+          job.status = SlicerRadiomicsJob.Failed
+          self._onJobDone(job)
+    finally:
+      self._startingJobs = False
+
+  def _onJobDone(self, job):
+    if job.status == SlicerRadiomicsJob.Running:
+      job.status = SlicerRadiomicsJob.Done
+    job.timings = job.logic.timings if job.logic is not None else None
+    if job.logic is not None:
+      peakMemory = [roiPeakMemory for roiPeakMemory in job.logic.peakMemory.values() if roiPeakMemory is not None]
+      job.peakMemory = max(peakMemory) if len(peakMemory) > 0 else None
+    job.logic = None
+    if self._runningJob is job:
+      self._runningJob = None
+    if job.callback is not None:
+      job.callback(job)
+    self._startNextJob()
+
+  def _cancelJob(self, job):
+    if job.status == SlicerRadiomicsJob.Queued:
+      self._jobQueue = [entry for entry in self._jobQueue if entry[2] is not job]
+      heapq.heapify(self._jobQueue)
+      job.status = SlicerRadiomicsJob.Cancelled
+      self._onJobDone(job)
+    elif job.status == SlicerRadiomicsJob.Running:
+      job.status = SlicerRadiomicsJob.Cancelled
+      job.logic.cancel()  # Invokes _onJobDone
 
 
 # noinspection PyAttributeOutsideInit
@@ -827,20 +2853,48 @@ class SlicerRadiomicsTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_SlicerRadiomics1()
+    self.setUp()
+    self.test_SlicerRadiomicsBatchMode()
+    self.setUp()
+    self.test_SlicerRadiomicsInProcess()
+    self.setUp()
+    self.test_SlicerRadiomicsLabelIndex()
+    self.setUp()
+    self.test_SlicerRadiomicsCropToROI()
+    self.setUp()
+    self.test_SlicerRadiomicsSegmentLayers()
+    self.setUp()
+    self.test_SlicerRadiomicsResultCache()
+    self.setUp()
+    self.test_SlicerRadiomicsIncremental()
+    self.setUp()
+    self.test_SlicerRadiomicsBatch()
+    self.setUp()
+    self.test_SlicerRadiomicsTypedOutput()
+    self.setUp()
+    self.test_SlicerRadiomicsOutputSinks()
+    self.setUp()
+    self.test_SlicerRadiomicsFilteredImageCache()
+    self.setUp()
+    self.test_SlicerRadiomicsResampleOnce()
+    self.setUp()
+    self.test_SlicerRadiomicsAsync()
+    self.setUp()
+    self.test_SlicerRadiomicsJobQueue()
+    self.setUp()
+    self.test_SlicerRadiomicsVolumeFiles()
+    self.setUp()
+    self.test_SlicerRadiomicsMultiImage()
+    self.setUp()
+    self.test_SlicerRadiomicsChunked()
+    self.setUp()
+    self.test_SlicerRadiomicsParameterHash()
+    self.setUp()
+    self.test_SlicerRadiomicsMemoryBudget()
 
-  def test_SlicerRadiomics1(self):
-    """ Ideally you should have several levels of tests.  At the lowest level
-    tests should exercise the functionality of the logic with different inputs
-    (both valid and invalid).  At higher levels your tests should emulate the
-    way the user would interact with your code and confirm that it still works
-    the way you intended.
-    One of the most important features of the tests is that it should alert other
-    developers when their changes will have an impact on the behavior of your
-    module.  For example, if a developer removes a feature that you depend on,
-    your test should break so they know that the feature is needed.
+  def loadTestData(self):
+    """ Download (if needed) and load the lung1 test data into the scene.
     """
-
-    self.delayDisplay('Starting the test')
     #
     # first, get some data
     # https://github.com/Radiomics/SlicerRadiomics/releases/download/TestData-v1.0.0/lung1_binary.seg.nrrd
@@ -868,6 +2922,21 @@ class SlicerRadiomicsTest(ScriptedLoadableModuleTest):
     self.delayDisplay(
       'Finished with download and loading %d volumes' % (slicer.mrmlScene.GetNumberOfNodesByClass('vtkMRMLVolumeNode')))
 
+  def test_SlicerRadiomics1(self):
+    """ Ideally you should have several levels of tests.  At the lowest level
+    tests should exercise the functionality of the logic with different inputs
+    (both valid and invalid).  At higher levels your tests should emulate the
+    way the user would interact with your code and confirm that it still works
+    the way you intended.
+    One of the most important features of the tests is that it should alert other
+    developers when their changes will have an impact on the behavior of your
+    module.  For example, if a developer removes a feature that you depend on,
+    your test should break so they know that the feature is needed.
+    """
+
+    self.delayDisplay('Starting the test')
+    self.loadTestData()
+
     grayscaleNode = slicer.util.getNode(pattern='lung1_image')
     labelmapNode = slicer.util.getNode(pattern='lung1_label')
     binaryNode = slicer.util.getNode(pattern='lung1_binary')
@@ -906,3 +2975,823 @@ class SlicerRadiomicsTest(ScriptedLoadableModuleTest):
       logic.showTable(tableNode)
 
     self.delayDisplay('Test passed!')
+
+  def loadSyntheticData(self, roiCount=4, size=48):
+    """ Create an image with ``roiCount`` ROIs, stored in a labelmap and in a segmentation (see
+    ``createSyntheticVolumes``), so tests that do not depend on the values of the lung1 data run offline.
+
+    :returns: Tuple of (imageNode, labelNode, segmentationNode)
+    """
+    from SlicerRadiomicsLib import createSyntheticVolumes
+    return createSyntheticVolumes(size, roiCount)
+
+  def runExtraction(self, imageNode, maskNode, featureClasses=('firstorder',), callback=None, settings=None,
+                    imageTypes=None, **logicSettings):
+    """ Extract ``featureClasses`` into a new table, using ``settings`` and ``imageTypes`` (by default, the original
+    image with binWidth 25). Attributes of the logic are set from ``logicSettings``, the extraction runs synchronously
+    unless ``runSync`` is False.
+
+    :returns: Tuple of (logic, tableNode)
+    """
+    logic = SlicerRadiomicsLogic()
+    logic.runSync = True
+    for name, value in logicSettings.items():
+      setattr(logic, name, value)
+    tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode')
+    logic.runCLI(imageNode, maskNode, tableNode, list(featureClasses), settings or {'binWidth': 25},
+                 imageTypes or {'Original': {}}, callback)
+    return logic, tableNode
+
+  def getTableValues(self, tableNode, featureKey):
+    """ Get the values of feature ``featureKey`` (e.g. 'original_firstorder_Mean') in all ROI columns of an output
+    table, as text.
+    """
+    for rowIndex in range(tableNode.GetNumberOfRows()):
+      if '_'.join([tableNode.GetCellText(rowIndex, i) for i in range(3)]) == featureKey:
+        return [tableNode.GetCellText(rowIndex, i) for i in range(3, tableNode.GetNumberOfColumns())]
+    return None
+
+  def waitFor(self, condition, timeout=600):
+    """ Process events until ``condition()`` returns True, or until ``timeout`` seconds have passed.
+    """
+    startTime = time.time()
+    while not condition() and time.time() - startTime < timeout:
+      slicer.app.processEvents()
+      time.sleep(.01)
+
+  def assertTablesEqual(self, table, expectedTable, places=None):
+    """ Check that two output tables hold the same features and values. Diagnostics are skipped, as these contain timing
+    and path information, which differs between runs. If ``places`` is specified, feature values are compared as
+    numbers, rounded to this number of decimal places.
+    """
+    self.assertEqual(table.GetNumberOfColumns(), expectedTable.GetNumberOfColumns())
+    self.assertEqual(table.GetNumberOfRows(), expectedTable.GetNumberOfRows())
+    for columnIndex in range(expectedTable.GetNumberOfColumns()):
+      self.assertEqual(table.GetColumnName(columnIndex), expectedTable.GetColumnName(columnIndex))
+      for rowIndex in range(expectedTable.GetNumberOfRows()):
+        if expectedTable.GetCellText(rowIndex, 0) == 'diagnostics':
+          continue
+        value = table.GetCellText(rowIndex, columnIndex)
+        expectedValue = expectedTable.GetCellText(rowIndex, columnIndex)
+        if places is not None and columnIndex >= 3:
+          self.assertAlmostEqual(float(value), float(expectedValue), places)
+        else:
+          self.assertEqual(value, expectedValue)
+
+  def test_SlicerRadiomicsBatchMode(self):
+    """ Check that extracting all labels of a labelmap in a single CLI run (or by the extraction worker) yields the
+    same results as extracting each label in a separate CLI run, and that progress and timing are reported for each
+    label.
+    """
+    self.delayDisplay('Starting the batch mode test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    tables = []
+    for batchMode, useWorker in [(False, False), (True, False), (True, True)]:
+      progress = []
+      logic, tableNode = self.runExtraction(imageNode, labelNode, ['firstorder', 'glcm'], batchMode=batchMode,
+                                            useWorker=useWorker, progressCallback=lambda *args: progress.append(args))
+      tables.append(tableNode)
+
+      # Progress is reported for each ROI, and the time spent on each ROI is recorded
+      roiCount = len(logic.getLabelIndex(labelNode))
+      self.assertEqual(sorted(set([args[0] for args in progress])), list(range(1, roiCount + 1)))
+      self.assertTrue(all([args[1] == roiCount for args in progress]))
+      self.assertEqual(len(logic.timings), roiCount)
+      timingTable = logic.getTimingTable()
+      self.assertEqual(timingTable.GetNumberOfRows(), roiCount)
+      self.assertEqual(timingTable.GetNumberOfColumns(), len(logic.timingStages) + 2)
+      if batchMode:
+        self.assertTrue(any([args[4] == 'glcm' for args in progress]))
+        self.assertTrue(all([roiTimings['calculation'] > 0 for roiTimings in logic.timings.values()]))
+
+    self.assertTablesEqual(tables[1], tables[0])
+    self.assertTablesEqual(tables[2], tables[0])
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsInProcess(self):
+    """ Check that the in-process extraction yields the same feature values as the CLI, and that the images passed to
+    PyRadiomics are copies of the voxel data with the geometry of the nodes.
+    """
+    self.delayDisplay('Starting the in-process extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    featureClasses = ['firstorder', 'shape']
+    logic, tableNode = self.runExtraction(imageNode, labelNode, featureClasses)
+
+    results = logic.extractInProcess(imageNode, labelNode, {
+      'setting': {'binWidth': 25},
+      'featureClass': {cls: None for cls in featureClasses},
+      'imageType': {'Original': {}}
+    })
+    self.assertEqual(len(results), tableNode.GetNumberOfColumns() - 3)
+
+    for columnIndex in range(3, tableNode.GetNumberOfColumns()):
+      features = results[tableNode.GetColumnName(columnIndex)]
+      for rowIndex in range(tableNode.GetNumberOfRows()):
+        if tableNode.GetCellText(rowIndex, 0) == 'diagnostics':
+          continue
+        featureKey = '_'.join([tableNode.GetCellText(rowIndex, i) for i in range(3)])
+        self.assertIsInstance(features[featureKey], float)
+        self.assertAlmostEqual(features[featureKey], float(tableNode.GetCellText(rowIndex, columnIndex)))
+
+    # The images passed to PyRadiomics hold a copy of the voxel data in LPS geometry, unaffected by later changes
+    array = slicer.util.arrayFromVolume(imageNode)
+    image = logic._getSitkImage(imageNode)
+    expectedArray = array.copy()
+    array[:] = 0
+    slicer.util.arrayFromVolumeModified(imageNode)
+    self.assertTrue(numpy.array_equal(sitk.GetArrayViewFromImage(image), expectedArray))
+    self.assertEqual(image.GetSpacing(), imageNode.GetSpacing())
+    origin = imageNode.GetOrigin()
+    self.assertEqual(image.GetOrigin(), (-origin[0], -origin[1], origin[2]))
+    ijkToRAS = vtk.vtkMatrix4x4()
+    imageNode.GetIJKToRASMatrix(ijkToRAS)
+    ras = ijkToRAS.MultiplyPoint((1, 2, 3, 1))
+    for lps, expected in zip(image.TransformIndexToPhysicalPoint((1, 2, 3)), (-ras[0], -ras[1], ras[2])):
+      self.assertAlmostEqual(lps, expected)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsLabelIndex(self):
+    """ Check that the label index holds the voxel count and bounding box of each label, that it is cached, and that it
+    is computed again once the voxel data of the labelmap is modified.
+    """
+    self.delayDisplay('Starting the label index test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    logic = SlicerRadiomicsLogic()
+    labelIndex = logic.getLabelIndex(labelNode)
+    labelArray = slicer.util.arrayFromVolume(labelNode)
+    labels, counts = numpy.unique(labelArray[labelArray > 0], return_counts=True)
+    self.assertEqual(list(labelIndex.keys()), [int(label) for label in labels])
+    for label, count in zip(labels, counts):
+      self.assertEqual(labelIndex[label]['count'], count)
+      k, j, i = numpy.nonzero(labelArray == label)
+      self.assertEqual(tuple(labelIndex[label]['boundingBox']),
+                       (i.min(), j.min(), k.min(), i.max() - i.min() + 1, j.max() - j.min() + 1, k.max() - k.min() + 1))
+    self.assertIs(logic.getLabelIndex(labelNode), labelIndex)
+
+    # Add a label in an empty region of the labelmap, only marking the voxel data as modified
+    newLabel = int(labels.max()) + 1
+    labelArray[30:34, 30:34, 30:34] = newLabel
+    labelNode.GetImageData().Modified()
+
+    labelIndex = logic.getLabelIndex(labelNode)
+    self.assertIn(newLabel, labelIndex)
+    self.assertEqual(labelIndex[newLabel]['count'], 64)
+    self.assertEqual(tuple(labelIndex[newLabel]['boundingBox']), (30, 30, 30, 4, 4, 4))
+    self.assertEqual(len(labelIndex), len(labels) + 1)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsCropToROI(self):
+    """ Check that cropping image and mask to the ROI yields the same feature values as an extraction on the full image,
+    for the original image and for filtered images (LoG and wavelet, cropped before filtering with preCrop).
+    """
+    self.delayDisplay('Starting the crop to ROI test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    featureClasses = ['firstorder', 'glcm']
+    for settings, imageTypes in [({'binWidth': 25}, {'Original': {}}),
+                                 ({'binWidth': 25, 'preCrop': True}, {'LoG': {'sigma': [1.0, 2.0]}, 'Wavelet': {}})]:
+      tables = [self.runExtraction(imageNode, labelNode, featureClasses, settings=settings, imageTypes=imageTypes,
+                                   cropToROI=cropToROI)[1] for cropToROI in [False, True]]
+      # Diagnostics differ, as these describe the (cropped) input image
+      self.assertTablesEqual(tables[1], tables[0], places=7)
+      fullSizes, croppedSizes = [self.getTableValues(tableNode, 'diagnostics_Image-original_Size')
+                                 for tableNode in tables]
+      self.assertTrue(all([croppedSize != fullSize for fullSize, croppedSize in zip(fullSizes, croppedSizes)]))
+
+    # Filters applied to the full image depend on content outside of the ROI, so cropping is skipped
+    self.assertIsNone(SlicerRadiomicsLogic._getCropMargin({'binWidth': 25}, {'LoG': {'sigma': [1.0]}}, (1, 1, 1)))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsSegmentLayers(self):
+    """ Check that exporting the segments per labelmap layer assigns each segment its own label value, also when
+    segments overlap (and are stored in separate layers), and yields the same features as exporting each segment
+    separately.
+    """
+    self.delayDisplay('Starting the segment layers test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    # Add a segment overlapping the first ROI, which is stored in a separate layer
+    segmentation = segmentationNode.GetSegmentation()
+    boundingBox = SlicerRadiomicsLogic().getLabelIndex(labelNode)[1]['boundingBox']
+    lower = [start + size // 2 for start, size in zip(boundingBox[:3], boundingBox[3:])]
+    overlapArray = numpy.zeros(slicer.util.arrayFromVolume(imageNode).shape, dtype='uint8')
+    overlapArray[lower[2]:lower[2] + 8, lower[1]:lower[1] + 8, lower[0]:lower[0] + 8] = 1
+    overlapID = segmentation.AddEmptySegment('overlap')
+    slicer.util.updateSegmentBinaryLabelmapFromArray(overlapArray, segmentationNode, overlapID, imageNode)
+    self.assertGreater(segmentation.GetNumberOfLayers(), 1)
+    segmentIDs = dict([('%s_segment_%s' % (segmentationNode.GetName(), segmentation.GetNthSegment(i).GetName()),
+                        segmentation.GetNthSegmentID(i)) for i in range(segmentation.GetNumberOfSegments())])
+
+    # Each ROI is the segment in the labelmap of its layer
+    logic = SlicerRadiomicsLogic()
+    logic.exportSegmentsByLayer = True
+    labelNodeIDs = set()
+    roiNames = []
+    for segmentLabelNode, roiImageNode, rois in logic._getLabelGenerator(segmentationNode, imageNode):
+      labelNodeIDs.add(segmentLabelNode.GetID())
+      labelArray = slicer.util.arrayFromVolume(segmentLabelNode)
+      for labelName, label in rois:
+        roiNames.append(labelName)
+        segmentArray = slicer.util.arrayFromSegmentBinaryLabelmap(segmentationNode, segmentIDs[labelName], imageNode)
+        self.assertTrue(numpy.array_equal(labelArray == label, segmentArray > 0))
+    logic._removeTemporaryNodes(removeAll=True)
+    self.assertEqual(sorted(roiNames), sorted(segmentIDs.keys()))
+    self.assertEqual(len(labelNodeIDs), segmentation.GetNumberOfLayers())
+
+    # Columns are ordered by layer, the features of each segment are the same
+    tables = [self.runExtraction(imageNode, segmentationNode, ['firstorder', 'shape'],
+                                 exportSegmentsByLayer=exportSegmentsByLayer)[1]
+              for exportSegmentsByLayer in [False, True]]
+    self.assertEqual(tables[1].GetNumberOfColumns(), tables[0].GetNumberOfColumns())
+    self.assertEqual(tables[1].GetNumberOfRows(), tables[0].GetNumberOfRows())
+    for columnIndex in range(3, tables[0].GetNumberOfColumns()):
+      column = tables[1].GetTable().GetColumnByName(tables[0].GetColumnName(columnIndex))
+      self.assertIsNotNone(column)
+      for rowIndex in range(tables[0].GetNumberOfRows()):
+        if tables[0].GetCellText(rowIndex, 0) == 'diagnostics':
+          continue
+        self.assertAlmostEqual(float(column.GetValue(rowIndex)), float(tables[0].GetCellText(rowIndex, columnIndex)))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsResultCache(self):
+    """ Check that results are stored in the result cache and that a repeated extraction yields the same results from
+    the cache.
+    """
+    self.delayDisplay('Starting the result cache test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    resultCache = SlicerRadiomicsResultCache(os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestCache'))
+    resultCache.invalidate()
+
+    tables = []
+    for run in range(3):
+      if run == 2:
+        resultCache.invalidate()  # All ROIs must be extracted again
+      logic, tableNode = self.runExtraction(imageNode, labelNode, useResultCache=True, resultCache=resultCache)
+      tables.append(tableNode)
+
+    roiCount = tables[0].GetNumberOfColumns() - 3
+    self.assertGreater(roiCount, 0)
+    self.assertEqual(resultCache.misses, 2 * roiCount)  # First run and the run after invalidation
+    self.assertEqual(resultCache.hits, roiCount)
+
+    # Cached results must be identical to the calculated results, including diagnostics
+    self.assertEqual(tables[1].GetNumberOfRows(), tables[0].GetNumberOfRows())
+    for columnIndex in range(tables[0].GetNumberOfColumns()):
+      for rowIndex in range(tables[0].GetNumberOfRows()):
+        self.assertEqual(tables[1].GetCellText(rowIndex, columnIndex), tables[0].GetCellText(rowIndex, columnIndex))
+
+    resultCache.invalidate()
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsIncremental(self):
+    """ Check that re-running an incremental extraction into the same table after modifying one label only extracts
+    the ROI of that label again, and leaves the columns of the other ROIs unchanged.
+    """
+    self.delayDisplay('Starting the incremental extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    logic, tableNode = self.runExtraction(imageNode, labelNode, incremental=True)
+    roiCount = len(logic.getLabelIndex(labelNode))
+    self.assertEqual(len(logic.timings), roiCount)
+    previousColumns = dict([(tableNode.GetColumnName(columnIndex),
+                             [tableNode.GetCellText(rowIndex, columnIndex)
+                              for rowIndex in range(tableNode.GetNumberOfRows())])
+                            for columnIndex in range(3, tableNode.GetNumberOfColumns())])
+
+    # Remove the lower half of the ROI of label 2
+    boundingBox = logic.getLabelIndex(labelNode)[2]['boundingBox']
+    labelArray = slicer.util.arrayFromVolume(labelNode)
+    roiSlab = labelArray[boundingBox[2]:boundingBox[2] + boundingBox[5] // 2]
+    roiSlab[roiSlab == 2] = 0
+    slicer.util.arrayFromVolumeModified(labelNode)
+    modifiedROI = '%s_label_2' % labelNode.GetName()
+
+    logic = SlicerRadiomicsLogic()
+    logic.runSync = True
+    logic.incremental = True
+    logic.runCLI(imageNode, labelNode, tableNode, ['firstorder'], {'binWidth': 25}, {'Original': {}})
+
+    # Only the modified ROI is extracted, the results of the other ROIs are taken from the table
+    self.assertEqual(list(logic.timings.keys()), [modifiedROI])
+    self.assertEqual(tableNode.GetNumberOfColumns(), 3 + roiCount)
+    for columnIndex in range(3, tableNode.GetNumberOfColumns()):
+      columnName = tableNode.GetColumnName(columnIndex)
+      values = [tableNode.GetCellText(rowIndex, columnIndex) for rowIndex in range(tableNode.GetNumberOfRows())]
+      if columnName == modifiedROI:
+        self.assertNotEqual(values, previousColumns[columnName])
+      else:
+        self.assertEqual(values, previousColumns[columnName])
+    voxelCounts = self.getTableValues(tableNode, 'diagnostics_Mask-original_VoxelNum')
+    modifiedIndex = [tableNode.GetColumnName(i) for i in range(3, tableNode.GetNumberOfColumns())].index(modifiedROI)
+    self.assertEqual(int(voxelCounts[modifiedIndex]), logic.getLabelIndex(labelNode)[2]['count'])
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsTypedOutput(self):
+    """ Check that the typed layout holds dictionary-encoded key columns and numeric feature columns with the same
+    values as the text layout, stores the diagnostics in the metadata table, and marks missing features as NaN.
+    """
+    self.delayDisplay('Starting the typed output test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    featureClasses = ['firstorder', 'glcm']
+    textTable = self.runExtraction(imageNode, labelNode, featureClasses)[1]
+    typedTable = self.runExtraction(imageNode, labelNode, featureClasses, typedOutput=True)[1]
+
+    textValues = {}
+    for rowIndex in range(textTable.GetNumberOfRows()):
+      featureKey = '_'.join([textTable.GetCellText(rowIndex, i) for i in range(3)])
+      for columnIndex in range(3, textTable.GetNumberOfColumns()):
+        textValues[(featureKey, textTable.GetColumnName(columnIndex))] = textTable.GetCellText(rowIndex, columnIndex)
+
+    table = typedTable.GetTable()
+    keyColumnNames = ['Image type', 'Feature Class', 'Feature Name']
+    categories = json.loads(typedTable.GetAttribute('SlicerRadiomics.Categories'))
+    for columnIndex, columnName in enumerate(keyColumnNames):
+      self.assertEqual(table.GetColumnName(columnIndex), columnName)
+      self.assertIsInstance(table.GetColumn(columnIndex), vtk.vtkIntArray)
+    self.assertEqual(table.GetNumberOfColumns(), textTable.GetNumberOfColumns())
+
+    featureKeys = set()
+    for rowIndex in range(table.GetNumberOfRows()):
+      featureKey = '_'.join([categories[columnName][table.GetColumn(columnIndex).GetValue(rowIndex)]
+                             for columnIndex, columnName in enumerate(keyColumnNames)])
+      featureKeys.add(featureKey)
+      for columnIndex in range(3, table.GetNumberOfColumns()):
+        column = table.GetColumn(columnIndex)
+        self.assertIsInstance(column, vtk.vtkDoubleArray)
+        self.assertAlmostEqual(column.GetValue(rowIndex), float(textValues[(featureKey, column.GetName())]))
+
+    # Diagnostics are stored as text in the metadata table
+    metadataTable = typedTable.GetNodeReference('SlicerRadiomics.Metadata')
+    self.assertIsNotNone(metadataTable)
+    diagnosticKeys = set(['_'.join([metadataTable.GetCellText(rowIndex, i) for i in range(3)])
+                          for rowIndex in range(metadataTable.GetNumberOfRows())])
+    self.assertTrue(all([featureKey.startswith('diagnostics_') for featureKey in diagnosticKeys]))
+    self.assertEqual(featureKeys | diagnosticKeys, set([featureKey for featureKey, columnName in textValues]))
+
+    # Features missing for a ROI (here, added by the results of a later ROI) are stored as NaN
+    logic = SlicerRadiomicsLogic()
+    logic.typedOutput = True
+    logic.outTable = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode')
+    logic._initOutputTable()
+    logic._processResults([('roi1', [('original_firstorder_Mean', '1.5')])])
+    logic._processResults([('roi2', [('original_firstorder_Mean', '2.5'), ('original_firstorder_Median', '3.5'),
+                                     ('diagnostics_Versions_PyRadiomics', 'v0')])])
+    table = logic.outTable.GetTable()
+    meanRow = logic._featureNames['original_firstorder_Mean']
+    medianRow = logic._featureNames['original_firstorder_Median']
+    self.assertEqual(table.GetColumnByName('roi1').GetValue(meanRow), 1.5)
+    self.assertTrue(numpy.isnan(table.GetColumnByName('roi1').GetValue(medianRow)))
+    self.assertEqual(table.GetColumnByName('roi2').GetValue(medianRow), 3.5)
+    self.assertEqual(table.GetNumberOfRows(), 2)
+    self.assertEqual(logic.metadataTable.GetTable().GetColumnByName('roi2').GetValue(0), 'v0')
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsOutputSinks(self):
+    """ Check that the CSV sink (and the Parquet sink, if pyarrow is installed) write the results in long format, one
+    record per ROI and feature, holding the values stored in the output table.
+    """
+    self.delayDisplay('Starting the output sinks test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    csvPath = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestResults.csv')
+    parquetPath = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestResults.parquet')
+    for path in [csvPath, parquetPath]:
+      if os.path.isfile(path):
+        os.remove(path)
+    try:
+      import pyarrow.parquet
+    except ImportError:
+      self.logger.warning('pyarrow is not installed, the Parquet sink is not tested')
+      pyarrow = None
+
+    outputSinks = [SlicerRadiomicsCSVSink(csvPath)]
+    if pyarrow is not None:
+      outputSinks.append(SlicerRadiomicsParquetSink(parquetPath, rowGroupSize=50))
+    tableNode = self.runExtraction(imageNode, labelNode, ['firstorder', 'glcm'], outputSinks=outputSinks)[1]
+
+    tableValues = OrderedDict()
+    for columnIndex in range(3, tableNode.GetNumberOfColumns()):
+      for rowIndex in range(tableNode.GetNumberOfRows()):
+        key = (tableNode.GetColumnName(columnIndex),) + tuple([tableNode.GetCellText(rowIndex, i) for i in range(3)])
+        tableValues[key] = tableNode.GetCellText(rowIndex, columnIndex)
+
+    with open(csvPath, 'r') as csvFP:
+      rows = list(csv.reader(csvFP))
+    self.assertEqual(rows[0], ['Image', 'ROI', 'Image type', 'Feature Class', 'Feature Name', 'Value'])
+    self.assertEqual(len(rows) - 1, len(tableValues))
+    for row in rows[1:]:
+      self.assertEqual(row[0], imageNode.GetName())
+      self.assertEqual(row[5], tableValues[tuple(row[1:5])])
+
+    if pyarrow is not None:
+      parquetFile = pyarrow.parquet.ParquetFile(parquetPath)
+      self.assertGreater(parquetFile.num_row_groups, 1)
+      records = parquetFile.read().to_pydict()
+      self.assertEqual(len(records['ROI']), len(tableValues))
+      for recordIndex in range(len(records['ROI'])):
+        key = tuple([records[column][recordIndex] for column in ['ROI', 'Image type', 'Feature Class', 'Feature Name']])
+        if records['Text'][recordIndex] is None:
+          self.assertAlmostEqual(records['Value'][recordIndex], float(tableValues[key]))
+        else:
+          self.assertTrue(numpy.isnan(records['Value'][recordIndex]))
+          self.assertEqual(records['Text'][recordIndex], tableValues[key])
+
+    self.delayDisplay('Test passed!')
+
+  def importCLIModule(self):
+    """ Import the module of the CLI script (also used by the extraction worker) from the directory of the CLI.
+    """
+    cliDir = os.path.dirname(slicer.modules.slicerradiomicscli.path)
+    if cliDir not in sys.path:
+      sys.path.append(cliDir)
+    import SlicerRadiomicsCLI
+    return SlicerRadiomicsCLI
+
+  def test_SlicerRadiomicsFilteredImageCache(self):
+    """ Check that the CLI computes the filtered images (LoG and wavelet) once per image when extracting several
+    labels, and that the features are the same as when the filtered images are computed for every label.
+    """
+    self.delayDisplay('Starting the filtered image cache test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+    SlicerRadiomicsCLI = self.importCLIModule()
+    from radiomics import featureextractor, imageoperations
+
+    image = sitkUtils.PullVolumeFromSlicer(imageNode)
+    mask = sitkUtils.PullVolumeFromSlicer(labelNode)
+    labels = SlicerRadiomicsCLI.getLabels(mask)
+    self.assertGreater(len(labels), 1)
+
+    # Count the calls of the filters, wrapped before the extraction so the cache wraps the counting functions
+    calls = {}
+
+    def countCalls(imageType, function):
+      def countingFunction(*args, **kwargs):
+        calls[imageType] = calls.get(imageType, 0) + 1
+        for filteredImage in function(*args, **kwargs):
+          yield filteredImage
+      return countingFunction
+
+    results = []
+    for cacheSize in [2048 * 1024 * 1024, 0]:
+      extractor = featureextractor.RadiomicsFeatureExtractor(binWidth=25)
+      extractor.disableAllFeatures()
+      extractor.enableFeatureClassByName('firstorder')
+      extractor.enableImageTypes(Original={}, LoG={'sigma': [1.0, 2.0]}, Wavelet={})
+
+      calls.clear()
+      originalFunctions = dict([(imageType, getattr(imageoperations, 'get%sImage' % imageType))
+                                for imageType in ['LoG', 'Wavelet']])
+      for imageType, function in originalFunctions.items():
+        setattr(imageoperations, 'get%sImage' % imageType, countCalls(imageType, function))
+      try:
+        results.append(SlicerRadiomicsCLI.extractLabels(image, mask, extractor, labels, cacheSize))
+      finally:
+        for imageType, function in originalFunctions.items():
+          setattr(imageoperations, 'get%sImage' % imageType, function)
+
+      expectedCalls = 1 if cacheSize > 0 else len(labels)
+      self.assertEqual(calls, {'LoG': expectedCalls, 'Wavelet': expectedCalls})
+
+    cachedResults, uncachedResults = results
+    for label in labels:
+      self.assertIsNotNone(cachedResults[label])
+      self.assertEqual(list(cachedResults[label].keys()), list(uncachedResults[label].keys()))
+      for featureKey, featureValue in cachedResults[label].items():
+        if not featureKey.startswith('diagnostics_'):
+          self.assertAlmostEqual(float(featureValue), float(uncachedResults[label][featureKey]))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsResampleOnce(self):
+    """ Check that resampling the image once per extraction yields the same features as resampling around each ROI (the
+    grids are aligned the same way, so this holds for the original image), and that the resampled nodes are removed
+    when the extraction is done.
+    """
+    self.delayDisplay('Starting the resample once test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    settings = {'binWidth': 25, 'resampledPixelSpacing': [2, 2, 2]}
+    resampledNodeCounts = []
+
+    def countResampledNodes(*args):
+      resampledNodeCounts.append(len([node for node in slicer.util.getNodesByClass('vtkMRMLVolumeNode')
+                                      if node.GetName().endswith('_resampled')]))
+
+    tables = []
+    for resampleOnce in [False, True]:
+      del resampledNodeCounts[:]
+      logic, tableNode = self.runExtraction(imageNode, labelNode, ['firstorder', 'shape'], settings=settings,
+                                            resampleOnce=resampleOnce, progressCallback=countResampledNodes)
+      tables.append(tableNode)
+      # The image (and the labelmap) are only resampled by the logic with resampleOnce
+      self.assertEqual(max(resampledNodeCounts), 2 if resampleOnce else 0)
+      countResampledNodes()
+      self.assertEqual(resampledNodeCounts[-1], 0)
+      self.assertEqual(len(logic._temporaryNodes), 0)
+      self.assertEqual(len(logic._resampledImageNodes), 0)
+      self.assertEqual(len(logic._resampledLabelNodes), 0)
+
+    self.assertTablesEqual(tables[1], tables[0], places=5)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsAsync(self):
+    """ Check that an asynchronous extraction returns before the mask is prepared, yields the same results as a
+    synchronous extraction, and can be cancelled.
+    """
+    self.delayDisplay('Starting the asynchronous extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    tables = []
+    for runSync in [True, False]:
+      SlicerRadiomicsLogic._invalidateLabelIndex(labelNode.GetID())
+      done = []
+      logic, tableNode = self.runExtraction(imageNode, labelNode, callback=lambda: done.append(True), runSync=runSync)
+      tables.append(tableNode)
+      if not runSync:
+        # Nothing is done until the event loop runs
+        self.assertEqual(len(done), 0)
+        self.assertIsNone(logic._getCachedLabelIndex(labelNode))
+        self.waitFor(lambda: len(done) > 0)
+      self.assertEqual(len(done), 1)
+
+    self.assertTablesEqual(tables[1], tables[0])
+
+    # Cancelling invokes the callback and cleans up, a next extraction can be started
+    done = []
+    logic, tableNode = self.runExtraction(imageNode, labelNode, callback=lambda: done.append(True), runSync=False)
+    for _ in range(10):
+      slicer.app.processEvents()
+    logic.cancel()
+    self.assertEqual(len(done), 1)
+    self.assertFalse(logic._isRunning())
+    self.assertEqual(len(logic._temporaryNodes), 0)
+    self.assertIsNone(logic._parameterFile)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsJobQueue(self):
+    """ Check that queued jobs run one after another in order of priority, and that a queued job can be cancelled.
+    """
+    self.delayDisplay('Starting the job queue test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    parameterFile = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestParams.json')
+    with open(parameterFile, 'w') as parameterFP:
+      json.dump({'setting': {'binWidth': 25}, 'featureClass': {'firstorder': []}}, parameterFP)
+
+    logic = SlicerRadiomicsLogic()
+    finished = []
+    jobs = []
+    for priority in [0, 0, 1, 0]:
+      tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode')
+      jobs.append(logic.submit(imageNode, labelNode, tableNode, parameterFile, priority,
+                               lambda job: finished.append(job)))
+
+    # The first job is started right away, the others are queued
+    self.assertEqual(jobs[0].status, SlicerRadiomicsJob.Running)
+    self.assertEqual([job.status for job in jobs[1:]], [SlicerRadiomicsJob.Queued] * 3)
+    jobs[3].cancel()
+    self.assertEqual(jobs[3].status, SlicerRadiomicsJob.Cancelled)
+
+    for job in jobs:
+      self.assertTrue(job.wait(600))
+    self.assertEqual(finished, [jobs[3], jobs[0], jobs[2], jobs[1]])
+    for job in jobs[:3]:
+      self.assertEqual(job.status, SlicerRadiomicsJob.Done)
+      self.assertGreater(job.tableNode.GetNumberOfColumns(), 3)
+      self.assertGreater(len(job.timings), 0)
+    self.assertEqual(jobs[3].tableNode.GetNumberOfColumns(), 0)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsVolumeFiles(self):
+    """ Check that volume files are reused by subsequent extractions, that a file is not overwritten or removed while a
+    task uses it, and that it is removed once the node is removed from the scene.
+    """
+    self.delayDisplay('Starting the volume files test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    # Files written by an extraction are kept for the next extraction, which reuses them
+    volumePaths = []
+    for run in range(2):
+      logic, tableNode = self.runExtraction(imageNode, labelNode, batchMode=True, shareVolumeFiles=True)
+      self.assertGreater(tableNode.GetNumberOfColumns(), 3)
+      volumePaths.append(SlicerRadiomicsLogic._volumeFiles[imageNode.GetID()][1])
+    imagePath = volumePaths[0]
+    self.assertEqual(volumePaths[1], imagePath)
+    self.assertTrue(os.path.isfile(imagePath))
+    self.assertNotIn(imagePath, SlicerRadiomicsLogic._volumeFileUsers)
+
+    task = {'volumeFiles': []}
+    self.assertEqual(logic._getVolumeFile(imageNode, task), imagePath)
+    with open(imagePath, 'r') as headerFP:
+      header = headerFP.read()
+
+    # Changing only the geometry writes a new file, the file in use is kept unchanged until the task releases it
+    origin = imageNode.GetOrigin()
+    imageNode.SetOrigin(origin[0] + 10, origin[1], origin[2])
+    newTask = {'volumeFiles': []}
+    newImagePath = logic._getVolumeFile(imageNode, newTask)
+    self.assertNotEqual(newImagePath, imagePath)
+    self.assertTrue(os.path.isfile(imagePath))
+    with open(imagePath, 'r') as headerFP:
+      self.assertEqual(headerFP.read(), header)
+    logic._releaseVolumeFiles(task)
+    self.assertFalse(os.path.isfile(imagePath))
+    self.assertFalse(os.path.isfile(os.path.splitext(imagePath)[0] + '.raw'))
+
+    # Removing the node releases its file, once it is no longer in use
+    imageNodeID = imageNode.GetID()
+    slicer.mrmlScene.RemoveNode(imageNode)
+    self.assertNotIn(imageNodeID, SlicerRadiomicsLogic._volumeFiles)
+    self.assertTrue(os.path.isfile(newImagePath))
+    logic._releaseVolumeFiles(newTask)
+    self.assertFalse(os.path.isfile(newImagePath))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsMultiImage(self):
+    """ Check that extracting features from multiple images in a single run yields one column per image and ROI, with
+    the same results as separate runs for each image.
+    """
+    self.delayDisplay('Starting the multi-image extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+    invertedNode = slicer.modules.volumes.logic().CloneVolume(slicer.mrmlScene, imageNode, 'synthetic_inverted')
+    slicer.util.updateVolumeFromArray(invertedNode, -slicer.util.arrayFromVolume(imageNode))
+    imageNodes = [imageNode, invertedNode]
+
+    singleTables = [self.runExtraction(node, segmentationNode)[1] for node in imageNodes]
+
+    progress = []
+    logic, tableNode = self.runExtraction(imageNodes, segmentationNode,
+                                          progressCallback=lambda *args: progress.append(args))
+
+    roiCount = segmentationNode.GetSegmentation().GetNumberOfSegments()
+    self.assertEqual(tableNode.GetNumberOfColumns(), 3 + 2 * roiCount)
+    self.assertTrue(all([args[1] == 2 * roiCount for args in progress]))
+    columnImages = json.loads(tableNode.GetAttribute('SlicerRadiomics.Images'))
+
+    for node, singleTable in zip(imageNodes, singleTables):
+      for columnIndex in range(3, singleTable.GetNumberOfColumns()):
+        columnName = '%s_%s' % (node.GetName(), singleTable.GetColumnName(columnIndex))
+        self.assertEqual(columnImages[columnName], node.GetName())
+        column = tableNode.GetTable().GetColumnByName(columnName)
+        self.assertIsNotNone(column)
+        for rowIndex in range(singleTable.GetNumberOfRows()):
+          if singleTable.GetCellText(rowIndex, 0) == 'diagnostics':
+            continue
+          self.assertEqual(column.GetValue(rowIndex), singleTable.GetCellText(rowIndex, columnIndex))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsChunked(self):
+    """ Check that extracting each ROI from the region of its bounding box (chunked extraction) yields the same results
+    as an extraction on the full volumes, using both the CLI and the extraction worker.
+    """
+    self.delayDisplay('Starting the chunked extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    featureClasses = ['firstorder', 'glcm', 'shape']
+    fullTable = self.runExtraction(imageNode, labelNode, featureClasses, batchMode=True, chunked=False)[1]
+    for useWorker in [False, True]:
+      chunkedTable = self.runExtraction(imageNode, labelNode, featureClasses, batchMode=True, chunked=True,
+                                        useWorker=useWorker)[1]
+      self.assertTablesEqual(chunkedTable, fullTable, places=7)
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsParameterHash(self):
+    """ Check that equivalent parameter files (differing in format, order and default values) yield the same
+    parameter hash, and that an invalid parameter file is rejected before the extraction starts, without leaving the
+    GUI locked.
+    """
+    self.delayDisplay('Starting the parameter hash test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    parameterFiles = [os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestParams%d.%s' % (i, extension))
+                      for i, extension in enumerate(['json', 'yaml', 'json'])]
+    with open(parameterFiles[0], 'w') as parameterFP:
+      json.dump({'setting': {'binWidth': 25}, 'featureClass': {'firstorder': []}}, parameterFP)
+    with open(parameterFiles[1], 'w') as parameterFP:
+      parameterFP.write('featureClass:\n  firstorder:\nsetting:\n  padDistance: 5\n  binWidth: 25.0\n')
+    with open(parameterFiles[2], 'w') as parameterFP:
+      json.dump({'setting': {'binWidth': -1}}, parameterFP)
+
+    parameterHashes = []
+    for parameterFile in parameterFiles[:2]:
+      logic = SlicerRadiomicsLogic()
+      logic.runSync = True
+      tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode')
+      self.assertTrue(logic.runCLIWithParameterFile(imageNode, labelNode, tableNode, parameterFile))
+      self.assertGreater(tableNode.GetNumberOfColumns(), 3)
+      parameterHashes.append(tableNode.GetAttribute('SlicerRadiomics.ParameterHash'))
+    self.assertIsNotNone(parameterHashes[0])
+    self.assertEqual(parameterHashes[0], parameterHashes[1])
+
+    done = []
+    logic = SlicerRadiomicsLogic()
+    logic.runSync = True
+    tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode')
+    self.assertFalse(logic.runCLIWithParameterFile(imageNode, labelNode, tableNode, parameterFiles[2],
+                                                   lambda: done.append(True)))
+    self.assertFalse(logic._isRunning())
+    self.assertEqual(len(done), 0)
+    self.assertEqual(tableNode.GetNumberOfColumns(), 0)
+
+    # The widget is unlocked when the extraction is not started
+    widget = slicer.modules.slicerradiomics.widgetRepresentation().self()
+    widget.inputVolumeSelector.setCurrentNode(imageNode)
+    widget.inputMaskSelector.setCurrentNode(labelNode)
+    widget.parameterFileCustomizationRadioButton.checked = True
+    widget.parameterFilePathLineEdit.currentPath = parameterFiles[2]
+    widget.onApplyButton()
+    self.assertTrue(widget.applyButton.enabled)
+    self.assertEqual(widget.applyButton.text, 'Apply')
+    self.assertFalse(widget.cancelButton.enabled)
+    self.assertIsNone(widget.logic)
+    widget.manualCustomizationRadioButton.checked = True
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsMemoryBudget(self):
+    """ Check that the peak memory of the extraction processes is recorded for each ROI, and that a memory budget
+    smaller than the estimated memory of a task limits the extraction to one task at a time.
+    """
+    self.delayDisplay('Starting the memory budget test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    done = []
+    runningTasks = []
+    logic, tableNode = self.runExtraction(imageNode, segmentationNode, callback=lambda: done.append(True),
+                                          runSync=False, maxWorkers=2, memoryBudget=1, batchMode=True)
+    self.waitFor(lambda: runningTasks.append(len(logic._runningTasks)) or len(done) > 0)
+    self.assertEqual(len(done), 1)
+    self.assertLessEqual(max(runningTasks), 1)
+
+    roiCount = segmentationNode.GetSegmentation().GetNumberOfSegments()
+    self.assertEqual(len(logic.peakMemory), roiCount)
+    if sys.platform.startswith('linux'):
+      self.assertTrue(all([peakMemory > 0 for peakMemory in logic.peakMemory.values()]))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SlicerRadiomicsBatch(self):
+    """ Check the extraction of a cohort listed in a manifest, and that a repeated run skips the cases that are done.
+    """
+    self.delayDisplay('Starting the batch extraction test')
+    imageNode, labelNode, segmentationNode = self.loadSyntheticData()
+
+    batchDir = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsTestBatch')
+    if not os.path.isdir(batchDir):
+      os.makedirs(batchDir)
+    manifestPath = os.path.join(batchDir, 'manifest.csv')
+    outputPath = os.path.join(batchDir, 'results.csv')
+    for path in [outputPath, outputPath + '.done', outputPath + '.errors.csv']:
+      if os.path.isfile(path):
+        os.remove(path)
+
+    imagePath = os.path.join(batchDir, 'synthetic_image.nrrd')
+    labelPath = os.path.join(batchDir, 'synthetic_label.nrrd')
+    self.assertTrue(slicer.util.saveNode(imageNode, imagePath))
+    self.assertTrue(slicer.util.saveNode(labelNode, labelPath))
+    parameterFile = os.path.join(batchDir, 'Params.json')
+    with open(parameterFile, 'w') as parameterFP:
+      json.dump({'setting': {'binWidth': 25}, 'featureClass': {'firstorder': []}}, parameterFP)
+
+    with open(manifestPath, 'w') as manifestFP:
+      writer = csv.writer(manifestFP, lineterminator='\n')
+      writer.writerow(['ID', 'Image', 'Mask'])
+      writer.writerow(['synthetic', imagePath, labelPath])
+      writer.writerow(['missing', os.path.join(batchDir, 'missing_image.nrrd'),
+                       os.path.join(batchDir, 'missing_label.nrrd')])
+
+    logic = SlicerRadiomicsLogic()
+    self.assertEqual(logic.runBatch(manifestPath, outputPath, parameterFile), (1, 1))
+
+    with open(outputPath, 'r') as outFP:
+      rows = list(csv.reader(outFP))
+    self.assertEqual(rows[0], ['Case', 'Image', 'Mask', 'Label', 'Feature', 'Value'])
+    self.assertGreater(len(rows), 1)
+    self.assertTrue(all([row[0] == 'synthetic' for row in rows[1:]]))
+    self.assertEqual(len(set([row[3] for row in rows[1:]])), len(logic.getLabelIndex(labelNode)))
+
+    # Resume: only the failed case is extracted again
+    self.assertEqual(logic.runBatch(manifestPath, outputPath, parameterFile), (0, 1))
+    with open(outputPath, 'r') as outFP:
+      self.assertEqual(len(list(csv.reader(outFP))), len(rows))
+
+    self.delayDisplay('Test passed!')
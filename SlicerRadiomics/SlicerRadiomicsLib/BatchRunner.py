@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import logging
+import os
+
+import SimpleITK as sitk
+
+from .WorkerClient import SlicerRadiomicsWorkerClient
+
+
+class SlicerRadiomicsBatchRunner(object):
+  """
+  Extraction of a cohort of cases listed in a CSV manifest, without loading them into the scene (see
+  ``SlicerRadiomicsLogic.runBatch``). Cases are extracted by persistent extraction workers if ``useWorker`` is true
+  and a worker is available, otherwise in this process.
+  """
+
+  def __init__(self, useWorker=True):
+    self.logger = logging.getLogger('radiomics.slicer')
+    self.useWorker = useWorker
+
+  def run(self, manifestPath, outputPath, parameterFilePath=None, maxWorkers=1):
+    """
+    Extract features for all cases in a CSV manifest. Images and masks are read from disk by the extraction workers and
+    are not loaded into the scene. This function blocks until all cases are processed.
+
+    The manifest must contain the columns "Image" and "Mask" (file paths, relative to the manifest location) and may
+    contain the columns "ID" (defaults to the row number) and "Label" (if omitted, all labels in the mask are used).
+
+    Results are appended to ``outputPath`` in long format, i.e. one row per case, label and feature. The IDs of cases
+    whose results are written are recorded in ``<outputPath>.done`` (with the size of the output after the case), these
+    cases are skipped when the same output is used again, so an interrupted batch can be resumed. Failed cases (and
+    labels) are recorded in ``<outputPath>.errors.csv`` and do not stop the extraction of the remaining cases. Failed
+    cases are retried when the batch is resumed.
+
+    :param manifestPath: CSV file listing the cases
+    :param outputPath: CSV file to write the results to
+    :param parameterFilePath: Parameter file used to customize the extraction (PyRadiomics defaults if None)
+    :param maxWorkers: Number of extraction workers processing cases in parallel
+    :returns: Tuple of the number of cases extracted and the number of failed cases
+    """
+    cases = self._readManifest(manifestPath)
+    completed = self._prepareOutput(outputPath)
+    pending = [case for case in cases if case['ID'] not in completed]
+    self.logger.info('Batch extraction of %d cases (%d cases already done)', len(pending), len(cases) - len(pending))
+
+    counts = {'done': 0, 'failed': 0}
+    with open(outputPath, 'a') as outFP, open(outputPath + '.done', 'a') as doneFP, \
+         open(outputPath + '.errors.csv', 'a') as errorFP:
+      resultWriter = csv.writer(outFP, lineterminator='\n')
+      doneWriter = csv.writer(doneFP, lineterminator='\n')
+      errorWriter = csv.writer(errorFP, lineterminator='\n')
+
+      def caseDone(case, reply):
+        if reply is None:
+          reply = {'status': 'error', 'message': 'Extraction worker stopped unexpectedly'}
+        if reply['status'] != 'ok':
+          self.logger.error('Feature extraction failed for case %s: %s', case['ID'], reply.get('message'))
+          errorWriter.writerow([case['ID'], '', reply.get('message')])
+          errorFP.flush()
+          counts['failed'] += 1
+          return
+
+        rows = []
+        for label, features in reply['results']:
+          if features is None:
+            errorWriter.writerow([case['ID'], label, 'Feature extraction failed'])
+            continue
+          rows.extend([[case['ID'], case['Image'], case['Mask'], label, featureName, featureValue]
+                       for featureName, featureValue in features])
+        errorFP.flush()
+        resultWriter.writerows(rows)
+        outFP.flush()
+        # Only mark the case as done once all its results are written, the offset marks the end of its results
+        doneWriter.writerow([case['ID'], outFP.tell()])
+        doneFP.flush()
+        counts['done'] += 1
+        self.logger.info('Case %s done (%d/%d)', case['ID'], counts['done'] + counts['failed'], len(pending))
+
+      def submit(worker, case):
+        def workerDone(reply):
+          runningWorkers.remove(worker)
+          caseDone(case, reply)
+        runningWorkers.append(worker)
+        worker.submit(self._getJob(case, parameterFilePath), workerDone)
+
+      runningWorkers = []
+      while len(pending) > 0 or len(runningWorkers) > 0:
+        if len(pending) > 0:
+          worker = SlicerRadiomicsWorkerClient.getIdleWorker(maxWorkers) if self.useWorker else None
+          if worker is not None:
+            submit(worker, pending.pop(0))
+            continue
+          if len(runningWorkers) == 0:
+            # No extraction worker available, extract in this process instead
+            case = pending.pop(0)
+            caseDone(case, self._extractJob(self._getJob(case, parameterFilePath)))
+            continue
+        for worker in list(runningWorkers):
+          worker.poll()
+
+    self.logger.info('Batch extraction complete: %d cases extracted, %d cases failed', counts['done'], counts['failed'])
+    return counts['done'], counts['failed']
+
+  @staticmethod
+  def _readManifest(manifestPath):
+    """
+    Read the cases from a CSV manifest (see run). Relative paths are resolved relative to the manifest location.
+
+    :returns: List of dicts with keys 'ID', 'Image', 'Mask' and 'Label' (None if not specified)
+    """
+    manifestDir = os.path.dirname(os.path.abspath(manifestPath))
+    cases = []
+    with open(manifestPath, 'r') as manifestFP:
+      for rowIndex, row in enumerate(csv.DictReader(manifestFP), start=1):
+        label = row.get('Label')
+        cases.append({
+          'ID': row.get('ID') or str(rowIndex),
+          'Image': os.path.join(manifestDir, row['Image']),
+          'Mask': os.path.join(manifestDir, row['Mask']),
+          'Label': int(label) if label else None
+        })
+    return cases
+
+  @staticmethod
+  def _prepareOutput(outputPath):
+    """
+    Prepare the output of a batch extraction. If the output exists, it is truncated to the end of the results of the
+    last case marked as done, which removes results that were partially written when the extraction was interrupted.
+    Headers are written to outputs that do not have them yet (i.e. new or empty files).
+
+    :returns: Set of the IDs of the cases that are done
+    """
+    completed = set()
+    outputSize = 0
+    if os.path.isfile(outputPath + '.done'):
+      with open(outputPath + '.done', 'rb+') as doneFP:
+        # Remove a line that was partially written when the extraction was interrupted (it lacks the line end)
+        done = doneFP.read()
+        doneFP.truncate(done.rfind(b'\n') + 1)
+      lines = done[:done.rfind(b'\n') + 1].decode('utf-8').splitlines()
+      for row in csv.reader(lines):
+        if len(row) == 2 and row[1].isdigit():
+          completed.add(row[0])
+          outputSize = max(outputSize, int(row[1]))
+
+    if os.path.isfile(outputPath) and os.path.getsize(outputPath) > outputSize:
+      with open(outputPath, 'r+') as outFP:
+        outFP.truncate(outputSize)
+    if not os.path.isfile(outputPath) or os.path.getsize(outputPath) == 0:
+      with open(outputPath, 'w') as outFP:
+        csv.writer(outFP, lineterminator='\n').writerow(['Case', 'Image', 'Mask', 'Label', 'Feature', 'Value'])
+
+    if not os.path.isfile(outputPath + '.errors.csv') or os.path.getsize(outputPath + '.errors.csv') == 0:
+      with open(outputPath + '.errors.csv', 'w') as errorFP:
+        csv.writer(errorFP, lineterminator='\n').writerow(['Case', 'Label', 'Message'])
+    return completed
+
+  @staticmethod
+  def _getJob(case, parameterFilePath):
+    return {
+      'image': case['Image'],
+      'mask': case['Mask'],
+      'labels': [case['Label']] if case['Label'] is not None else None,
+      'param': parameterFilePath
+    }
+
+  def _extractJob(self, job):
+    """
+    Extract the features of a batch job in this process, used if no extraction worker is available. Returns a reply
+    as sent by the extraction worker.
+    """
+    from radiomics import featureextractor
+    from SlicerRadiomics import SlicerRadiomicsLogic
+    try:
+      extractor = featureextractor.RadiomicsFeatureExtractor(job['param']) if job['param'] \
+        else featureextractor.RadiomicsFeatureExtractor()
+      extractor.settings['correctMask'] = True
+
+      image = sitk.ReadImage(job['image'])
+      mask = sitk.ReadImage(job['mask'])
+      labels = job['labels']
+      if labels is None:
+        labelIndex = SlicerRadiomicsLogic._computeLabelIndex(sitk.GetArrayViewFromImage(mask))
+        labels = list(labelIndex.keys())
+
+      results = []
+      for label in labels:
+        try:
+          featureVector = extractor.execute(image, mask, label=label)
+          results.append([label, [[featureName, SlicerRadiomicsLogic._toPythonValue(featureValue)]
+                                  for featureName, featureValue in featureVector.items()]])
+        except Exception:
+          self.logger.error('Feature extraction failed for label %d', label, exc_info=True)
+          results.append([label, None])
+      return {'status': 'ok', 'results': results}
+    except Exception as e:
+      self.logger.error('Feature extraction failed', exc_info=True)
+      return {'status': 'error', 'message': str(e)}
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import slicer
+
+
+class SlicerRadiomicsJob(object):
+  """
+  Handle of an extraction queued in a SlicerRadiomicsLogic (see ``SlicerRadiomicsLogic.submit``). The status of the job
+  is one of 'Queued', 'Running', 'Done', 'Cancelled' or 'Failed' (i.e. the extraction could not be started). Once the
+  job is done, the results are stored in its table and output sinks, the time spent on each ROI in ``timings`` and the
+  largest peak memory (in bytes) of the extraction processes running the job in ``peakMemory``.
+  """
+
+  Queued = 'Queued'
+  Running = 'Running'
+  Done = 'Done'
+  Cancelled = 'Cancelled'
+  Failed = 'Failed'
+
+  def __init__(self, queue, imageNode, maskNode, tableNode, parameterFilePath, priority=0, callback=None,
+               outputSinks=None):
+    self.imageNode = imageNode
+    self.maskNode = maskNode
+    self.tableNode = tableNode
+    self.parameterFilePath = parameterFilePath
+    self.priority = priority
+    self.callback = callback
+    self.outputSinks = outputSinks or []
+    self.status = self.Queued
+    self.logic = None  # Logic instance running the job
+    self.timings = None
+    self.peakMemory = None
+    self._queue = queue
+
+  def isDone(self):
+    """
+    :returns: True if the job is no longer queued or running (i.e. it is done, cancelled or failed)
+    """
+    return self.status not in (self.Queued, self.Running)
+
+  def cancel(self):
+    """
+    Remove the job from the queue, or cancel it if it is running (see ``SlicerRadiomicsLogic.cancel``).
+    """
+    self._queue._cancelJob(self)
+
+  def wait(self, timeout=None):
+    """
+    Process events until the job is done, or until ``timeout`` seconds have passed.
+
+    :returns: True if the job is done
+    """
+    startTime = time.time()
+    while not self.isDone():
+      if timeout is not None and time.time() - startTime > timeout:
+        return False
+      slicer.app.processEvents()
+      time.sleep(.01)
+    return True
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+
+import slicer
+
+
+class SlicerRadiomicsResultCache(object):
+  """
+  On-disk cache of extraction results. Each entry holds the features of one ROI and is stored as a JSON file named by
+  its key (see SlicerRadiomicsLogic._getResultKeys). If the total size of the entries exceeds ``maxSize`` bytes, the
+  least recently used entries are removed. The number of cache hits and misses is counted in ``hits`` and ``misses``.
+  """
+
+  def __init__(self, cacheDir=None, maxSize=100 * 1024 * 1024):
+    self.logger = logging.getLogger('radiomics.slicer')
+    if cacheDir is None:
+      cacheDir = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomics', 'ResultCache')
+    self.cacheDir = cacheDir
+    self.maxSize = maxSize
+    self.hits = 0
+    self.misses = 0
+    self._size = None  # Total size of the entries, computed on first use
+
+  def _getPath(self, key):
+    return os.path.join(self.cacheDir, key + '.json')
+
+  def _getEntries(self):
+    """
+    Get a list of (last used, size, path) tuples of all entries in the cache.
+    """
+    if not os.path.isdir(self.cacheDir):
+      return []
+    entries = []
+    for fileName in os.listdir(self.cacheDir):
+      if fileName.endswith('.json'):
+        path = os.path.join(self.cacheDir, fileName)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+  def get(self, key):
+    """
+    Get the features (list of (name, value) tuples) stored for ``key``, or None if the cache contains no entry for it.
+    """
+    path = self._getPath(key)
+    try:
+      with open(path, 'r') as entryFP:
+        features = json.load(entryFP)
+    except (IOError, OSError, ValueError):
+      self.misses += 1
+      return None
+    os.utime(path, None)  # Mark as recently used
+    self.hits += 1
+    return [tuple(feature) for feature in features]
+
+  def put(self, key, features):
+    """
+    Store the features (list of (name, value) tuples) for ``key``.
+    """
+    if not os.path.isdir(self.cacheDir):
+      os.makedirs(self.cacheDir)
+    if self._size is None:
+      self._size = sum([size for lastUsed, size, path in self._getEntries()])
+
+    path = self._getPath(key)
+    if os.path.isfile(path):
+      self._size -= os.path.getsize(path)
+    # Write to a temporary file first, so an interrupted write does not leave a corrupt entry
+    with open(path + '.tmp', 'w') as entryFP:
+      json.dump([list(feature) for feature in features], entryFP)
+    os.replace(path + '.tmp', path)
+    self._size += os.path.getsize(path)
+
+    if self._size > self.maxSize:
+      self._removeLeastRecentlyUsed()
+
+  def _removeLeastRecentlyUsed(self):
+    entries = sorted(self._getEntries())
+    self._size = sum([size for lastUsed, size, path in entries])
+    for lastUsed, size, path in entries:
+      if self._size <= self.maxSize:
+        break
+      os.remove(path)
+      self._size -= size
+    self.logger.debug('Result cache reduced to %d bytes', self._size)
+
+  def invalidate(self, key=None):
+    """
+    Remove the entry for ``key`` from the cache, or all entries if ``key`` is None.
+    """
+    if key is None:
+      paths = [path for lastUsed, size, path in self._getEntries()]
+    else:
+      paths = [self._getPath(key)]
+    for path in paths:
+      if os.path.isfile(path):
+        os.remove(path)
+    self._size = None
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import abc
+import csv
+
+
+class SlicerRadiomicsResultSink(abc.ABC):
+  """
+  Abstract base class for outputs to which the results of an extraction are streamed as they become available (see
+  SlicerRadiomicsLogic.outputSinks). Results are written as records, one for each image, ROI and feature. Subclasses
+  implement ``writeRecords``, and ``open`` and ``close`` if needed.
+  """
+
+  @staticmethod
+  def getRecords(results, roiImages=None):
+    """
+    Convert results (list of (labelName, features) tuples) to records, i.e. (image, ROI, image type, feature class,
+    feature name, value) tuples.
+
+    :param roiImages: dict mapping labelName to a tuple of (image name, ROI name). If a labelName is not in it, the
+      image is left empty and the labelName is used as ROI name.
+    """
+    records = []
+    for labelName, features in results:
+      imageName, roiName = (roiImages or {}).get(labelName, ('', labelName))
+      for featureKey, featureValue in features:
+        key_parts = featureKey.split('_', 3)
+        if len(key_parts) < 3:
+          continue
+        records.append((imageName, roiName, key_parts[0], key_parts[1], key_parts[2], featureValue))
+    return records
+
+  def open(self):
+    """
+    Called when an extraction starts, before any records are written.
+    """
+    pass
+
+  @abc.abstractmethod
+  def writeRecords(self, records):
+    """
+    Write ``records`` (see ``getRecords``), called each time results become available.
+    """
+
+  def close(self):
+    """
+    Called when the extraction is finished (or cancelled).
+    """
+    pass
+
+
+class SlicerRadiomicsCSVSink(SlicerRadiomicsResultSink):
+  """
+  Write the results to a CSV file in long format, with columns "Image", "ROI", "Image type", "Feature Class",
+  "Feature Name" and "Value". Records are written (and flushed) as soon as they are received.
+  """
+
+  def __init__(self, filePath):
+    self.filePath = filePath
+    self._fp = None
+    self._writer = None
+
+  def open(self):
+    self._fp = open(self.filePath, 'w')
+    self._writer = csv.writer(self._fp, lineterminator='\n')
+    self._writer.writerow(['Image', 'ROI', 'Image type', 'Feature Class', 'Feature Name', 'Value'])
+
+  def writeRecords(self, records):
+    self._writer.writerows(records)
+    self._fp.flush()
+
+  def close(self):
+    if self._fp is not None:
+      self._fp.close()
+    self._fp = None
+    self._writer = None
+
+
+class SlicerRadiomicsParquetSink(SlicerRadiomicsResultSink):
+  """
+  Write the results to a Parquet file in long format, with columns "Image", "ROI", "Image type", "Feature Class",
+  "Feature Name", "Value" (numeric values, NaN otherwise) and "Text" (non-numeric values, e.g. diagnostics). Records
+  are buffered and written in row groups of ``rowGroupSize`` records.
+
+  Requires pyarrow, which is not included in Slicer (install using ``slicer.util.pip_install('pyarrow')``).
+  """
+
+  def __init__(self, filePath, rowGroupSize=100000):
+    self.filePath = filePath
+    self.rowGroupSize = rowGroupSize
+    self._records = []
+    self._writer = None
+
+  def open(self):
+    try:
+      import pyarrow  # noqa: F401
+    except ImportError:
+      raise RuntimeError('Writing results to Parquet requires pyarrow, install it using '
+                         'slicer.util.pip_install(\'pyarrow\')')
+    self._records = []
+    self._writer = None
+
+  def writeRecords(self, records):
+    self._records.extend(records)
+    if len(self._records) >= self.rowGroupSize:
+      self._writeRowGroup()
+
+  def _writeRowGroup(self):
+    import pyarrow
+    import pyarrow.parquet
+
+    values = []
+    texts = []
+    for record in self._records:
+      try:
+        values.append(float(record[5]))
+        texts.append(None)
+      except (TypeError, ValueError):
+        values.append(float('nan'))
+        texts.append(str(record[5]))
+    columns = zip(*[record[:5] for record in self._records])
+    table = pyarrow.Table.from_arrays(
+      [pyarrow.array(column).dictionary_encode() for column in columns] +
+      [pyarrow.array(values, pyarrow.float64()), pyarrow.array(texts, pyarrow.string())],
+      names=['Image', 'ROI', 'Image type', 'Feature Class', 'Feature Name', 'Value', 'Text'])
+    if self._writer is None:
+      self._writer = pyarrow.parquet.ParquetWriter(self.filePath, table.schema)
+    self._writer.write_table(table)
+    self._records = []
+
+  def close(self):
+    if len(self._records) > 0:
+      self._writeRowGroup()
+    if self._writer is not None:
+      self._writer.close()
+    self._writer = None
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+import slicer
+
+
+def createSyntheticVolumes(size, roiCount, seed=0, name='synthetic'):
+  """
+  Create an image with ``roiCount`` spherical ROIs of varying size and intensity, placed on a regular grid. The ROIs
+  are stored both in a labelmap (label values 1..roiCount) and in a segmentation (one segment per ROI). Used by the
+  tests and the benchmark, so these run without downloading test data.
+
+  :param size: Size of the volumes (number of voxels along each axis)
+  :param name: Prefix of the names of the created nodes
+  :returns: Tuple of (imageNode, labelNode, segmentationNode)
+  """
+  randomState = numpy.random.RandomState(seed)
+  gridSize = int(numpy.ceil(roiCount ** (1. / 3)))
+  cellSize = float(size) / gridSize
+
+  k, j, i = numpy.ogrid[:size, :size, :size]
+  image = randomState.normal(0, 50, (size, size, size))
+  labels = numpy.zeros((size, size, size), dtype='int16')
+  for label in range(1, roiCount + 1):
+    cell = numpy.unravel_index(label - 1, (gridSize, gridSize, gridSize))
+    center = [(c + .5) * cellSize for c in cell]
+    radius = cellSize * randomState.uniform(.2, .4)
+    sphere = (k - center[0]) ** 2 + (j - center[1]) ** 2 + (i - center[2]) ** 2 <= radius ** 2
+    labels[sphere] = label
+    image[sphere] += randomState.uniform(100, 1000)
+
+  imageNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode', name + '_image')
+  slicer.util.updateVolumeFromArray(imageNode, image.astype('int16'))
+  labelNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode', name + '_label')
+  slicer.util.updateVolumeFromArray(labelNode, labels)
+
+  segmentationNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode', name + '_segmentation')
+  segmentationNode.CreateDefaultDisplayNodes()
+  slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelNode, segmentationNode)
+  return imageNode, labelNode, segmentationNode
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+
+import qt
+import slicer
+
+
+class SlicerRadiomicsWorkerClient(object):
+  """
+  Client for a persistent extraction process (SlicerRadiomicsWorker.py, installed alongside the RadiomicsCLI).
+  Workers are started on first use and kept running for the remainder of the Slicer session, so the start-up cost of
+  the interpreter and the import of PyRadiomics and its dependencies is only paid once. Each worker handles one job
+  at a time, jobs and replies are exchanged as JSON documents over the stdin/stdout pipes of the process.
+  """
+
+  # Workers started in this Slicer session, shared by all logic instances
+  _workers = []
+
+  @classmethod
+  def getIdleWorker(cls, maxWorkers=1):
+    """
+    Return a worker that is not handling a job, starting a new one if fewer than ``maxWorkers`` workers are running.
+    Returns None if no worker is available.
+    """
+    cls._workers = [worker for worker in cls._workers if worker.isAlive()]
+    for worker in cls._workers:
+      if not worker.busy:
+        return worker
+    if len(cls._workers) >= maxWorkers:
+      return None
+
+    worker = cls()
+    if not worker.start():
+      return None
+    cls._workers.append(worker)
+    return worker
+
+  @classmethod
+  def stopAll(cls):
+    for worker in cls._workers:
+      worker.stop()
+    cls._workers = []
+
+  def __init__(self):
+    self.logger = logging.getLogger('radiomics.slicer')
+    self.process = None
+    self.busy = False
+    self._jobCount = 0
+    self._callback = None
+    self._progressCallback = None
+    self._jobId = None
+    self._buffer = b''
+    self._errorBuffer = b''
+
+  def start(self):
+    import shutil
+    # PythonSlicer is on the PATH of Slicer and starts python-real in the Slicer environment
+    pythonSlicerExecutablePath = shutil.which('PythonSlicer')
+    workerScript = os.path.join(os.path.dirname(slicer.modules.slicerradiomicscli.path), 'SlicerRadiomicsWorker.py')
+    if pythonSlicerExecutablePath is None or not os.path.isfile(workerScript):
+      self.logger.warning('Extraction worker not available')
+      return False
+
+    self.logger.info('Starting extraction worker')
+    self.process = qt.QProcess()
+    self.process.connect('readyReadStandardOutput()', self._onReadyReadOutput)
+    self.process.connect('readyReadStandardError()', self._onReadyReadError)
+    self.process.connect('finished(int,QProcess::ExitStatus)', self._onProcessFinished)
+    self.process.start(pythonSlicerExecutablePath, [workerScript])
+    if not self.process.waitForStarted(10000):
+      self.logger.warning('Failed to start extraction worker')
+      self.process = None
+      return False
+    return True
+
+  def stop(self):
+    if self.isAlive():
+      self.process.closeWriteChannel()  # Worker exits when its input is closed
+      if not self.process.waitForFinished(5000):
+        self.process.kill()
+    self.process = None
+
+  def isAlive(self):
+    return self.process is not None and self.process.state() == qt.QProcess.Running
+
+  def cancel(self):
+    """
+    Abort the current job by stopping the worker, its callback is not called. A new worker is started when needed.
+    """
+    self._callback = None
+    self._progressCallback = None
+    if self.isAlive():
+      self.process.kill()
+      self.process.waitForFinished(1000)
+
+  def submit(self, job, callback, progressCallback=None):
+    """
+    Send a job to the worker. ``callback`` is called with the reply (a dict), or with None if the worker stopped
+    before replying. If the job requests progress, ``progressCallback`` is called with each progress report (a dict).
+    """
+    self._jobCount += 1
+    self._jobId = self._jobCount
+    self._callback = callback
+    self._progressCallback = progressCallback
+    self.busy = True
+
+    job = dict(job)
+    job['id'] = self._jobId
+    self.process.write(json.dumps(job) + '\n')
+
+  def wait(self):
+    """
+    Block until the current job is done (i.e. the callback has been called).
+    """
+    while self.busy:
+      self.poll(1000)
+
+  def poll(self, msecs=100):
+    """
+    Wait at most ``msecs`` milliseconds for the reply to the current job and process it if it is received. This allows
+    waiting for replies without running the Qt event loop (e.g. in a headless script).
+    """
+    if self.busy and not self.process.waitForReadyRead(msecs) and not self.isAlive():
+      self._onProcessFinished()
+
+  def _onReadyReadOutput(self):
+    self._buffer += self.process.readAllStandardOutput().data()
+    while b'\n' in self._buffer:
+      line, self._buffer = self._buffer.split(b'\n', 1)
+      if line.strip() == b'':
+        continue
+      reply = json.loads(line.decode('utf-8'))
+      if reply.get('id') is None and reply.get('status') == 'error' and self.busy:
+        # The worker could not parse the job, it handles one job at a time so this reply belongs to the current job
+        reply['id'] = self._jobId
+      if reply.get('id') != self._jobId:
+        self.logger.warning('Ignoring unexpected reply from extraction worker')
+        continue
+      if reply.get('status') == 'progress':
+        if self._progressCallback is not None:
+          self._progressCallback(reply['progress'])
+        continue
+      self._done(reply)
+
+  def _onReadyReadError(self):
+    # The worker logs to stderr (including the INFO messages of PyRadiomics), pass complete lines to the debug log.
+    # Errors of a job are reported in its reply.
+    self._errorBuffer += self.process.readAllStandardError().data()
+    while b'\n' in self._errorBuffer:
+      line, self._errorBuffer = self._errorBuffer.split(b'\n', 1)
+      line = line.decode('utf-8', 'replace').rstrip()
+      if line != '':
+        self.logger.debug('Extraction worker: %s', line)
+
+  def _onProcessFinished(self, exitCode=None, exitStatus=None):
+    if self.busy:
+      self._done(None)
+
+  def _done(self, reply):
+    # Mark the worker as idle before invoking the callback, so the callback can submit the next job
+    callback = self._callback
+    self.busy = False
+    self._callback = None
+    self._progressCallback = None
+    self._jobId = None
+    if callback is not None:
+      callback(reply)
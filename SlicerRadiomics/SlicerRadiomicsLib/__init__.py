@@ -0,0 +1,10 @@
+from .BatchRunner import SlicerRadiomicsBatchRunner
+from .Job import SlicerRadiomicsJob
+from .ResultCache import SlicerRadiomicsResultCache
+from .ResultSinks import SlicerRadiomicsResultSink, SlicerRadiomicsCSVSink, SlicerRadiomicsParquetSink
+from .TestData import createSyntheticVolumes
+from .WorkerClient import SlicerRadiomicsWorkerClient
+
+__all__ = ['SlicerRadiomicsBatchRunner', 'SlicerRadiomicsJob', 'SlicerRadiomicsResultCache',
+           'SlicerRadiomicsResultSink', 'SlicerRadiomicsCSVSink', 'SlicerRadiomicsParquetSink',
+           'createSyntheticVolumes', 'SlicerRadiomicsWorkerClient']
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the feature extraction pipeline of SlicerRadiomicsLogic on synthetic volumes, so it runs offline.
+
+An image with ``--rois`` spherical ROIs (as a labelmap and as a segmentation) is generated, after which label
+generation, segment export, the extraction (asynchronous if ``--workers`` is more than 1) and the ingestion of the
+results in the output table are timed separately. Results are written as JSON to track throughput and peak memory
+across versions. Run this script using Slicer, e.g.::
+
+  Slicer --no-main-window --python-script SlicerRadiomicsBenchmark.py --size 128 --rois 8 --config filters \
+    --out benchmark.json
+"""
+
+from __future__ import print_function
+import argparse
+from collections import OrderedDict
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy
+
+# Feature configurations that can be benchmarked (see --config), an empty featureClass enables all feature classes
+configurations = {
+  'firstorder': {
+    'setting': {'binWidth': 25},
+    'imageType': {'Original': {}},
+    'featureClass': {'firstorder': []}
+  },
+  'default': {
+    'setting': {'binWidth': 25},
+    'imageType': {'Original': {}},
+    'featureClass': {}
+  },
+  'filters': {
+    'setting': {'binWidth': 25},
+    'imageType': {'Original': {}, 'LoG': {'sigma': [1.0, 3.0]}, 'Wavelet': {}},
+    'featureClass': {}
+  }
+}
+
+
+def getParser():
+  parser = argparse.ArgumentParser(usage='Slicer --no-main-window --python-script %(prog)s [Options]')
+  parser.add_argument('--size', metavar='N', type=int, default=128,
+                      help='Size of the synthetic volumes (number of voxels along each axis)')
+  parser.add_argument('--rois', metavar='N', type=int, default=8, help='Number of ROIs in the synthetic mask')
+  parser.add_argument('--config', choices=sorted(configurations.keys()), default='default',
+                      help='Feature configuration to extract')
+  parser.add_argument('--param', '-p', metavar='FILE', default=None,
+                      help='Parameter file to extract with (overrides --config)')
+  parser.add_argument('--repeat', metavar='N', type=int, default=3, help='Number of times each step is timed')
+  parser.add_argument('--workers', metavar='N', type=int, default=1,
+                      help='Maximum number of extractions running at the same time')
+  parser.add_argument('--memory-budget', dest='memoryBudget', metavar='MB', type=int, default=None,
+                      help='Maximum memory used by the extractions running at the same time (see '
+                           'SlicerRadiomicsLogic.memoryBudget)')
+  parser.add_argument('--no-worker', dest='useWorker', action='store_false',
+                      help='Use the CLI for each extraction instead of the persistent extraction worker')
+  parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator used for the synthetic image')
+  parser.add_argument('--out', '-o', metavar='FILE', default='SlicerRadiomicsBenchmark.json',
+                      help='JSON file to write the results to')
+  return parser
+
+
+def getPeakMemory():
+  """
+  :returns: dict with the peak resident set size (in bytes) of this process and the largest peak of its finished child
+    processes (e.g. the CLI), or None if not available on this platform. The latter is the peak of a single child
+    process, see ``getConcurrentPeakMemory`` for the memory used by extractions running at the same time.
+  """
+  try:
+    import resource
+  except ImportError:
+    return None
+  # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+  scale = 1 if sys.platform == 'darwin' else 1024
+  return {
+    'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+    'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+  }
+
+
+def getConcurrentPeakMemory(taskPeakMemory):
+  """
+  Get the largest sum of the peak memory of tasks running at the same time, i.e. an upper bound of the memory used by
+  the extraction processes at once, which is limited by ``--memory-budget``.
+
+  :param taskPeakMemory: List of (start, end, peak memory) tuples of the tasks (see SlicerRadiomicsLogic.taskPeakMemory)
+  :returns: Peak memory in bytes, or None if the peak memory of the tasks is not available
+  """
+  events = []
+  for startTime, endTime, peakMemory in taskPeakMemory:
+    if peakMemory is not None:
+      events += [(startTime, peakMemory), (endTime, -peakMemory)]
+  if len(events) == 0:
+    return None
+  concurrentMemory = 0
+  concurrentPeakMemory = 0
+  for eventTime, memory in sorted(events):  # At equal times, tasks that end are handled first
+    concurrentMemory += memory
+    concurrentPeakMemory = max(concurrentPeakMemory, concurrentMemory)
+  return concurrentPeakMemory
+
+
+def timeStep(function, repeat):
+  """
+  Call ``function`` ``repeat`` times.
+
+  :returns: dict with the durations (in seconds) of all calls and their minimum and median
+  """
+  durations = []
+  for _ in range(repeat):
+    startTime = time.perf_counter()
+    function()
+    durations.append(time.perf_counter() - startTime)
+  return OrderedDict([('seconds', durations), ('min', min(durations)), ('median', float(numpy.median(durations)))])
+
+
+def runBenchmark(args):
+  import slicer
+  import radiomics
+  from SlicerRadiomics import SlicerRadiomicsLogic
+  from SlicerRadiomicsLib import createSyntheticVolumes
+
+  imageNode, labelNode, segmentationNode = createSyntheticVolumes(args.size, args.rois, args.seed, 'benchmark')
+
+  parameterFile = args.param
+  if parameterFile is None:
+    parameterFile = os.path.join(slicer.app.temporaryPath, 'SlicerRadiomicsBenchmarkParams.json')
+    with open(parameterFile, 'w') as parameterFP:
+      json.dump(configurations[args.config], parameterFP)
+
+  def getLogic():
+    logic = SlicerRadiomicsLogic()
+    # Extractions only run in parallel when running asynchronously
+    logic.runSync = args.workers == 1
+    logic.maxWorkers = args.workers
+    # The optimizations of the pipeline are disabled by default
+    logic.batchMode = True
+    logic.exportSegmentsByLayer = True
+    logic.shareVolumeFiles = True
+    logic.useWorker = args.useWorker
+    if args.memoryBudget is not None:
+      logic.memoryBudget = args.memoryBudget * 1024 * 1024
+    return logic
+
+  steps = OrderedDict()
+
+  # Label generation (including the computation of the label index) and segment export, without extraction
+  def generateLabels(maskNode):
+    logic = getLogic()
+    SlicerRadiomicsLogic._invalidateLabelIndex(maskNode.GetID())
+    list(logic._getLabelGenerator(maskNode, imageNode))
+    logic._removeTemporaryNodes(removeAll=True)
+
+  steps['labelGeneration'] = timeStep(lambda: generateLabels(labelNode), args.repeat)
+  steps['segmentExport'] = timeStep(lambda: generateLabels(segmentationNode), args.repeat)
+
+  # Complete extraction, also recording the time spent in each stage and the peak memory of the extraction processes
+  # (of a single task and of the tasks running at the same time) of the last run
+  tableNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode', 'benchmark_results')
+  stageTimings = OrderedDict()
+  taskPeakMemory = OrderedDict()
+  for stepName, maskNode in [('extractionLabelmap', labelNode), ('extractionSegmentation', segmentationNode)]:
+    def extract():
+      logic = getLogic()
+      done = []
+      logic.runCLIWithParameterFile(imageNode, maskNode, tableNode, parameterFile, lambda: done.append(True))
+      while len(done) == 0 and logic._isRunning():
+        slicer.app.processEvents()
+        time.sleep(.001)
+      stageTimings[stepName] = OrderedDict([
+        (stage, sum([roiTimings[stage] for roiTimings in logic.timings.values()])) for stage in logic.timingStages])
+      peakMemory = [roiPeakMemory for roiPeakMemory in logic.peakMemory.values() if roiPeakMemory is not None]
+      taskPeakMemory[stepName] = OrderedDict([
+        ('task', max(peakMemory) if len(peakMemory) > 0 else None),
+        ('concurrent', getConcurrentPeakMemory(logic.taskPeakMemory))
+      ])
+    steps[stepName] = timeStep(extract, args.repeat)
+    steps[stepName]['roisPerSecond'] = args.rois / steps[stepName]['median']
+
+  # Ingestion of the results of the last extraction in a new output table
+  results = list(SlicerRadiomicsLogic._getTableResults(tableNode).items())
+  ingestionTable = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLTableNode', 'benchmark_ingestion')
+
+  def ingest():
+    logic = getLogic()
+    logic.outTable = ingestionTable
+    logic._initOutputTable()
+    logic._processResults(results)
+
+  steps['processResults'] = timeStep(ingest, args.repeat)
+
+  return OrderedDict([
+    ('date', datetime.datetime.now().isoformat()),
+    ('versions', OrderedDict([
+      ('slicer', slicer.app.applicationVersion),
+      ('pyradiomics', radiomics.__version__),
+      ('python', platform.python_version()),
+      ('platform', platform.platform())
+    ])),
+    ('parameters', OrderedDict([
+      ('size', args.size),
+      ('rois', args.rois),
+      ('config', args.config if args.param is None else args.param),
+      ('repeat', args.repeat),
+      ('workers', args.workers),
+      ('memoryBudget', args.memoryBudget),
+      ('useWorker', args.useWorker)
+    ])),
+    ('steps', steps),
+    ('stageTimings', stageTimings),
+    ('taskPeakMemory', taskPeakMemory)
+  ])
+
+
+def main(argv):
+  args = getParser().parse_args(argv)
+
+  from SlicerRadiomics import SlicerRadiomicsWorkerClient
+
+  try:
+    benchmark = runBenchmark(args)
+  finally:
+    SlicerRadiomicsWorkerClient.stopAll()
+  # Measured after the extraction workers are stopped, so these are included in the peak memory of the child processes
+  benchmark['peakMemory'] = getPeakMemory()
+
+  with open(args.out, 'w') as outFP:
+    json.dump(benchmark, outFP, indent=2)
+  for stepName, step in benchmark['steps'].items():
+    print('%-24s %8.3f s' % (stepName, step['median']))
+  print('Results written to %s' % args.out)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python-real
+# -*- coding: utf-8 -*-
+
+"""
+Headless feature extraction for a cohort of cases listed in a CSV manifest (see SlicerRadiomicsLogic.runBatch).
+
+Run this script using Slicer, e.g.::
+
+  Slicer --no-main-window --python-script SlicerRadiomicsBatch.py manifest.csv results.csv --param Params.yaml --jobs 4
+
+Running the same command again after an interruption resumes the extraction, cases that are already done are skipped.
+"""
+
+from __future__ import print_function
+import argparse
+import sys
+
+
+def getParser():
+  parser = argparse.ArgumentParser(usage='Slicer --no-main-window --python-script %(prog)s manifest output [Options]')
+  parser.add_argument('manifest', metavar='Manifest',
+                      help='CSV file with columns "Image" and "Mask" and optionally "ID" and "Label"')
+  parser.add_argument('output', metavar='Output', help='CSV file to write the results to (long format)')
+  parser.add_argument('--param', '-p', metavar='FILE', default=None,
+                      help='Parameter file containing the settings to be used in extraction')
+  parser.add_argument('--jobs', '-j', metavar='N', type=int, default=1,
+                      help='Number of cases to extract in parallel')
+  return parser
+
+
+def main(argv):
+  args = getParser().parse_args(argv)
+
+  from SlicerRadiomics import SlicerRadiomicsLogic, SlicerRadiomicsWorkerClient
+
+  try:
+    logic = SlicerRadiomicsLogic()
+    casesDone, casesFailed = logic.runBatch(args.manifest, args.output, args.param, maxWorkers=args.jobs)
+  finally:
+    SlicerRadiomicsWorkerClient.stopAll()
+  print('%d cases extracted, %d cases failed' % (casesDone, casesFailed))
+  return 1 if casesFailed > 0 else 0
+
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1 and (sys.argv[1] == '--xml' or sys.argv[1] == '-x'):
+    # This script is installed in the CLI modules directory, but is not a CLI module itself
+    sys.exit(1)
+  sys.exit(main(sys.argv[1:]))
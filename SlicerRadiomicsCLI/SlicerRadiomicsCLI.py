@@ -2,14 +2,612 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import print_function
+import argparse
+from collections import OrderedDict
+import contextlib
+import csv
+import json
+import logging
+import os
 import sys
+import time
 
 from radiomics.scripts import parse_args
 
+
+def getBatchParser():
+  """
+  Parser for the arguments used in batch mode (i.e. when ``--labels`` is passed). In this mode, the image and mask are
+  only loaded once and features are extracted for all specified ROIs in a single process. Image and mask can also be
+  passed using ``--imageFile`` and ``--maskFile``, e.g. raw volumes written once by SlicerRadiomicsLogic.
+  """
+  parser = argparse.ArgumentParser(usage='%(prog)s [image mask] --labels LABELS [Options]')
+  parser.add_argument('image', metavar='Image', nargs='?', default=None, help='Image file to extract features from')
+  parser.add_argument('mask', metavar='Mask', nargs='?', default=None, help='Label map file containing the ROIs')
+  parser.add_argument('--imageFile', metavar='FILE', default=None,
+                      help='Image file to extract features from, used instead of Image if specified (e.g. a raw volume '
+                           'with a MetaImage header shared by multiple runs)')
+  parser.add_argument('--maskFile', metavar='FILE', default=None,
+                      help='Label map file containing the ROIs, used instead of Mask if specified')
+  parser.add_argument('--param', '-p', metavar='FILE', default=None,
+                      help='Parameter file containing the settings to be used in extraction')
+  parser.add_argument('--paramValidated', action='store_true',
+                      help='The parameter file is a JSON file that has been validated and completed with the defaults '
+                           '(e.g. by SlicerRadiomicsLogic), so it is applied without validating it again')
+  parser.add_argument('--labels', metavar='N[,N]', required=True,
+                      help='Comma separated list of label values identifying the ROIs to extract features from')
+  parser.add_argument('--out', '-o', metavar='FILE', default=None,
+                      help='CSV file to write the results to (one row per feature, one column per ROI)')
+  parser.add_argument('--outJson', metavar='FILE', default=None,
+                      help='JSON file to write the results to (see serializeResults)')
+  parser.add_argument('--filteredImageCacheSize', metavar='MB', type=int, default=2048,
+                      help='Maximum size of the filtered images kept in memory to be reused for all ROIs (0 disables '
+                           'reuse of filtered images)')
+  parser.add_argument('--outProgress', metavar='FILE', default=None,
+                      help='JSON file to which the progress is written during the extraction, and the time spent in '
+                           'each stage of the extraction of each ROI and the peak memory of the process when done (see '
+                           'ExtractionMonitor and getPeakMemory)')
+  parser.add_argument('--chunkMargin', metavar='I,J,K', default=None,
+                      help='If specified, image and mask are not loaded as a whole. Instead, each ROI is extracted '
+                           'from the region of its bounding box, extended by this margin (number of voxels along i, j '
+                           'and k), which is read from file (see extractLabelsChunked)')
+  return parser
+
+
+def getExtractor(parameterFilepath=None, validated=False):
+  """
+  Instantiate a feature extractor customized by the parameter file (if specified). If ``validated`` is True, the
+  parameter file must be a JSON file holding a customization that has been validated and completed with the defaults
+  by PyRadiomics, which is applied as is (i.e. without validating it again).
+  """
+  from radiomics import featureextractor
+
+  if parameterFilepath and validated:
+    with open(parameterFilepath, 'r') as parameterFP:
+      parameters = json.load(parameterFP)
+    # Settings are passed as keyword arguments, so the geometry tolerance is applied
+    extractor = featureextractor.RadiomicsFeatureExtractor(**parameters['setting'])
+    extractor.enabledImagetypes = parameters['imageType']
+    extractor.enabledFeatures = parameters['featureClass']
+  elif parameterFilepath:
+    extractor = featureextractor.RadiomicsFeatureExtractor(parameterFilepath)
+  else:
+    extractor = featureextractor.RadiomicsFeatureExtractor()
+  extractor.settings['correctMask'] = True
+  return extractor
+
+
+def getLabels(mask):
+  """
+  Get the label values (excluding 0) present in ``mask`` (SimpleITK image), in ascending order.
+  """
+  import SimpleITK as sitk
+
+  labelShapeStatistics = sitk.LabelShapeStatisticsImageFilter()
+  labelShapeStatistics.ComputePerimeterOff()
+  labelShapeStatistics.ComputeFeretDiameterOff()
+  labelShapeStatistics.Execute(sitk.Cast(mask, sitk.sitkUInt32))
+  return sorted([int(label) for label in labelShapeStatistics.GetLabels() if label != 0])
+
+
+def readRegion(filepath, index, size):
+  """
+  Read the region of ``size`` voxels starting at ``index`` (both i, j, k) from an image file. If the file format
+  supports streaming (e.g. uncompressed MetaImage or NRRD), only the voxels in the region are read.
+  """
+  import SimpleITK as sitk
+
+  reader = sitk.ImageFileReader()
+  reader.SetFileName(filepath)
+  reader.SetExtractIndex([int(i) for i in index])
+  reader.SetExtractSize([int(i) for i in size])
+  return reader.Execute()
+
+
+def getLabelRegions(maskFilepath, labels=None, margin=(0, 0, 0), slabSize=32):
+  """
+  Get the region of each label in a mask file, i.e. its bounding box extended by ``margin`` voxels (along i, j and k)
+  and clipped to the extent of the mask. The mask is read one slab of ``slabSize`` slices at a time, so only one slab is
+  held in memory.
+
+  :returns: OrderedDict mapping each label value (ascending, only those in ``labels`` if specified) to a tuple of the
+    (i, j, k) start index and the (i, j, k) size of its region
+  """
+  import numpy
+  import SimpleITK as sitk
+
+  reader = sitk.ImageFileReader()
+  reader.SetFileName(maskFilepath)
+  reader.ReadImageInformation()
+  maskSize = numpy.array(reader.GetSize())
+
+  labelStatistics = sitk.LabelShapeStatisticsImageFilter()
+  labelStatistics.SetBackgroundValue(0)
+  labelStatistics.ComputePerimeterOff()
+  labelStatistics.ComputeFeretDiameterOff()
+
+  lowerBounds = {}
+  upperBounds = {}
+  for slabStart in range(0, int(maskSize[2]), slabSize):
+    slabSlices = min(slabSize, int(maskSize[2]) - slabStart)
+    slab = readRegion(maskFilepath, (0, 0, slabStart), (maskSize[0], maskSize[1], slabSlices))
+    labelStatistics.Execute(sitk.Cast(slab, sitk.sitkUInt32))
+    for label in labelStatistics.GetLabels():
+      boundingBox = labelStatistics.GetBoundingBox(label)
+      lower = numpy.array(boundingBox[:3]) + (0, 0, slabStart)
+      upper = lower + boundingBox[3:]
+      lowerBounds[label] = numpy.minimum(lowerBounds.get(label, lower), lower)
+      upperBounds[label] = numpy.maximum(upperBounds.get(label, upper), upper)
+
+  regions = OrderedDict()
+  for label in sorted(lowerBounds.keys()):
+    if labels is not None and label not in labels:
+      continue
+    lower = numpy.maximum(lowerBounds[label] - margin, 0)
+    upper = numpy.minimum(upperBounds[label] + margin, maskSize)
+    regions[int(label)] = (tuple(int(i) for i in lower), tuple(int(i) for i in upper - lower))
+  return regions
+
+
+class FilteredImageCache(object):
+  """
+  Cache of the filtered images (e.g. LoG, wavelet) derived from one image, shared by the extraction of all ROIs in that
+  image. PyRadiomics applies the filters to the full image and only crops the result to the ROI afterwards, so unless
+  the image is resampled or cropped for each ROI, the filtered images are the same for every ROI.
+
+  During ``share(extractor)``, the image type functions of PyRadiomics (``imageoperations.get<ImageType>Image``) are
+  replaced by functions yielding the cached images if available. Images are cached until their total size would exceed
+  ``maxSize`` bytes, filtered images that do not fit are recomputed for every ROI.
+  """
+
+  # Image types that depend on the ROI (LBP 3D is only computed for voxels in the ROI), these are never shared
+  roiDependentImageTypes = ('Original', 'LBP3D')
+
+  def __init__(self, maxSize):
+    self.maxSize = maxSize
+    self._images = {}
+    self._size = 0
+
+  @staticmethod
+  def canShare(extractor):
+    settings = extractor.settings
+    if settings.get('interpolator') is not None and settings.get('resampledPixelSpacing') is not None:
+      return False  # Image is resampled on a grid around each ROI
+    if settings.get('preCrop', False):
+      return False  # Image is cropped to each ROI before the filters are applied
+    return True
+
+  @contextlib.contextmanager
+  def share(self, extractor):
+    from radiomics import imageoperations
+
+    if self.maxSize <= 0:
+      # Reuse of filtered images disabled
+      yield
+      return
+
+    originalFunctions = {}
+    for imageType in extractor.enabledImagetypes:
+      if imageType in self.roiDependentImageTypes:
+        continue
+      functionName = 'get%sImage' % imageType
+      originalFunctions[functionName] = getattr(imageoperations, functionName)
+      setattr(imageoperations, functionName, self._getCachedFunction(imageType, originalFunctions[functionName]))
+    try:
+      yield
+    finally:
+      for functionName, function in originalFunctions.items():
+        setattr(imageoperations, functionName, function)
+
+  def _getCachedFunction(self, imageType, function):
+    def getCachedImages(inputImage, inputMask, **kwargs):
+      # The filters do not depend on the label, all image type functions yield the kwargs they are called with
+      key = (imageType, json.dumps(dict([(k, v) for k, v in kwargs.items() if k != 'label']), sort_keys=True,
+                                   default=str))
+      if key in self._images:
+        for image, imageTypeName in self._images[key]:
+          yield image, imageTypeName, kwargs
+        return
+
+      images = []
+      for image, imageTypeName, imageKwargs in function(inputImage, inputMask, **kwargs):
+        images.append((image, imageTypeName))
+        yield image, imageTypeName, imageKwargs
+
+      size = sum([image.GetNumberOfPixels() * image.GetNumberOfComponentsPerPixel() * image.GetSizeOfPixelComponent()
+                  for image, imageTypeName in images])
+      if self._size + size <= self.maxSize:
+        self._images[key] = images
+        self._size += size
+    return getCachedImages
+
+
+class ExtractionMonitor(object):
+  """
+  Reports the progress of the extraction of a set of labels and records the time (in seconds) spent in each stage of
+  the extraction of each label:
+
+  - 'io': reading the image and mask (shared by all labels, so divided evenly over them)
+  - 'filtering': pre-processing the image (e.g. normalization, resampling) and computing the filtered images
+  - 'calculation': computing the matrices and features of all feature classes
+
+  During ``monitor(extractor)``, the functions of PyRadiomics implementing these stages are wrapped to time them and
+  to track the image type and feature class that are being computed. Each time the extraction proceeds to the next
+  label, image type or feature class, ``progressCallback`` is called with the dict returned by ``getProgress``.
+  """
+
+  stages = ('io', 'filtering', 'calculation')
+
+  def __init__(self, progressCallback=None):
+    self.progressCallback = progressCallback
+    self.timings = OrderedDict()  # label -> OrderedDict(stage -> seconds)
+    self.label = None
+    self.labelIndex = 0
+    self.labelCount = 0
+    self.imageType = None
+    self.featureClass = None
+
+  def getProgress(self):
+    """
+    :returns: dict holding the current 'label', its (0-based) 'index' in the labels that are extracted, the number of
+      labels ('count'), and the current 'imageType' and 'featureClass' (None if not started yet).
+    """
+    return {
+      'label': self.label,
+      'index': self.labelIndex,
+      'count': self.labelCount,
+      'imageType': self.imageType,
+      'featureClass': self.featureClass
+    }
+
+  def startLabel(self, label, labelIndex, labelCount):
+    self.label = label
+    self.labelIndex = labelIndex
+    self.labelCount = labelCount
+    self.imageType = None
+    self.featureClass = None
+    self.timings[label] = OrderedDict([(stage, 0.) for stage in self.stages])
+    if self.progressCallback is not None:
+      self.progressCallback(self.getProgress())
+
+  def addTime(self, stage, seconds, label=None):
+    if label is None:
+      label = self.label
+    if label in self.timings:
+      self.timings[label][stage] += seconds
+
+  def _update(self, imageType, featureClass):
+    if (imageType, featureClass) == (self.imageType, self.featureClass):
+      return
+    self.imageType = imageType
+    self.featureClass = featureClass
+    if self.progressCallback is not None:
+      self.progressCallback(self.getProgress())
+
+  @contextlib.contextmanager
+  def monitor(self, extractor):
+    from radiomics import featureextractor, imageoperations
+
+    originalFunctions = {}
+    for imageType in extractor.enabledImagetypes:
+      functionName = 'get%sImage' % imageType
+      originalFunctions[functionName] = getattr(imageoperations, functionName)
+      setattr(imageoperations, functionName, self._getTimedGeneratorFunction(originalFunctions[functionName]))
+    getFeatureClasses = featureextractor.getFeatureClasses
+    featureextractor.getFeatureClasses = lambda: OrderedDict([
+      (featureClassName, self._getFeatureClassFactory(featureClassName, featureClass))
+      for featureClassName, featureClass in getFeatureClasses().items()])
+
+    computeShape = extractor.computeShape
+    computeFeatures = extractor.computeFeatures
+
+    def computeShapeMonitored(image, mask, boundingBox, **kwargs):
+      self._update('original', None)
+      return computeShape(image, mask, boundingBox, **kwargs)
+
+    def computeFeaturesMonitored(image, mask, imageTypeName, **kwargs):
+      self._update(imageTypeName, None)
+      return computeFeatures(image, mask, imageTypeName, **kwargs)
+
+    # Static and instance methods of the extractor are wrapped on this instance only
+    extractor.loadImage = self._getTimedFunction('filtering', extractor.loadImage)
+    extractor.computeShape = self._getTimedFunction('calculation', computeShapeMonitored)
+    extractor.computeFeatures = self._getTimedFunction('calculation', computeFeaturesMonitored)
+    try:
+      yield
+    finally:
+      for functionName, function in originalFunctions.items():
+        setattr(imageoperations, functionName, function)
+      featureextractor.getFeatureClasses = getFeatureClasses
+      del extractor.loadImage
+      del extractor.computeShape
+      del extractor.computeFeatures
+
+  def _getTimedFunction(self, stage, function):
+    def timedFunction(*args, **kwargs):
+      startTime = time.perf_counter()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        self.addTime(stage, time.perf_counter() - startTime)
+    return timedFunction
+
+  def _getTimedGeneratorFunction(self, function):
+    # The image type functions are generators, the filters are applied when the next image is requested
+    def timedGeneratorFunction(inputImage, inputMask, **kwargs):
+      images = function(inputImage, inputMask, **kwargs)
+      while True:
+        startTime = time.perf_counter()
+        try:
+          image = next(images)
+        except StopIteration:
+          return
+        finally:
+          self.addTime('filtering', time.perf_counter() - startTime)
+        yield image
+    return timedGeneratorFunction
+
+  def _getFeatureClassFactory(self, featureClassName, featureClass):
+    def createFeatureClass(*args, **kwargs):
+      self._update(self.imageType, featureClassName)
+      return featureClass(*args, **kwargs)
+    return createFeatureClass
+
+
+def extractLabels(image, mask, extractor, labels=None, filteredImageCacheSize=2048 * 1024 * 1024, monitor=None):
+  """
+  Extract features for each label value in ``labels`` (all labels present in the mask if None). Image and mask
+  (SimpleITK images or file paths) are read only once and the same extractor instance is used for all ROIs. Filtered
+  images are computed once and reused for all ROIs, if possible (see ``FilteredImageCache``). If ``monitor`` (an
+  ``ExtractionMonitor``) is specified, it is used to report the progress and record the timing of the extraction.
+
+  :returns: OrderedDict mapping each label value to the calculated feature vector (``None`` if extraction failed).
+  """
+  import SimpleITK as sitk
+
+  logger = logging.getLogger('radiomics.slicer.cli')
+  if monitor is None:
+    monitor = ExtractionMonitor()
+
+  startTime = time.perf_counter()
+  if not isinstance(image, sitk.Image):
+    image = sitk.ReadImage(image)
+  if not isinstance(mask, sitk.Image):
+    mask = sitk.ReadImage(mask)
+  if labels is None:
+    labels = getLabels(mask)
+  ioTime = time.perf_counter() - startTime
+
+  if len(labels) < 2 or not FilteredImageCache.canShare(extractor):
+    filteredImageCacheSize = 0
+  filteredImageCache = FilteredImageCache(filteredImageCacheSize)
+
+  results = OrderedDict()
+  # The monitor wraps the functions of the filtered image cache, so filtered images taken from the cache take no time
+  with filteredImageCache.share(extractor), monitor.monitor(extractor):
+    for labelIndex, label in enumerate(labels):
+      logger.info('Extracting features for label %d', label)
+      monitor.startLabel(label, labelIndex, len(labels))
+      monitor.addTime('io', ioTime / len(labels))
+      try:
+        results[label] = extractor.execute(image, mask, label=label)
+      except Exception:
+        logger.error('Feature extraction failed for label %d', label, exc_info=True)
+        results[label] = None
+  return results
+
+
+def extractLabelsChunked(imageFilepath, maskFilepath, extractor, labels=None, margin=(0, 0, 0), monitor=None):
+  """
+  Extract features for each label value in ``labels`` (all labels present in the mask if None), like ``extractLabels``,
+  but without loading image and mask as a whole. The mask is streamed to find the region of each label (see
+  ``getLabelRegions``), after which each label is extracted from its region of image and mask, read from file. Peak
+  memory is therefore bounded by the largest region instead of the size of the volumes.
+
+  Features only depend on the voxels in the bounding box of the ROI, plus the margin required by the customization
+  (e.g. the support of the filters). If ``margin`` is smaller than that, feature values may differ from an extraction
+  on the full image. Image and mask must have the same geometry.
+
+  :returns: OrderedDict mapping each label value to the calculated feature vector (``None`` if extraction failed).
+  """
+  logger = logging.getLogger('radiomics.slicer.cli')
+  if monitor is None:
+    monitor = ExtractionMonitor()
+
+  startTime = time.perf_counter()
+  regions = getLabelRegions(maskFilepath, labels, margin)
+  if labels is None:
+    labels = list(regions.keys())
+  indexTime = time.perf_counter() - startTime
+
+  results = OrderedDict()
+  with monitor.monitor(extractor):
+    for labelIndex, label in enumerate(labels):
+      logger.info('Extracting features for label %d', label)
+      monitor.startLabel(label, labelIndex, len(labels))
+      monitor.addTime('io', indexTime / len(labels))
+      if label not in regions:
+        logger.error('Feature extraction failed for label %d: label not present in the mask', label)
+        results[label] = None
+        continue
+      try:
+        startTime = time.perf_counter()
+        index, size = regions[label]
+        image = readRegion(imageFilepath, index, size)
+        mask = readRegion(maskFilepath, index, size)
+        monitor.addTime('io', time.perf_counter() - startTime)
+        results[label] = extractor.execute(image, mask, label=label)
+      except Exception:
+        logger.error('Feature extraction failed for label %d', label, exc_info=True)
+        results[label] = None
+  return results
+
+
+def formatFeatureValue(value):
+  """
+  Convert a value returned by PyRadiomics to a JSON serializable type. Numeric scalars are returned as python numbers,
+  all other values (i.e. diagnostics) are returned as strings.
+  """
+  import numpy
+
+  if isinstance(value, bool):
+    return str(value)
+  if isinstance(value, (int, float)):
+    return value
+  if isinstance(value, (numpy.ndarray, numpy.generic)) and numpy.size(value) == 1 and \
+     numpy.issubdtype(numpy.asarray(value).dtype, numpy.number):
+    return numpy.asarray(value).item()
+  return str(value)
+
+
+def serializeResults(results):
+  """
+  Convert the results returned by ``extractLabels`` to a JSON serializable list of ``[label, features]`` pairs, where
+  features is a list of ``[featureName, featureValue]`` pairs (``None`` if extraction failed).
+  """
+  serializedResults = []
+  for label, featureVector in results.items():
+    if featureVector is not None:
+      featureVector = [[featureName, formatFeatureValue(featureValue)]
+                       for featureName, featureValue in featureVector.items()]
+    serializedResults.append([label, featureVector])
+  return serializedResults
+
+
+def writeBatchResults(results, outFilepath):
+  """
+  Write the results as a table with one row per feature and one column per ROI. The first column ("Feature") holds the
+  feature names, the other columns are named by the label value of the ROI. ROIs for which the extraction failed are
+  omitted.
+  """
+  labels = [label for label in results if results[label] is not None]
+
+  featureNames = OrderedDict()
+  for label in labels:
+    for featureName in results[label]:
+      featureNames[featureName] = None
+
+  with open(outFilepath, 'w') as outFP:
+    writer = csv.writer(outFP, lineterminator='\n')
+    writer.writerow(['Feature'] + [str(label) for label in labels])
+    for featureName in featureNames:
+      writer.writerow([featureName] + [results[label].get(featureName, '') for label in labels])
+
+
+def serializeTimings(timings):
+  """
+  Convert the timings recorded by an ``ExtractionMonitor`` to a JSON serializable list of ``[label, {stage: seconds}]``
+  pairs.
+  """
+  return [[label, dict(labelTimings)] for label, labelTimings in timings.items()]
+
+
+def resetPeakMemory():
+  """
+  Reset the peak resident set size of this process, so ``getPeakMemory`` returns the peak from now on (e.g. of the next
+  job of an extraction worker). Only supported on Linux.
+
+  :returns: True if the peak was reset, False if ``getPeakMemory`` still returns the peak since the process started
+  """
+  try:
+    with open('/proc/self/clear_refs', 'w') as clearRefsFP:
+      clearRefsFP.write('5')
+    return True
+  except (IOError, OSError):
+    return False
+
+
+def getPeakMemory():
+  """
+  :returns: The peak resident set size of this process in bytes (since it started or since ``resetPeakMemory``), or
+    None if not available on this platform.
+  """
+  try:
+    with open('/proc/self/status', 'r') as statusFP:
+      for line in statusFP:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1]) * 1024
+  except (IOError, OSError):
+    pass
+
+  try:
+    import resource
+  except ImportError:
+    return None
+  # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+  scale = 1 if sys.platform == 'darwin' else 1024
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def writeProgress(progressFilepath, progress, timings=None, peakMemory=None):
+  """
+  Report the progress on stdout (in the format parsed by Slicer to update the progress of the CLI node) and write it
+  (and the timings and peak memory, if specified) to ``progressFilepath``. The file is replaced at once, so it is never
+  read partially.
+  """
+  if progress['index'] < progress['count']:
+    comment = 'Label %s (%d/%d)' % (progress['label'], progress['index'] + 1, progress['count'])
+    if progress['imageType'] is not None:
+      comment += ': %s image' % progress['imageType']
+    if progress['featureClass'] is not None:
+      comment += ', %s' % progress['featureClass']
+  else:
+    comment = 'Done'
+  print('<filter-progress>%f</filter-progress>' % (float(progress['index']) / max(1, progress['count'])))
+  print('<filter-comment>%s</filter-comment>' % comment)
+  sys.stdout.flush()
+
+  if progressFilepath is None:
+    return
+  try:
+    with open(progressFilepath + '.tmp', 'w') as progressFP:
+      json.dump({'progress': progress, 'timings': timings, 'peakMemory': peakMemory}, progressFP)
+    os.replace(progressFilepath + '.tmp', progressFilepath)
+  except OSError:
+    pass  # The file may be opened by the reader, the next update is written instead
+
+
+def runBatch(argv):
+  args = getBatchParser().parse_args(argv)
+  labels = [int(label) for label in args.labels.split(',') if label.strip() != '']
+
+  # Print out logging with level INFO and higher (equal to --verbosity=4 for the single ROI mode)
+  import radiomics
+  radiomics.setVerbosity(logging.INFO)
+
+  image = args.imageFile or args.image
+  mask = args.maskFile or args.mask
+  if not image or not mask:
+    getBatchParser().error('Image and mask must be specified')
+
+  print('<filter-start><filter-name>RadiomicsCLI</filter-name></filter-start>')
+  monitor = ExtractionMonitor(lambda progress: writeProgress(args.outProgress, progress))
+  if args.chunkMargin is not None:
+    margin = [int(i) for i in args.chunkMargin.split(',')]
+    results = extractLabelsChunked(image, mask, getExtractor(args.param, args.paramValidated), labels, margin, monitor)
+  else:
+    results = extractLabels(image, mask, getExtractor(args.param, args.paramValidated), labels,
+                            args.filteredImageCacheSize * 1024 * 1024, monitor)
+  if args.out is not None:
+    writeBatchResults(results, args.out)
+  if args.outJson is not None:
+    with open(args.outJson, 'w') as outFP:
+      json.dump(serializeResults(results), outFP)
+
+  progress = monitor.getProgress()
+  progress['index'] = progress['count']
+  writeProgress(args.outProgress, progress, serializeTimings(monitor.timings), getPeakMemory())
+  print('<filter-end><filter-name>RadiomicsCLI</filter-name></filter-end>')
+  sys.stdout.flush()
+
+
 if __name__ == '__main__':
   if sys.argv[1] == '--xml' or sys.argv[1] == '-x':
     with open(__file__[:-6] + '.xml', 'r') as xmlFP:  # Cut off "Script" from filename
       print(xmlFP.read())
+  elif '--labels' in sys.argv:
+    # Batch mode: extract all ROIs specified by --labels in a single process
+    runBatch(sys.argv[1:])
   else:
     # Check if old-style label argument is provided
     if '--label' in sys.argv:
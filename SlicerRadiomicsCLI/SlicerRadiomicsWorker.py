@@ -0,0 +1,122 @@
+#!/usr/bin/env python-real
+# -*- coding: utf-8 -*-
+
+"""
+Persistent feature extraction process used by SlicerRadiomicsLogic.
+
+Instead of starting a new interpreter (and importing PyRadiomics, SimpleITK, PyWavelets, ...) for every extraction,
+this process is started once per Slicer session and handles extraction jobs until its input is closed.
+
+Jobs are received on stdin and replies are written to stdout, both as one JSON document per line:
+
+- job: ``{"id": <int>, "image": <path>, "mask": <path>, "labels": [<int>, ...] or null, "param": <path or null>,
+  "paramValidated": <bool>, "progress": <bool>, "chunkMargin": [<int>, <int>, <int>] or null}``, if labels is null,
+  features are extracted for all labels present in the mask. If paramValidated is true, the parameter file holds a
+  validated customization (see ``SlicerRadiomicsCLI.getExtractor``). If chunkMargin is specified, each label is
+  extracted from the region of its bounding box (extended by this margin), without loading image and mask as a whole
+  (see ``SlicerRadiomicsCLI.extractLabelsChunked``).
+- reply: ``{"id": <int>, "status": "ok", "results": [[<label>, [[<feature>, <value>], ...] or null], ...],
+  "timings": [[<label>, {<stage>: <seconds>, ...}], ...], "peakMemory": <bytes or null>}``, or
+  ``{"id": <int>, "status": "error", "message": <str>}`` if the job failed as a whole. If the job could not be
+  parsed, the id is null. Features are listed in the order in which they were calculated (see
+  ``SlicerRadiomicsCLI.serializeResults``), results are null for labels of which the extraction failed.
+- if "progress" is true, the worker sends ``{"id": <int>, "status": "progress", "progress": {...}}`` each time the
+  extraction proceeds to the next label, image type or feature class (see ``SlicerRadiomicsCLI.ExtractionMonitor``),
+  before the final reply.
+
+Feature extractors are cached by the hash of the parameter file contents (and whether it holds a validated
+customization), so a parameter file is only parsed and validated once.
+"""
+
+from __future__ import print_function
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import traceback
+
+import SlicerRadiomicsCLI
+
+
+def getParameterFileHash(parameterFilepath):
+  if not parameterFilepath:
+    return None
+  with open(parameterFilepath, 'rb') as parameterFP:
+    return hashlib.sha1(parameterFP.read()).hexdigest()
+
+
+def getParser():
+  parser = argparse.ArgumentParser(description='Persistent feature extraction process, jobs are read from stdin and '
+                                               'replies are written to stdout (one JSON document per line)')
+  # Slicer queries all scripts in the CLI modules directory for their CLI description. This script is installed there,
+  # but is not a CLI module itself.
+  parser.add_argument('--xml', '-x', action='store_true', help=argparse.SUPPRESS)
+  return parser
+
+
+def processJob(job, extractors, sendReply):
+  paramValidated = job.get('paramValidated', False)
+  extractorKey = (getParameterFileHash(job.get('param')), paramValidated)
+  if extractorKey not in extractors:
+    extractors[extractorKey] = SlicerRadiomicsCLI.getExtractor(job.get('param'), paramValidated)
+  extractor = extractors[extractorKey]
+
+  progressCallback = None
+  if job.get('progress', False):
+    progressCallback = lambda progress: sendReply({'id': job['id'], 'status': 'progress', 'progress': progress})
+  monitor = SlicerRadiomicsCLI.ExtractionMonitor(progressCallback)
+  # Peak memory of this job, if the peak cannot be reset, this is the peak of all jobs so far
+  SlicerRadiomicsCLI.resetPeakMemory()
+
+  if job.get('chunkMargin') is not None:
+    results = SlicerRadiomicsCLI.extractLabelsChunked(job['image'], job['mask'], extractor, job.get('labels'),
+                                                      job['chunkMargin'], monitor)
+  else:
+    results = SlicerRadiomicsCLI.extractLabels(job['image'], job['mask'], extractor, job.get('labels'),
+                                               monitor=monitor)
+  return {
+    'id': job['id'],
+    'status': 'ok',
+    'results': SlicerRadiomicsCLI.serializeResults(results),
+    'timings': SlicerRadiomicsCLI.serializeTimings(monitor.timings),
+    'peakMemory': SlicerRadiomicsCLI.getPeakMemory()
+  }
+
+
+def main():
+  # Keep a private handle to stdout for the replies and redirect everything else that is printed to stderr, so that
+  # output of other libraries cannot corrupt the reply stream.
+  replyFP = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+  os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+  sys.stdout = sys.stderr
+
+  import radiomics
+  radiomics.setVerbosity(logging.INFO)
+
+  extractors = {}
+
+  def sendReply(reply):
+    replyFP.write(json.dumps(reply) + '\n')
+    replyFP.flush()
+
+  for line in iter(sys.stdin.readline, ''):
+    line = line.strip()
+    if line == '':
+      continue
+    job = None
+    try:
+      job = json.loads(line)
+      reply = processJob(job, extractors, sendReply)
+    except Exception as e:
+      traceback.print_exc()
+      jobId = job.get('id') if isinstance(job, dict) else None
+      reply = {'id': jobId, 'status': 'error', 'message': str(e)}
+    sendReply(reply)
+
+
+if __name__ == '__main__':
+  if getParser().parse_args().xml:
+    sys.exit(1)
+  main()
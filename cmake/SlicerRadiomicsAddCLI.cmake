@@ -21,6 +21,7 @@
 #
 # SlicerRadiomicsAddCLI(
 #   NAME <module_name>
+#   [ADDITIONAL_SCRIPTS <script> [...]]
 #   )
 #
 # NAME This is the name of the CLI to configure and install. It expects the following
@@ -29,6 +30,9 @@
 #        <module_name>.bat
 #        <module_name>.xml
 #
+# ADDITIONAL_SCRIPTS Python scripts in the current directory that are copied and installed
+#      alongside the CLI (e.g. helper processes importing the CLI script).
+#
 # Notes:
 #
 #  * The function adds a custom target named ``Copy<module_name>Scripts``
@@ -48,6 +52,7 @@ function(SlicerRadiomicsAddCLI)
     NAME
     )
   set(multiValueArgs
+    ADDITIONAL_SCRIPTS
     )
   cmake_parse_arguments(MY
     "${options}"
@@ -90,6 +95,11 @@ function(SlicerRadiomicsAddCLI)
   list(APPEND copy_commands
     COMMAND ${CMAKE_COMMAND} -E copy_if_different ${cli_script} ${build_dir}/${cli_script}
     )
+  foreach(script IN LISTS MY_ADDITIONAL_SCRIPTS)
+    list(APPEND copy_commands
+      COMMAND ${CMAKE_COMMAND} -E copy_if_different ${script} ${build_dir}/${script}
+      )
+  endforeach()
 
   add_custom_target(Copy${MY_NAME}Scripts ALL
     ${copy_commands}
@@ -102,7 +112,7 @@ function(SlicerRadiomicsAddCLI)
     COMPONENT RuntimeLibraries
     )
 
-  install(PROGRAMS ${cli_script}
+  install(PROGRAMS ${cli_script} ${MY_ADDITIONAL_SCRIPTS}
     DESTINATION ${SlicerExecutionModel_DEFAULT_CLI_INSTALL_RUNTIME_DESTINATION}
     COMPONENT RuntimeLibraries
     )